@@ -60,6 +60,111 @@ class Settings:
     GRAPH_SERVICE_PORT: int = int(os.getenv("GRAPH_SERVICE_PORT", "8101"))
     RED_SPIDER_SERVICE_PORT: int = int(os.getenv("RED_SPIDER_SERVICE_PORT", "5001"))
     
+    # ========== 知识图谱服务客户端配置 ==========
+    # 知识图谱查询模式：remote（HTTP 调用 Graph 服务）或 embedded（Agent 进程内直接调用）
+    GRAPH_QUERY_MODE: str = os.getenv("GRAPH_QUERY_MODE", "remote").lower()
+    # Agent 服务调用 Graph 服务的连接池与超时（秒）
+    GRAPH_CLIENT_MAX_CONNECTIONS: int = int(os.getenv("GRAPH_CLIENT_MAX_CONNECTIONS", "100"))
+    GRAPH_CLIENT_MAX_KEEPALIVE: int = int(os.getenv("GRAPH_CLIENT_MAX_KEEPALIVE", "20"))
+    GRAPH_CLIENT_CONNECT_TIMEOUT: float = float(os.getenv("GRAPH_CLIENT_CONNECT_TIMEOUT", "3"))
+    GRAPH_EXECUTE_TIMEOUT: float = float(os.getenv("GRAPH_EXECUTE_TIMEOUT", "20"))
+    GRAPH_QUERY_TIMEOUT: float = float(os.getenv("GRAPH_QUERY_TIMEOUT", "80"))
+    
+    # ========== 知识图谱服务配置 ==========
+    # 查询解释/改进建议缓存的最大条数（按 Cypher 指纹）
+    GRAPH_EXPLANATION_CACHE_SIZE: int = int(os.getenv("GRAPH_EXPLANATION_CACHE_SIZE", "1000"))
+    # NL2Cypher 生成结果缓存（两级缓存的 cypher 命名空间）：是否启用、过期时间（秒）
+    CYPHER_CACHE_ENABLED: bool = os.getenv("CYPHER_CACHE_ENABLED", "True").lower() == "true"
+    CYPHER_CACHE_TTL: int = int(os.getenv("CYPHER_CACHE_TTL", "604800"))
+    # 只读 Cypher 查询结果缓存（两级缓存的 graph_result 命名空间）：是否启用、非空结果与空结果的过期时间（秒）
+    GRAPH_RESULT_CACHE_ENABLED: bool = os.getenv("GRAPH_RESULT_CACHE_ENABLED", "True").lower() == "true"
+    GRAPH_RESULT_CACHE_TTL: int = int(os.getenv("GRAPH_RESULT_CACHE_TTL", "86400"))
+    GRAPH_RESULT_CACHE_NEGATIVE_TTL: int = int(os.getenv("GRAPH_RESULT_CACHE_NEGATIVE_TTL", "600"))
+    # NL2Cypher 模板快速路径：单一疾病、单一关系意图的问题直接生成参数化 Cypher，不调用 LLM
+    CYPHER_TEMPLATE_ENABLED: bool = os.getenv("CYPHER_TEMPLATE_ENABLED", "True").lower() == "true"
+    # 疾病一跳邻域查询（/neighborhood）每种关系最多返回的邻居数
+    GRAPH_NEIGHBORHOOD_LIMIT: int = int(os.getenv("GRAPH_NEIGHBORHOOD_LIMIT", "100"))
+    
+    # ========== 问答管线配置 ==========
+    # 单次请求的端到端时间预算（秒），可被请求中的 deadline 覆盖；其中为回答生成预留的时间（秒）
+    PIPELINE_DEADLINE: float = float(os.getenv("PIPELINE_DEADLINE", "60"))
+    PIPELINE_ANSWER_RESERVE: float = float(os.getenv("PIPELINE_ANSWER_RESERVE", "30"))
+    # 各阶段超时时间上限（秒），超时后按阶段策略降级或终止
+    PIPELINE_ENHANCE_TIMEOUT: float = float(os.getenv("PIPELINE_ENHANCE_TIMEOUT", "15"))
+    PIPELINE_VECTOR_TIMEOUT: float = float(os.getenv("PIPELINE_VECTOR_TIMEOUT", "15"))
+    PIPELINE_GRAPH_TIMEOUT: float = float(os.getenv("PIPELINE_GRAPH_TIMEOUT", "90"))
+    PIPELINE_GENERATE_TIMEOUT: float = float(os.getenv("PIPELINE_GENERATE_TIMEOUT", "120"))
+    PIPELINE_PERSIST_TIMEOUT: float = float(os.getenv("PIPELINE_PERSIST_TIMEOUT", "5"))
+    PIPELINE_CACHE_TIMEOUT: float = float(os.getenv("PIPELINE_CACHE_TIMEOUT", "2"))
+    PIPELINE_SEMANTIC_CACHE_TIMEOUT: float = float(os.getenv("PIPELINE_SEMANTIC_CACHE_TIMEOUT", "5"))
+    PIPELINE_SESSION_MEMORY_TIMEOUT: float = float(os.getenv("PIPELINE_SESSION_MEMORY_TIMEOUT", "2"))
+    # 知识图谱查询较慢时的提前回答策略：off（等待）/ drop（提前回答并丢弃图谱结果）/ followup（提前回答，图谱结果返回后补充）
+    PIPELINE_EARLY_ANSWER: str = os.getenv("PIPELINE_EARLY_ANSWER", "off").lower()
+    # 从检索开始计时，等待知识图谱查询的最长时间（毫秒），超过后基于向量检索结果提前回答
+    PIPELINE_EARLY_ANSWER_WAIT_MS: float = float(os.getenv("PIPELINE_EARLY_ANSWER_WAIT_MS", "3000"))
+    # 相同问题并发请求的合并（单飞）：off / local（进程内）/ redis（多副本，基于 Redis 锁）
+    PIPELINE_SINGLEFLIGHT: str = os.getenv("PIPELINE_SINGLEFLIGHT", "local").lower()
+    # Redis 单飞锁的过期时间（秒，应大于单次请求的最长耗时）与执行结束后事件 Stream 的保留时间（秒）
+    SINGLEFLIGHT_LOCK_TTL: float = float(os.getenv("SINGLEFLIGHT_LOCK_TTL", "180"))
+    SINGLEFLIGHT_STREAM_TTL: int = int(os.getenv("SINGLEFLIGHT_STREAM_TTL", "30"))
+    
+    # ========== 数据版本配置 ==========
+    # 向量库/知识图谱/图模式的版本注册表（Redis 不可用时的后备文件），以及服务轮询版本变化的间隔（秒）
+    DATA_VERSION_FILE: str = os.getenv("DATA_VERSION_FILE", str(PROJECT_ROOT / "storage" / "databases" / "data_versions.json"))
+    DATA_VERSION_POLL_INTERVAL: float = float(os.getenv("DATA_VERSION_POLL_INTERVAL", "10"))
+    
+    # ========== 两级缓存配置 ==========
+    # 进程内一级缓存的字节预算（所有命名空间共享）、是否使用 Redis 二级缓存、跨进程击穿保护锁的过期时间（秒）
+    TIERED_CACHE_MAX_BYTES: int = int(os.getenv("TIERED_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    TIERED_CACHE_REDIS: bool = os.getenv("TIERED_CACHE_REDIS", "True").lower() == "true"
+    TIERED_CACHE_LOCK_TTL: float = float(os.getenv("TIERED_CACHE_LOCK_TTL", "10"))
+    
+    # ========== 答案缓存配置 ==========
+    # 按规范化后的增强问题精确匹配的答案缓存：是否启用、每条的过期时间（秒）、最多条目数、命中时每个 SSE 片段的字数
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "True").lower() == "true"
+    ANSWER_CACHE_TTL: int = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+    ANSWER_CACHE_MAX_ENTRIES: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "10000"))
+    ANSWER_CACHE_CHUNK_SIZE: int = int(os.getenv("ANSWER_CACHE_CHUNK_SIZE", "16"))
+    
+    # ========== 语义答案缓存配置 ==========
+    # 精确匹配未命中时，按问题向量的余弦相似度匹配已缓存的答案：是否启用、命中阈值、最多条目数、每条的过期时间（秒）
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "True").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+    SEMANTIC_CACHE_TTL: int = int(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+    
+    # ========== 会话检索记忆配置 ==========
+    # 追问仍指向本会话的主实体时复用之前的检索结果：是否启用、过期时间（秒，与对话历史相同）、最多保留的图谱事实条数与关联实体个数
+    SESSION_MEMORY_ENABLED: bool = os.getenv("SESSION_MEMORY_ENABLED", "True").lower() == "true"
+    SESSION_MEMORY_TTL: int = int(os.getenv("SESSION_MEMORY_TTL", "86400"))
+    SESSION_MEMORY_MAX_FACTS: int = int(os.getenv("SESSION_MEMORY_MAX_FACTS", "50"))
+    SESSION_MEMORY_MAX_ENTITIES: int = int(os.getenv("SESSION_MEMORY_MAX_ENTITIES", "100"))
+    # 主疾病确定后是否预取其一跳邻域，追问涉及的关系直接从邻域中回答（不生成 Cypher）
+    SESSION_NEIGHBORHOOD_PREFETCH: bool = os.getenv("SESSION_NEIGHBORHOOD_PREFETCH", "True").lower() == "true"
+    
+    # ========== 上下文增强配置 ==========
+    # 是否先在本地判断问题是否需要增强（指代检测 + 实体词典），只有无法确定时才调用大模型
+    CONTEXT_LOCAL_FILTER_ENABLED: bool = os.getenv("CONTEXT_LOCAL_FILTER_ENABLED", "True").lower() == "true"
+    # 合并模式：需要大模型补全的追问，一次结构化调用同时得到补全后的问题、实体与 Cypher（知识图谱服务只验证并执行）
+    QUERY_PLAN_ENABLED: bool = os.getenv("QUERY_PLAN_ENABLED", "False").lower() == "true"
+    # 每轮回答后增量维护会话主题（chat:topic:{session_id}），增强时只读取主题、不再读取整个对话历史：是否启用、过期时间（秒）、每类实体最多保留的个数
+    SESSION_TOPIC_ENABLED: bool = os.getenv("SESSION_TOPIC_ENABLED", "True").lower() == "true"
+    SESSION_TOPIC_TTL: int = int(os.getenv("SESSION_TOPIC_TTL", "86400"))
+    SESSION_TOPIC_MAX_ENTITIES: int = int(os.getenv("SESSION_TOPIC_MAX_ENTITIES", "20"))
+    
+    # ========== 查询向量缓存配置 ==========
+    # 按 模型 + 文本 缓存 embed_query 的结果（两级缓存的 embedding 命名空间）：是否启用、是否使用 Redis 二级缓存、过期时间（秒）
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "True").lower() == "true"
+    EMBEDDING_CACHE_REDIS: bool = os.getenv("EMBEDDING_CACHE_REDIS", "True").lower() == "true"
+    EMBEDDING_CACHE_TTL: int = int(os.getenv("EMBEDDING_CACHE_TTL", "86400"))
+    
+    # ========== 向量检索结果缓存配置 ==========
+    # 按 问题 + 检索参数 + 向量库版本 缓存 Milvus 混合检索的结果（两级缓存的 vector_result 命名空间）：
+    # 是否启用、过期时间（秒）、每个文档最多保存的字符数
+    VECTOR_RESULT_CACHE_ENABLED: bool = os.getenv("VECTOR_RESULT_CACHE_ENABLED", "True").lower() == "true"
+    VECTOR_RESULT_CACHE_TTL: int = int(os.getenv("VECTOR_RESULT_CACHE_TTL", "3600"))
+    VECTOR_RESULT_CACHE_MAX_CHARS: int = int(os.getenv("VECTOR_RESULT_CACHE_MAX_CHARS", "2000"))
+    
     # ========== 模型路径配置 ==========
     MODEL_BASE_PATH: str = str(PROJECT_ROOT / "storage" / "models")
     
@@ -3,6 +3,32 @@
 Redis缓存相关功能
 """
 from core.cache.redis_client import get_redis_client, cache_set, cache_get
+from core.cache.tiered import TieredCache, CacheNamespace, get_tiered_cache
+from core.cache.versions import VersionRegistry, VersionWatcher, get_version_watcher
+from core.cache.singleflight import SingleFlight, RedisSingleFlight, FlightError, create_singleflight, flight_key
+from core.cache.semantic_cache import SemanticAnswerCache
+from core.cache.embedding_cache import EmbeddingCache
+from core.cache.session_memory import SessionRetrievalMemory
+from core.cache.session_topic import SessionTopicState
 
-__all__ = ['get_redis_client', 'cache_set', 'cache_get']
+__all__ = [
+    'get_redis_client',
+    'cache_set',
+    'cache_get',
+    'TieredCache',
+    'CacheNamespace',
+    'get_tiered_cache',
+    'VersionRegistry',
+    'VersionWatcher',
+    'get_version_watcher',
+    'SingleFlight',
+    'RedisSingleFlight',
+    'FlightError',
+    'create_singleflight',
+    'flight_key',
+    'SemanticAnswerCache',
+    'EmbeddingCache',
+    'SessionRetrievalMemory',
+    'SessionTopicState'
+]
 
@@ -0,0 +1,93 @@
+"""
+查询向量缓存
+按 模型 + 文本 的哈希缓存 embedding，避免同一问题重复调用远程 embedding 接口
+两级缓存（core/cache/tiered.py）：进程内缓存，以及 Redis 中紧凑的 float32 二进制
+"""
+import hashlib
+from array import array
+from typing import Callable, List
+
+from config.settings import settings
+from core.cache.tiered import TieredCache, get_tiered_cache
+
+
+def embedding_key(model: str, text: str) -> str:
+    """
+    计算 embedding 的缓存键
+
+    Args:
+        model: embedding 模型名称
+        text: 文本（原样参与哈希，不做规范化）
+
+    Returns:
+        模型与文本的 SHA1 摘要
+    """
+    return hashlib.sha1(f'{model}\n{text}'.encode('utf-8')).hexdigest()
+
+
+def pack_embedding(embedding: List[float]) -> bytes:
+    """把向量编码为 float32 二进制"""
+    return array('f', embedding).tobytes()
+
+
+def unpack_embedding(blob: bytes) -> List[float]:
+    """把 float32 二进制解码为向量"""
+    values = array('f')
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    """
+    两级 embedding 缓存，基于两级缓存框架的 embedding 命名空间
+    一级：进程内缓存（与其他命名空间共享字节预算）；二级：Redis，键为 cache:embedding:{哈希}，值为 float32 二进制
+    """
+
+    NAMESPACE = 'embedding'
+    # 重建代价：一次远程 embedding 调用（约 200 毫秒）
+    COST = 200
+
+    def __init__(self, ttl: int = None, tiered_cache: TieredCache = None, use_redis: bool = None):
+        """
+        初始化缓存
+
+        Args:
+            ttl: 每条记录的过期时间（秒），如果为None则使用配置中的值
+            tiered_cache: 两级缓存，如果为None则使用进程内共享的两级缓存
+            use_redis: 是否启用 Redis 二级缓存，如果为None则使用配置中的值
+        """
+        self.namespace = (tiered_cache or get_tiered_cache()).namespace(
+            self.NAMESPACE,
+            ttl or settings.EMBEDDING_CACHE_TTL,
+            cost=self.COST,
+            encode=pack_embedding,
+            decode=unpack_embedding,
+            l2=settings.EMBEDDING_CACHE_REDIS if use_redis is None else use_redis
+        )
+
+    def get_or_compute(self, model: str, text: str, compute: Callable[[], List[float]]) -> List[float]:
+        """
+        读取缓存的向量，未命中时调用 compute 计算并写入两级缓存（同一文本并发未命中时只计算一次）
+
+        Args:
+            model: embedding 模型名称
+            text: 文本
+            compute: 计算向量的函数（远程 embedding 调用）
+
+        Returns:
+            向量
+        """
+        return self.namespace.get_or_compute(embedding_key(model, text), compute)
+
+    def clear(self):
+        """清空进程内缓存（Redis 中的记录按过期时间自然淘汰）"""
+        self.namespace.clear()
+
+    def stats(self) -> dict:
+        """
+        获取缓存的统计信息
+
+        Returns:
+            dict: 命名空间的统计信息，见 CacheNamespace.stats
+        """
+        return self.namespace.stats()
@@ -0,0 +1,33 @@
+"""
+缓存键工具
+问题文本规范化与哈希，供答案缓存、单飞合并等按问题去重的功能共用
+"""
+import re
+import hashlib
+
+
+def normalize_query(query: str) -> str:
+    """
+    规范化问题文本：去除空白、统一大小写、去掉末尾标点
+
+    Args:
+        query: 问题文本
+
+    Returns:
+        规范化后的问题
+    """
+    query = re.sub(r'\s+', '', query or '').lower()
+    return query.rstrip('?？。.!！~～')
+
+
+def query_hash(query: str) -> str:
+    """
+    计算规范化问题的哈希
+
+    Args:
+        query: 问题文本
+
+    Returns:
+        规范化问题的 SHA1 摘要
+    """
+    return hashlib.sha1(normalize_query(query).encode('utf-8')).hexdigest()
@@ -3,9 +3,12 @@ Redis缓存客户端
 统一管理Redis连接和缓存操作
 """
 import json
+import time
 import redis
 from datetime import datetime
+from typing import Optional
 from config.settings import settings
+from core.cache.keys import query_hash
 
 
 def get_redis_client() -> redis.Redis:
@@ -34,18 +37,118 @@ def get_redis_client() -> redis.Redis:
     return r
 
 
-def cache_set(r: redis.Redis, question: str, answer: str, expire: int = 3600):
+# 答案缓存：每个问题一个独立的键（各自过期），并用两个有序集合索引：
+# qa:index 按过期时间（清理已过期的索引、统计条目数），qa:priority 按 重建代价 / 字节数（超出容量时的淘汰顺序）
+ANSWER_CACHE_PREFIX = 'qa:entry:'
+ANSWER_CACHE_INDEX = 'qa:index'
+ANSWER_CACHE_PRIORITY = 'qa:priority'
+ANSWER_CACHE_STATS = 'qa:stats'
+# 默认重建代价（毫秒）：一次完整的检索 + LLM 生成，与两级缓存各命名空间的 cost 同一量纲
+ANSWER_CACHE_COST = 10000
+
+
+def _answer_cache_key(question: str) -> str:
+    """问题对应的缓存键（基于规范化问题的哈希）"""
+    return ANSWER_CACHE_PREFIX + query_hash(question)
+
+
+def cache_set(
+    r: redis.Redis,
+    question: str,
+    answer: str,
+    expire: int = 3600,
+    metadata: dict = None,
+    max_entries: int = None,
+    data_version: str = '',
+    cost: float = None
+):
     """
     将问答对保存到Redis数据库
+    每个问答对单独存储并设置各自的过期时间；超过容量上限时按 重建代价 / 字节数 淘汰，
+    与两级缓存的 GreedyDual-Size 一致，先淘汰代价低、体积大的条目（条目的驻留时间由过期时间限制）
     
     Args:
         r: Redis客户端实例
-        question: 问题
+        question: 问题（按规范化后的问题匹配）
         answer: 答案
         expire: 过期时间（秒），默认3600秒
+        metadata: 随答案一起缓存的附加信息（如 search_path、search_stages）
+        max_entries: 最多缓存的问答对数量，如果为None则使用配置中的值
+        data_version: 生成答案时依赖数据的版本标记（见 core.cache.versions），随条目保存
+        cost: 重建代价（如生成该答案实际花费的毫秒数），如果为None则使用 ANSWER_CACHE_COST
     """
-    r.hset('qa', question, answer)
-    r.expire('qa', expire)
+    max_entries = max_entries or settings.ANSWER_CACHE_MAX_ENTRIES
+    key = _answer_cache_key(question)
+    entry = {
+        'question': question,
+        'answer': answer,
+        'time': datetime.now().isoformat(),
+        'data_version': data_version,
+        **(metadata or {})
+    }
+    value = json.dumps(entry, ensure_ascii=False)
+    cost = ANSWER_CACHE_COST if cost is None else cost
+    now = time.time()
+
+    pipe = r.pipeline()
+    pipe.setex(key, expire, value)
+    pipe.zadd(ANSWER_CACHE_INDEX, {key: now + expire})
+    pipe.zadd(ANSWER_CACHE_PRIORITY, {key: cost / max(len(value.encode('utf-8')), 1)})
+    pipe.execute()
+    size = _remove_expired(r, now)
+
+    # 超过容量上限：淘汰 重建代价 / 字节数 最低的条目
+    if size > max_entries:
+        evicted = r.zpopmin(ANSWER_CACHE_PRIORITY, size - max_entries)
+        if evicted:
+            members = [member for member, _ in evicted]
+            pipe = r.pipeline()
+            pipe.delete(*members)
+            pipe.zrem(ANSWER_CACHE_INDEX, *members)
+            pipe.execute()
+
+
+def _remove_expired(r: redis.Redis, now: float) -> int:
+    """从两个索引中移除已过期的条目，返回剩余的条目数"""
+    expired = r.zrangebyscore(ANSWER_CACHE_INDEX, '-inf', now)
+    pipe = r.pipeline()
+    if expired:
+        pipe.zrem(ANSWER_CACHE_INDEX, *expired)
+        pipe.zrem(ANSWER_CACHE_PRIORITY, *expired)
+    pipe.zcard(ANSWER_CACHE_INDEX)
+    return pipe.execute()[-1]
+
+
+def cache_get_entry(r: redis.Redis, question: str, data_version: str = None) -> Optional[dict]:
+    """
+    通过问题获取完整的缓存条目，并记录命中/未命中次数
+    数据版本与条目保存的版本不一致（向量库或知识图谱已重建）时视为未命中，并删除条目及其容量索引
+    
+    Args:
+        r: Redis客户端实例
+        question: 问题
+        data_version: 当前的数据版本标记，为None时不检查
+        
+    Returns:
+        缓存条目字典（包含 question、answer、time 及附加信息），如果不存在返回None
+    """
+    key = _answer_cache_key(question)
+    cached = r.get(key)
+    entry = None
+    if cached:
+        try:
+            entry = json.loads(cached)
+        except (TypeError, ValueError):
+            entry = None
+    if entry is not None and data_version is not None and entry.get('data_version', '') != data_version:
+        pipe = r.pipeline()
+        pipe.delete(key)
+        pipe.zrem(ANSWER_CACHE_INDEX, key)
+        pipe.zrem(ANSWER_CACHE_PRIORITY, key)
+        pipe.execute()
+        entry = None
+    r.hincrby(ANSWER_CACHE_STATS, 'hits' if entry else 'misses', 1)
+    return entry
 
 
 def cache_get(r: redis.Redis, question: str) -> bytes:
@@ -59,7 +162,30 @@ def cache_get(r: redis.Redis, question: str) -> bytes:
     Returns:
         答案（bytes类型），如果不存在返回None
     """
-    return r.hget('qa', question)
+    entry = cache_get_entry(r, question)
+    return entry['answer'].encode('utf-8') if entry else None
+
+
+def cache_stats(r: redis.Redis) -> dict:
+    """
+    获取答案缓存的统计信息
+    
+    Args:
+        r: Redis客户端实例
+        
+    Returns:
+        dict: hits、misses、hit_ratio（命中率）、size（当前条目数）
+    """
+    stats = r.hgetall(ANSWER_CACHE_STATS)
+    hits = int(stats.get(b'hits', 0))
+    misses = int(stats.get(b'misses', 0))
+    size = _remove_expired(r, time.time())
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        'size': size
+    }
 
 
 def save_conversation_history(r: redis.Redis, session_id: str, question: str, answer: str, expire: int = 86400):
@@ -0,0 +1,151 @@
+"""
+语义答案缓存
+按问题的向量表示缓存最终答案：新问题与已缓存问题的余弦相似度超过阈值时直接返回缓存的答案，
+用于命中措辞不同但含义相同的问题（如"高血压不能吃什么"与"高血压患者忌口有哪些"）
+向量保存在进程内的 NumPy 矩阵中，相似度一次矩阵乘法完成；向量库或知识图谱重建（数据版本变化）后整体清空
+"""
+import time
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from config.settings import settings
+from core.cache.versions import VersionWatcher, get_version_watcher, VECTOR, GRAPH
+
+
+class SemanticAnswerCache:
+    """
+    进程内语义答案缓存（线程安全）
+    向量归一化后存入固定容量的矩阵，写满后按写入顺序覆盖最早的条目；每条记录各自过期
+    """
+
+    def __init__(
+        self,
+        threshold: float = None,
+        max_entries: int = None,
+        ttl: int = None,
+        watcher: VersionWatcher = None
+    ):
+        """
+        初始化缓存
+
+        Args:
+            threshold: 命中所需的最低余弦相似度，如果为None则使用配置中的值
+            max_entries: 最多缓存的条目数量，如果为None则使用配置中的值
+            ttl: 每条记录的过期时间（秒），如果为None则使用配置中的值
+            watcher: 数据版本观察者，如果为None则使用进程内共享的观察者
+        """
+        self.threshold = threshold or settings.SEMANTIC_CACHE_THRESHOLD
+        self.max_entries = max_entries or settings.SEMANTIC_CACHE_MAX_ENTRIES
+        self.ttl = ttl or settings.SEMANTIC_CACHE_TTL
+        self.watcher = watcher or get_version_watcher()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._reset()
+        # 向量库或知识图谱重建后，缓存的答案可能已过时
+        self.watcher.on_change(self._on_version_change, VECTOR, GRAPH)
+
+    def _reset(self):
+        """清空全部条目（调用方需持有锁，或在初始化时调用）"""
+        self._matrix: Optional[np.ndarray] = None  # (max_entries, dim) float32，按需分配
+        self._expires = np.zeros(self.max_entries, dtype=np.float64)  # 0 表示空位
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * self.max_entries
+        self._next = 0   # 下一个写入位置
+        self._count = 0  # 已使用的位置数
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        """转换为单位长度的 float32 向量，零向量返回 None"""
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return None
+        return vector / norm
+
+    def _on_version_change(self):
+        """数据版本变化时清空缓存"""
+        print('🧹 数据版本已变化，清空语义答案缓存')
+        self.clear()
+
+    def lookup(self, embedding) -> Optional[Dict[str, Any]]:
+        """
+        查找与问题向量最相似的缓存条目
+
+        Args:
+            embedding: 问题的向量表示
+
+        Returns:
+            命中时返回缓存条目（包含 question、answer、time、附加信息以及相似度 score），否则返回 None
+        """
+        query = self._normalize(embedding)
+        self.watcher.versions()  # 超过轮询间隔时检查数据版本，变化时先清空
+        with self._lock:
+            if query is None or self._matrix is None or self._count == 0 or query.shape[0] != self._matrix.shape[1]:
+                self.misses += 1
+                return None
+            scores = self._matrix[:self._count] @ query
+            # 过期条目不参与匹配
+            scores[self._expires[:self._count] <= time.time()] = -1.0
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+            if score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {**self._entries[best], 'score': round(score, 4)}
+
+    def add(self, question: str, embedding, answer: str, metadata: dict = None):
+        """
+        写入一条问答记录
+
+        Args:
+            question: 问题
+            embedding: 问题的向量表示
+            answer: 答案
+            metadata: 随答案一起缓存的附加信息（如 search_path、search_stages）
+        """
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+        self.watcher.versions()
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+                # 首次写入或向量维度变化（更换了 embedding 模型）时重新分配
+                self._reset()
+                self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            slot = self._next
+            self._matrix[slot] = vector
+            self._expires[slot] = time.time() + self.ttl
+            self._entries[slot] = {
+                'question': question,
+                'answer': answer,
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                **(metadata or {})
+            }
+            self._next = (slot + 1) % self.max_entries
+            self._count = max(self._count, slot + 1)
+
+    def clear(self):
+        """清空全部条目"""
+        with self._lock:
+            self._reset()
+
+    def stats(self) -> dict:
+        """
+        获取缓存的统计信息
+
+        Returns:
+            dict: hits、misses、hit_ratio（命中率）、size（未过期的条目数）、threshold
+        """
+        with self._lock:
+            size = int(np.count_nonzero(self._expires[:self._count] > time.time()))
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+                'size': size,
+                'threshold': self.threshold
+            }
@@ -0,0 +1,171 @@
+"""
+会话检索记忆
+同一会话中的追问通常围绕同一个疾病。每轮回答后把检索到的文档、知识图谱事实和关联实体按会话保存在 Redis 中
+（与对话历史相同的过期时间）；后续问题仍指向同一个主实体时复用这些检索结果，并用本轮新的知识图谱事实增量扩充
+主实体确定后预取的疾病一跳邻域单独保存，读取时与检索记忆一起返回
+"""
+import json
+import time
+from typing import Dict, List, Optional
+
+import redis
+
+from config.settings import settings
+from core.cache.redis_client import get_redis_client
+
+
+# 判断问题是否引入了新实体时扫描的实体标签
+MEMORY_ENTITY_LABELS = ('Disease', 'Symptom', 'Drug')
+
+
+class SessionRetrievalMemory:
+    """
+    按会话保存的检索结果，键为 chat:retrieval:{session_id}
+    记录包含 entity（主实体）、entities（关联实体）、vector_context、vector_results、vector_count、graph_facts、turns、updated；
+    预取的邻域保存在 chat:neighborhood:{session_id}，与主实体一致时作为 neighborhood 字段返回
+    """
+
+    KEY_PREFIX = 'chat:retrieval:'
+    NEIGHBORHOOD_PREFIX = 'chat:neighborhood:'
+
+    def __init__(self, redis_client: redis.Redis = None, ttl: int = None, max_facts: int = None, max_entities: int = None):
+        """
+        Args:
+            redis_client: Redis客户端，如果为None则首次使用时创建
+            ttl: 记录的过期时间（秒），如果为None则使用配置中的值
+            max_facts: 最多保留的知识图谱事实条数，如果为None则使用配置中的值
+            max_entities: 最多保留的关联实体个数，如果为None则使用配置中的值
+        """
+        self._redis = redis_client
+        self.ttl = ttl or settings.SESSION_MEMORY_TTL
+        self.max_facts = max_facts or settings.SESSION_MEMORY_MAX_FACTS
+        self.max_entities = max_entities or settings.SESSION_MEMORY_MAX_ENTITIES
+
+    def _client(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = get_redis_client()
+        return self._redis
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        """
+        读取会话的检索记忆
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            检索记忆（已预取邻域时包含 neighborhood：关系类型到邻居名称列表的映射），不存在或读取失败返回 None
+        """
+        try:
+            blob, neighborhood = self._client().mget(self.KEY_PREFIX + session_id, self.NEIGHBORHOOD_PREFIX + session_id)
+            memory = json.loads(blob) if blob else None
+            neighborhood = json.loads(neighborhood) if neighborhood else None
+        except (redis.exceptions.RedisError, TypeError, ValueError):
+            return None
+        if memory and neighborhood and neighborhood.get('entity') == memory.get('entity'):
+            memory['neighborhood'] = neighborhood['relations']
+        return memory
+
+    @staticmethod
+    def matches(memory: Optional[Dict], query: str, dictionary=None) -> bool:
+        """
+        判断问题是否仍只指向记忆中的主实体（字符串包含检查与词典扫描，不调用模型）
+        上下文增强会把追问补全为带主题的问题（如"那吃什么药" -> "高血压吃什么药"）；
+        问题中还出现记忆以外的疾病、症状或药物（如"高血压和糖尿病的区别"）时，之前的检索结果不足以回答，不复用
+
+        Args:
+            memory: 检索记忆
+            query: 增强后的问题
+            dictionary: 实体词典（core.graph.entities.EntityDictionary），为None时只做字符串包含检查
+
+        Returns:
+            是否复用检索记忆
+        """
+        entity = (memory or {}).get('entity')
+        if not entity or entity not in (query or ''):
+            return False
+        if dictionary is None:
+            return True
+        known = {entity, *memory.get('entities', [])}
+        return all(match.name in known for match in dictionary.find(query, MEMORY_ENTITY_LABELS))
+
+    def remember(
+        self,
+        session_id: str,
+        entity: str,
+        vector_context: str = '',
+        vector_results: List[str] = None,
+        vector_count: int = 0,
+        graph_facts: List[str] = None,
+        entities: List[str] = None
+    ) -> Dict:
+        """
+        写入本轮的检索结果：主实体不变时增量扩充（新事实在前、去重后截断），主实体变化时替换
+
+        Args:
+            session_id: 会话ID
+            entity: 本轮问题的主实体
+            vector_context: 向量检索上下文（为空时保留已有的）
+            vector_results: 向量检索结果预览
+            vector_count: 向量检索结果条数
+            graph_facts: 本轮的知识图谱事实（描述性文本）
+            entities: 本轮知识图谱结果中的实体名称
+
+        Returns:
+            写入后的检索记忆
+        """
+        memory = self.load(session_id)
+        if memory:
+            memory.pop('neighborhood', None)
+        if not memory or memory.get('entity') != entity:
+            memory = {
+                'entity': entity,
+                'entities': [],
+                'vector_context': '',
+                'vector_results': [],
+                'vector_count': 0,
+                'graph_facts': [],
+                'turns': 0
+            }
+        if vector_context:
+            memory.update(vector_context=vector_context, vector_results=vector_results or [], vector_count=vector_count)
+        memory['graph_facts'] = _merge(graph_facts or [], memory['graph_facts'], self.max_facts)
+        memory['entities'] = _merge(entities or [], memory['entities'], self.max_entities)
+        memory['turns'] += 1
+        memory['updated'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        try:
+            self._client().setex(self.KEY_PREFIX + session_id, self.ttl, json.dumps(memory, ensure_ascii=False))
+        except redis.exceptions.RedisError as e:
+            print(f'⚠️ 写入会话检索记忆失败: {str(e)}')
+        return memory
+
+    def save_neighborhood(self, session_id: str, entity: str, relations: Dict[str, List[str]]):
+        """
+        保存为会话预取的疾病邻域
+
+        Args:
+            session_id: 会话ID
+            entity: 疾病名称
+            relations: 关系类型到邻居名称列表的映射
+        """
+        try:
+            self._client().setex(
+                self.NEIGHBORHOOD_PREFIX + session_id,
+                self.ttl,
+                json.dumps({'entity': entity, 'relations': relations}, ensure_ascii=False)
+            )
+        except redis.exceptions.RedisError as e:
+            print(f'⚠️ 写入会话邻域失败: {str(e)}')
+
+    def clear(self, session_id: str):
+        """删除会话的检索记忆"""
+        try:
+            self._client().delete(self.KEY_PREFIX + session_id, self.NEIGHBORHOOD_PREFIX + session_id)
+        except redis.exceptions.RedisError:
+            pass
+
+
+def _merge(new: List[str], old: List[str], limit: int) -> List[str]:
+    """合并两个列表：新内容在前、去重，最多保留 limit 个"""
+    merged = list(dict.fromkeys([*new, *old]))
+    return merged[:limit]
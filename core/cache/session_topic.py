@@ -0,0 +1,123 @@
+"""
+会话主题状态
+每轮回答后把问题中识别出的疾病、症状、药物增量合并到会话的 Redis 哈希中（与对话历史 chat:history:{session_id} 并列），
+并维护当前主题；上下文增强只需读取一次哈希，不再每轮重新读取整个对话历史、用大模型总结主题
+"""
+import json
+import time
+from typing import Dict, List, Optional
+
+import redis
+
+from config.settings import settings
+from core.cache.redis_client import get_redis_client
+from core.cache.session_memory import _merge
+
+
+# 哈希中以 JSON 列表保存的实体字段
+ENTITY_FIELDS = ('diseases', 'symptoms', 'drugs')
+
+
+class SessionTopicState:
+    """
+    按会话保存的主题状态，键为 chat:topic:{session_id}（哈希）
+    字段：topic（当前主题，有歧义或未知时为空字符串）、diseases / symptoms / drugs（JSON 列表，最近的在前）、turns、updated
+    """
+
+    KEY_PREFIX = 'chat:topic:'
+
+    def __init__(self, redis_client: redis.Redis = None, ttl: int = None, max_entities: int = None):
+        """
+        Args:
+            redis_client: Redis客户端，如果为None则首次使用时创建
+            ttl: 状态的过期时间（秒），如果为None则使用配置中的值
+            max_entities: 每类实体最多保留的个数，如果为None则使用配置中的值
+        """
+        self._redis = redis_client
+        self.ttl = ttl or settings.SESSION_TOPIC_TTL
+        self.max_entities = max_entities or settings.SESSION_TOPIC_MAX_ENTITIES
+
+    def _client(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = get_redis_client()
+        return self._redis
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        """
+        读取会话的主题状态（一次 HGETALL）
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            包含 topic、diseases、symptoms、drugs、turns、updated 的字典，不存在或读取失败返回 None
+        """
+        try:
+            fields = self._client().hgetall(self.KEY_PREFIX + session_id)
+        except redis.exceptions.RedisError:
+            return None
+        if not fields:
+            return None
+        fields = {_text(key): _text(value) for key, value in fields.items()}
+        try:
+            state = {field: json.loads(fields.get(field) or '[]') for field in ENTITY_FIELDS}
+            state['turns'] = int(fields.get('turns') or 0)
+        except ValueError:
+            return None
+        state['topic'] = fields.get('topic') or None
+        state['updated'] = fields.get('updated')
+        return state
+
+    def update(self, session_id: str, entities: Dict[str, List[str]]) -> Dict:
+        """
+        合并本轮问题中的实体，并更新当前主题：
+        问题中只有一个疾病时以它为主题，有多个疾病时主题置为有歧义（空）；
+        没有疾病时保留已有主题，尚无主题时取唯一的症状或药物
+
+        Args:
+            session_id: 会话ID
+            entities: 本轮（增强后的）问题中的实体，包含 diseases、symptoms、drugs
+
+        Returns:
+            更新后的主题状态
+        """
+        state = self.load(session_id) or {'topic': None, 'diseases': [], 'symptoms': [], 'drugs': [], 'turns': 0}
+        diseases = entities.get('diseases') or []
+        if diseases:
+            candidates = diseases
+        elif not state['topic']:
+            candidates = entities.get('symptoms') or entities.get('drugs') or []
+        else:
+            candidates = []
+        if len(candidates) == 1:
+            state['topic'] = candidates[0]
+        elif len(candidates) > 1:
+            state['topic'] = None
+        for field in ENTITY_FIELDS:
+            state[field] = _merge(entities.get(field) or [], state[field], self.max_entities)
+        state['turns'] += 1
+        state['updated'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+
+        key = self.KEY_PREFIX + session_id
+        mapping = {field: json.dumps(state[field], ensure_ascii=False) for field in ENTITY_FIELDS}
+        mapping.update(topic=state['topic'] or '', turns=state['turns'], updated=state['updated'])
+        try:
+            pipe = self._client().pipeline()
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+        except redis.exceptions.RedisError as e:
+            print(f'⚠️ 写入会话主题失败: {str(e)}')
+        return state
+
+    def clear(self, session_id: str):
+        """删除会话的主题状态"""
+        try:
+            self._client().delete(self.KEY_PREFIX + session_id)
+        except redis.exceptions.RedisError:
+            pass
+
+
+def _text(value) -> str:
+    """Redis 返回的字节串转为字符串"""
+    return value.decode('utf-8') if isinstance(value, bytes) else value
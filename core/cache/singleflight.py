@@ -0,0 +1,383 @@
+"""
+单飞（single-flight）请求合并
+相同问题的并发请求只执行一次，执行过程中产生的事件广播给所有订阅者
+提供进程内实现 SingleFlight，以及基于 Redis 锁 + Stream 的多副本实现 RedisSingleFlight
+"""
+import json
+import time
+import uuid
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import redis
+
+from config.settings import settings
+from core.cache.redis_client import get_redis_client
+from core.cache.keys import query_hash
+
+
+# 事件回调：emit(event_type, data)
+EmitFunc = Callable[[str, dict], Awaitable[None]]
+# 执行函数：接收事件回调，返回可 JSON 序列化的结果
+Producer = Callable[[EmitFunc], Awaitable[Any]]
+
+
+def flight_key(query: str) -> str:
+    """
+    根据问题生成单飞键
+
+    Args:
+        query: 问题文本（增强后的问题）
+
+    Returns:
+        规范化问题的 SHA1 摘要
+    """
+    return query_hash(query)
+
+
+class FlightError(Exception):
+    """共享执行失败，原样转交给所有订阅者"""
+
+    def __init__(self, error: Exception):
+        super().__init__(str(error))
+        self.error = error
+
+
+class Flight:
+    """
+    一次进行中的共享执行
+    记录已产生的全部事件，后加入的订阅者会从头重放，因此不会错过已发送的回答片段
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.events: List[Tuple[str, dict]] = []
+        self.done = False
+        self.result: Any = None
+        self.error: Optional[Exception] = None
+        self.subscribers = 0
+        self.remote = False  # 结果来自其他副本的执行
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event_type: str, data: dict) -> None:
+        """追加事件并唤醒所有订阅者"""
+        async with self._changed:
+            self.events.append((event_type, data))
+            self._changed.notify_all()
+
+    async def finish(self, result: Any = None, error: Optional[Exception] = None) -> None:
+        """标记执行结束"""
+        async with self._changed:
+            self.result = result
+            self.error = error
+            self.done = True
+            self._changed.notify_all()
+
+    async def forward(self, emit: EmitFunc) -> Any:
+        """
+        把事件转发给一个订阅者，直到执行结束
+
+        Returns:
+            执行结果
+
+        Raises:
+            FlightError: 执行失败
+        """
+        cursor = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.done or len(self.events) > cursor)
+                batch = self.events[cursor:]
+                cursor = len(self.events)
+                done = self.done
+            for event_type, data in batch:
+                await emit(event_type, data)
+            if done and cursor == len(self.events):
+                break
+        if self.error is not None:
+            raise FlightError(self.error)
+        return self.result
+
+
+class SingleFlight:
+    """
+    进程内单飞
+    相同键的并发调用共享一次执行；执行在独立任务中运行，
+    发起者断开不影响其他订阅者，所有订阅者都断开时才取消执行
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+
+    LEADER = 'leader'      # 本请求发起并在本进程执行
+    FOLLOWER = 'follower'  # 合并到本进程中进行中的执行
+    REMOTE = 'remote'      # 合并到其他副本的执行
+
+    async def do(self, key: str, producer: Producer, emit: EmitFunc) -> Tuple[Any, str]:
+        """
+        执行或加入一次共享执行，并把其事件转发给 emit
+
+        Args:
+            key: 单飞键
+            producer: 执行函数，仅在没有进行中的执行时调用
+            emit: 本订阅者的事件回调
+
+        Returns:
+            (执行结果, 本请求的角色 LEADER / FOLLOWER / REMOTE)
+
+        Raises:
+            FlightError: 执行失败
+        """
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = Flight(key)
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(flight, producer))
+
+        flight.subscribers += 1
+        try:
+            result = await flight.forward(emit)
+            if flight.remote:
+                return result, self.REMOTE
+            return result, self.LEADER if leader else self.FOLLOWER
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    async def _run(self, flight: Flight, producer: Producer):
+        """运行共享执行，结束后从进行中列表移除"""
+        try:
+            result = await producer(flight.publish)
+            await flight.finish(result=result)
+        except asyncio.CancelledError:
+            await flight.finish(error=RuntimeError('共享执行已取消'))
+            raise
+        except Exception as e:
+            await flight.finish(error=e)
+        finally:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+
+class RedisSingleFlight(SingleFlight):
+    """
+    多副本单飞：先在进程内合并，再通过 Redis 锁在副本之间合并
+    获得锁的副本执行并把事件批量写入 Redis Stream；其他副本读取 Stream，拿到结果后重放事件。
+    Stream 的键包含锁的令牌，每次执行写入独立的 Stream，其他副本先读出锁中的令牌再读取对应的 Stream，
+    不会重放上一次执行遗留的事件和结果。
+    如果执行副本被取消，或 Stream 在锁过期前没有结束（执行副本异常退出），等待的副本重新竞争锁，
+    只有获得锁的副本重新执行，其他副本跟随新的执行
+    """
+
+    LOCK_PREFIX = 'singleflight:lock:'
+    STREAM_PREFIX = 'singleflight:stream:'
+
+    def __init__(self, redis_client: redis.Redis = None, lock_ttl: float = None, stream_ttl: int = None):
+        """
+        Args:
+            redis_client: Redis客户端，如果为None则首次使用时创建
+            lock_ttl: 锁的过期时间（秒），如果为None则使用配置中的值
+            stream_ttl: 执行结束后事件 Stream 的保留时间（秒），如果为None则使用配置中的值
+        """
+        super().__init__()
+        self._redis = redis_client
+        self.lock_ttl = lock_ttl or settings.SINGLEFLIGHT_LOCK_TTL
+        self.stream_ttl = stream_ttl or settings.SINGLEFLIGHT_STREAM_TTL
+
+    async def _client(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = await asyncio.to_thread(get_redis_client)
+        return self._redis
+
+    async def do(self, key: str, producer: Producer, emit: EmitFunc) -> Tuple[Any, str]:
+        async def distributed(publish: EmitFunc) -> Any:
+            stale = None
+            while True:
+                token = uuid.uuid4().hex
+                try:
+                    r = await self._client()
+                    acquired, leader_token = await asyncio.to_thread(self._acquire, r, key, token, stale)
+                except redis.exceptions.RedisError as e:
+                    print(f'⚠️ 单飞锁获取失败，在本副本执行: {str(e)}')
+                    return await producer(publish)
+                if acquired:
+                    return await self._lead(r, key, token, producer, publish)
+
+                try:
+                    result = await self._follow(r, key, leader_token, publish)
+                except redis.exceptions.RedisError as e:
+                    # 跟随的事件只在拿到结果后才发布，此时尚未发布任何事件，可以安全地在本副本执行
+                    print(f'⚠️ 读取单飞 Stream 失败，在本副本执行: {str(e)}')
+                    return await producer(publish)
+                except TimeoutError:
+                    # 重新竞争锁：只有一个等待的副本重新执行，其他副本跟随新的执行
+                    print('⚠️ 执行副本未完成，重新竞争单飞锁')
+                    stale = leader_token
+                    continue
+                self._flights[key].remote = True
+                return result
+
+        return await super().do(key, distributed, emit)
+
+    def _stream(self, key: str, token: str) -> str:
+        """持有令牌 token 的执行写入的 Stream 键"""
+        return f'{self.STREAM_PREFIX}{key}:{token}'
+
+    def _acquire(self, r: redis.Redis, key: str, token: str, stale: str = None) -> Tuple[bool, Optional[str]]:
+        """
+        尝试获取锁；锁已被持有时读出持有者的令牌
+
+        Args:
+            stale: 已结束（被取消或过期）的执行的令牌，锁仍由它持有时等待其释放，而不是再次跟随
+
+        Returns:
+            (是否获得锁, 持有者的令牌)；读取令牌前锁恰好被释放时重新尝试获取
+        """
+        lock = self.LOCK_PREFIX + key
+        while True:
+            if r.set(lock, token, nx=True, px=int(self.lock_ttl * 1000)):
+                return True, token
+            leader_token = r.get(lock)
+            if leader_token is None:
+                continue
+            leader_token = leader_token.decode('utf-8')
+            if leader_token != stale:
+                return False, leader_token
+            # 执行副本已写入结束事件但尚未释放锁
+            time.sleep(0.05)
+
+    async def _lead(self, r: redis.Redis, key: str, token: str, producer: Producer, publish: EmitFunc) -> Any:
+        """
+        执行并把事件写入本次执行的 Stream，结束时写入结果并释放锁
+        事件先发布给本进程的订阅者，再放入队列由后台任务批量写入 Redis，回答片段不等待 Redis 往返
+        """
+        stream = self._stream(key, token)
+        queue: asyncio.Queue = asyncio.Queue()
+        writer = asyncio.create_task(self._write_events(r, stream, queue))
+
+        async def mirror(event_type: str, data: dict) -> None:
+            await publish(event_type, data)
+            queue.put_nowait({'type': event_type, 'data': json.dumps(data, ensure_ascii=False)})
+
+        # 执行被取消或事件没有完整写入时通知其他副本重新竞争锁
+        retry = {'type': '__error__', 'data': json.dumps({'error': '执行副本已取消', 'retry': True}, ensure_ascii=False)}
+        outcome = retry
+        try:
+            result = await producer(mirror)
+            outcome = {'type': '__result__', 'data': json.dumps(result, ensure_ascii=False)}
+            return result
+        except Exception as e:
+            outcome = {'type': '__error__', 'data': json.dumps({'error': str(e)}, ensure_ascii=False)}
+            raise
+        finally:
+            queue.put_nowait(None)
+            if not await writer:
+                outcome = retry
+            try:
+                await asyncio.to_thread(self._close_stream, r, stream, key, token, outcome)
+            except redis.exceptions.RedisError as e:
+                print(f'⚠️ 单飞 Stream 收尾失败: {str(e)}')
+
+    async def _write_events(self, r: redis.Redis, stream: str, queue: asyncio.Queue) -> bool:
+        """
+        后台写入事件：每次把队列中已积累的事件合并为一次 pipeline 写入 Stream，收到 None 时结束
+
+        Returns:
+            是否所有事件都已写入
+        """
+        first = True
+        written = True
+        while True:
+            batch = [await queue.get()]
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            events = [fields for fields in batch if fields is not None]
+            if events and written:
+                try:
+                    await asyncio.to_thread(self._append, r, stream, events, first)
+                    first = False
+                except redis.exceptions.RedisError as e:
+                    print(f'⚠️ 单飞事件写入失败: {str(e)}')
+                    written = False
+            if batch[-1] is None:
+                return written
+
+    def _append(self, r: redis.Redis, stream: str, events: List[dict], expire: bool):
+        """用一次 pipeline 写入一批事件；expire 为 True 时（第一批）设置 Stream 的过期时间"""
+        pipe = r.pipeline(transaction=False)
+        for fields in events:
+            pipe.xadd(stream, fields)
+        if expire:
+            # 执行副本异常退出时 Stream 不会收尾，过期时间覆盖锁的有效期，避免遗留
+            pipe.expire(stream, int(self.lock_ttl) + self.stream_ttl)
+        pipe.execute()
+
+    def _close_stream(self, r: redis.Redis, stream: str, key: str, token: str, outcome: dict):
+        """写入结束事件、设置 Stream 过期时间，并释放自己持有的锁"""
+        r.xadd(stream, outcome)
+        r.expire(stream, self.stream_ttl)
+        lock = self.LOCK_PREFIX + key
+        if r.get(lock) == token.encode('utf-8'):
+            r.delete(lock)
+
+    async def _follow(self, r: redis.Redis, key: str, leader_token: str, publish: EmitFunc) -> Any:
+        """
+        读取其他副本本次执行写入的 Stream，拿到结果后重放事件并返回结果
+        事件先缓存、读到结果后才发布：执行副本被取消而重新执行时，订阅者不会先收到不完整的回答再收到完整的回答
+
+        Args:
+            leader_token: 执行副本持有的锁令牌，对应其写入的 Stream
+
+        Raises:
+            TimeoutError: 锁已释放或过期但 Stream 没有结束，或执行副本被取消（此时未发布任何事件）
+            RuntimeError: 执行副本执行失败
+        """
+        stream = self._stream(key, leader_token)
+        lock = self.LOCK_PREFIX + key
+        last_id = '0'
+        released = False
+        buffered: List[Tuple[str, dict]] = []
+        while True:
+            entries = await asyncio.to_thread(r.xread, {stream: last_id}, None, 1000)
+            if not entries:
+                if released:
+                    raise TimeoutError
+                # 执行副本先写入结果再释放锁：锁不再由它持有时再读一次，取走释放前写入的结果
+                released = await asyncio.to_thread(r.get, lock) != leader_token.encode('utf-8')
+                continue
+            for entry_id, fields in entries[0][1]:
+                last_id = entry_id
+                event_type = fields[b'type'].decode('utf-8')
+                data = json.loads(fields[b'data'])
+                if event_type == '__result__':
+                    for buffered_type, buffered_data in buffered:
+                        await publish(buffered_type, buffered_data)
+                    return data
+                if event_type == '__error__':
+                    if data.get('retry'):
+                        raise TimeoutError
+                    raise RuntimeError(data['error'])
+                buffered.append((event_type, data))
+
+
+def create_singleflight(mode: str = None) -> Optional[SingleFlight]:
+    """
+    根据配置创建单飞实现
+
+    Args:
+        mode: off（不合并）/ local（进程内合并）/ redis（进程内 + 跨副本合并），如果为None则使用配置中的值
+
+    Returns:
+        单飞实例，mode 为 off 时返回 None
+    """
+    mode = (mode or settings.PIPELINE_SINGLEFLIGHT).lower()
+    if mode == 'local':
+        return SingleFlight()
+    if mode == 'redis':
+        return RedisSingleFlight()
+    if mode != 'off':
+        print(f'⚠️ 未知的单飞模式: {mode}，将不合并请求')
+    return None
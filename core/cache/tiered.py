@@ -0,0 +1,497 @@
+"""
+两级缓存框架
+一级（L1）：进程内缓存，按值的字节数统计容量，所有命名空间共享同一个字节预算；
+二级（L2）：Redis，多个进程/副本共享
+- 每个命名空间有各自的过期时间和重建代价（cost）
+- L1 满时按 GreedyDual-Size 淘汰：优先保留重建代价高、体积小的条目（如 LLM 生成结果），先淘汰代价低的条目
+- get_or_compute 提供击穿保护：同一个键同时未命中时只计算一次（进程内按键加锁，跨进程用 Redis 锁）
+- 每个命名空间单独统计命中率、条目数、字节数与淘汰次数
+"""
+import json
+import heapq
+import time
+import uuid
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import redis
+
+from config.settings import settings
+from core.cache.redis_client import get_redis_client
+
+
+Encoder = Callable[[Any], bytes]
+Decoder = Callable[[bytes], Any]
+
+
+def json_encode(value: Any) -> bytes:
+    """默认编码：JSON（UTF-8）"""
+    return json.dumps(value, ensure_ascii=False, default=str).encode('utf-8')
+
+
+def json_decode(blob: bytes) -> Any:
+    """默认解码：JSON（UTF-8）"""
+    return json.loads(blob)
+
+
+def _pack(blob: bytes, cost: float) -> bytes:
+    """L2 中的值：重建代价 + 换行 + 编码后的值，L2 命中回填 L1 时沿用写入时的代价"""
+    return repr(float(cost)).encode('ascii') + b'\n' + blob
+
+
+def _unpack(raw: bytes) -> tuple:
+    """
+    拆分 L2 中的值
+
+    Returns:
+        (编码后的值, 重建代价)，没有代价前缀时代价为 None
+    """
+    head, sep, blob = raw.partition(b'\n')
+    if sep:
+        try:
+            return blob, float(head)
+        except ValueError:
+            pass
+    return raw, None
+
+
+class _Entry:
+    """L1 中的一条记录"""
+
+    __slots__ = ('blob', 'cost', 'expires', 'priority', 'seq')
+
+    def __init__(self, blob: bytes, cost: float, expires: float):
+        self.blob = blob
+        self.cost = cost
+        self.expires = expires
+        self.priority = 0.0
+        self.seq = 0
+
+
+class CacheNamespace:
+    """
+    两级缓存中的一个命名空间，键在命名空间内唯一
+    L2 中的键为 cache:{命名空间}:{键}
+    """
+
+    def __init__(
+        self,
+        cache: 'TieredCache',
+        name: str,
+        ttl: int,
+        cost: float = 1.0,
+        encode: Encoder = None,
+        decode: Decoder = None,
+        l2: bool = True
+    ):
+        """
+        Args:
+            cache: 所属的两级缓存
+            name: 命名空间名称
+            ttl: 默认过期时间（秒）
+            cost: 默认重建代价（相对值，如一次 LLM 调用远高于一次数据库查询）
+            encode: 值的编码函数，默认 JSON
+            decode: 值的解码函数，默认 JSON
+            l2: 是否写入 Redis 二级缓存
+        """
+        self.cache = cache
+        self.name = name
+        self.ttl = ttl
+        self.cost = cost
+        self.encode = encode or json_encode
+        self.decode = decode or json_decode
+        self.l2 = l2
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self.coalesced = 0  # 击穿保护中等待其他调用方计算结果的次数
+        self.redis_errors = 0
+
+    def redis_key(self, key: str) -> str:
+        return f'cache:{self.name}:{key}'
+
+    def _lookup(self, key: str, record: bool = True) -> Optional[bytes]:
+        """依次查询 L1、L2，L2 命中时按写入时的重建代价回填 L1"""
+        blob = self.cache._l1_get(self, key)
+        if blob is not None:
+            if record:
+                self.l1_hits += 1
+            return blob
+        if self.l2 and self.cache.use_redis:
+            try:
+                client = self.cache._client()
+                raw = client.get(self.redis_key(key))
+                remaining = client.ttl(self.redis_key(key)) if raw is not None else None
+            except redis.exceptions.RedisError:
+                self.redis_errors += 1
+                raw = None
+            if raw is not None:
+                if record:
+                    self.l2_hits += 1
+                blob, cost = _unpack(raw)
+                ttl = remaining if remaining and remaining > 0 else self.ttl
+                self.cache._l1_set(self, key, blob, self.cost if cost is None else cost, ttl)
+                return blob
+        if record:
+            self.misses += 1
+        return None
+
+    def get(self, key: str) -> Any:
+        """
+        读取缓存的值
+
+        Args:
+            key: 键
+
+        Returns:
+            缓存的值，未命中返回 None
+        """
+        blob = self._lookup(key)
+        return None if blob is None else self.decode(blob)
+
+    def set(self, key: str, value: Any, ttl: int = None, cost: float = None):
+        """
+        写入两级缓存
+
+        Args:
+            key: 键
+            value: 值（None 不缓存）
+            ttl: 过期时间（秒），如果为None则使用命名空间的默认值
+            cost: 重建代价，如果为None则使用命名空间的默认值
+        """
+        if value is None:
+            return
+        ttl = ttl or self.ttl
+        cost = self.cost if cost is None else cost
+        blob = self.encode(value)
+        self.sets += 1
+        self.cache._l1_set(self, key, blob, cost, ttl)
+        if self.l2 and self.cache.use_redis:
+            try:
+                self.cache._client().setex(self.redis_key(key), max(int(ttl), 1), _pack(blob, cost))
+            except redis.exceptions.RedisError:
+                self.redis_errors += 1
+
+    def delete(self, key: str):
+        """从两级缓存中删除"""
+        self.cache._l1_delete(self, key)
+        if self.l2 and self.cache.use_redis:
+            try:
+                self.cache._client().delete(self.redis_key(key))
+            except redis.exceptions.RedisError:
+                pass
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: int = None, cost: float = None) -> Any:
+        """
+        读取缓存的值，未命中时计算并写入；同一个键同时未命中时只计算一次
+
+        Args:
+            key: 键
+            compute: 计算函数，返回 None 时不缓存
+            ttl: 过期时间（秒），如果为None则使用命名空间的默认值
+            cost: 重建代价，如果为None则使用命名空间的默认值
+
+        Returns:
+            缓存或计算得到的值
+        """
+        blob = self._lookup(key)
+        if blob is not None:
+            return self.decode(blob)
+
+        with self.cache._key_lock(self.name, key):
+            # 等待锁期间其他线程可能已经算好
+            blob = self._lookup(key, record=False)
+            if blob is not None:
+                self.coalesced += 1
+                return self.decode(blob)
+
+            token = self.cache._acquire_remote_lock(self, key) if self.l2 else None
+            if token is False:
+                # 其他进程正在计算：等待其写入 L2，超时后自行计算
+                blob = self.cache._wait_remote(self, key)
+                if blob is not None:
+                    self.coalesced += 1
+                    return self.decode(blob)
+            try:
+                value = compute()
+                self.set(key, value, ttl, cost)
+                return value
+            finally:
+                if token:
+                    self.cache._release_remote_lock(self, key, token)
+
+    def clear(self):
+        """清空本命名空间的 L1（L2 中的记录按过期时间自然淘汰）"""
+        self.cache._l1_clear(self)
+
+    def stats(self) -> dict:
+        """
+        获取本命名空间的统计信息
+
+        Returns:
+            dict: l1_hits、l2_hits、misses、hit_ratio（两级合计命中率）、sets、evictions（L1 淘汰次数）、
+                  coalesced（击穿保护合并的请求数）、entries、bytes（L1 中的条目数与字节数）、redis_errors、ttl、cost
+        """
+        entries, size = self.cache._l1_usage(self)
+        hits = self.l1_hits + self.l2_hits
+        total = hits + self.misses
+        return {
+            'l1_hits': self.l1_hits,
+            'l2_hits': self.l2_hits,
+            'misses': self.misses,
+            'hit_ratio': round(hits / total, 4) if total else 0.0,
+            'sets': self.sets,
+            'evictions': self.evictions,
+            'coalesced': self.coalesced,
+            'entries': entries,
+            'bytes': size,
+            'redis_errors': self.redis_errors,
+            'ttl': self.ttl,
+            'cost': self.cost
+        }
+
+
+class TieredCache:
+    """
+    两级缓存（线程安全）
+    L1 所有命名空间共享字节预算，按 GreedyDual-Size 淘汰：
+    条目优先级 = 时钟 + 重建代价 / 字节数，淘汰优先级最低的条目并把时钟推进到该优先级，
+    访问时刷新优先级；代价高、体积小、最近访问的条目保留得更久
+    """
+
+    LOCK_PREFIX = 'cache:lock:'
+
+    def __init__(
+        self,
+        redis_client: redis.Redis = None,
+        max_bytes: int = None,
+        use_redis: bool = None,
+        lock_ttl: float = None
+    ):
+        """
+        Args:
+            redis_client: Redis客户端（或兼容 get/setex/ttl/delete/set 的替身），如果为None则首次使用时创建
+            max_bytes: L1 的字节预算，如果为None则使用配置中的值
+            use_redis: 是否启用 Redis 二级缓存，如果为None则使用配置中的值
+            lock_ttl: 跨进程击穿保护锁的过期时间（秒），如果为None则使用配置中的值
+        """
+        self._redis = redis_client
+        self.max_bytes = max_bytes or settings.TIERED_CACHE_MAX_BYTES
+        self.use_redis = settings.TIERED_CACHE_REDIS if use_redis is None else use_redis
+        self.lock_ttl = lock_ttl or settings.TIERED_CACHE_LOCK_TTL
+        self._namespaces: Dict[str, CacheNamespace] = {}
+        self._entries: Dict[tuple, _Entry] = {}
+        self._heap: List[tuple] = []
+        self._bytes = 0
+        self._clock = 0.0
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._key_locks: Dict[tuple, list] = {}
+
+    def _client(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = get_redis_client()
+        return self._redis
+
+    def namespace(
+        self,
+        name: str,
+        ttl: int,
+        cost: float = 1.0,
+        encode: Encoder = None,
+        decode: Decoder = None,
+        l2: bool = True
+    ) -> CacheNamespace:
+        """
+        获取或注册命名空间（同名命名空间只注册一次，后续调用返回已注册的实例）
+
+        Args:
+            name: 命名空间名称
+            ttl: 默认过期时间（秒）
+            cost: 默认重建代价
+            encode: 值的编码函数，默认 JSON
+            decode: 值的解码函数，默认 JSON
+            l2: 是否写入 Redis 二级缓存
+
+        Returns:
+            CacheNamespace 实例
+        """
+        with self._lock:
+            if name not in self._namespaces:
+                self._namespaces[name] = CacheNamespace(self, name, ttl, cost, encode, decode, l2)
+            return self._namespaces[name]
+
+    # ---------- L1 ----------
+
+    def _touch(self, entry: _Entry, full_key: tuple):
+        """刷新条目优先级（调用方需持有锁）"""
+        self._seq += 1
+        entry.seq = self._seq
+        entry.priority = self._clock + entry.cost / max(len(entry.blob), 1)
+        heapq.heappush(self._heap, (entry.priority, entry.seq, full_key))
+        # 过期的堆记录过多时重建堆
+        if len(self._heap) > 4 * len(self._entries) + 64:
+            self._heap = [(e.priority, e.seq, k) for k, e in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def _remove(self, full_key: tuple) -> Optional[_Entry]:
+        """删除条目（调用方需持有锁）"""
+        entry = self._entries.pop(full_key, None)
+        if entry is not None:
+            self._bytes -= len(entry.blob)
+        return entry
+
+    def _evict(self):
+        """淘汰优先级最低的条目，直到不超过字节预算（调用方需持有锁）"""
+        while self._bytes > self.max_bytes and self._heap:
+            priority, seq, full_key = heapq.heappop(self._heap)
+            entry = self._entries.get(full_key)
+            if entry is None or entry.seq != seq:
+                continue
+            self._clock = priority
+            self._remove(full_key)
+            namespace = self._namespaces.get(full_key[0])
+            if namespace is not None:
+                namespace.evictions += 1
+
+    def _l1_get(self, namespace: CacheNamespace, key: str) -> Optional[bytes]:
+        full_key = (namespace.name, key)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is None:
+                return None
+            if entry.expires <= time.time():
+                self._remove(full_key)
+                return None
+            self._touch(entry, full_key)
+            return entry.blob
+
+    def _l1_set(self, namespace: CacheNamespace, key: str, blob: bytes, cost: float, ttl: float):
+        full_key = (namespace.name, key)
+        with self._lock:
+            self._remove(full_key)
+            if len(blob) > self.max_bytes:
+                return
+            entry = _Entry(blob, cost, time.time() + ttl)
+            self._entries[full_key] = entry
+            self._bytes += len(blob)
+            self._touch(entry, full_key)
+            self._evict()
+
+    def _l1_delete(self, namespace: CacheNamespace, key: str):
+        with self._lock:
+            self._remove((namespace.name, key))
+
+    def _l1_clear(self, namespace: CacheNamespace):
+        with self._lock:
+            for full_key in [k for k in self._entries if k[0] == namespace.name]:
+                self._remove(full_key)
+
+    def _l1_usage(self, namespace: CacheNamespace) -> tuple:
+        """返回命名空间在 L1 中的 (条目数, 字节数)"""
+        with self._lock:
+            sizes = [len(e.blob) for k, e in self._entries.items() if k[0] == namespace.name]
+        return len(sizes), sum(sizes)
+
+    # ---------- 击穿保护 ----------
+
+    def _key_lock(self, name: str, key: str) -> '_KeyLock':
+        return _KeyLock(self, (name, key))
+
+    def _acquire_remote_lock(self, namespace: CacheNamespace, key: str):
+        """
+        获取跨进程计算锁
+
+        Returns:
+            获得锁返回令牌；锁被其他进程持有返回 False；Redis 不可用或未启用返回 None
+        """
+        if not self.use_redis:
+            return None
+        token = uuid.uuid4().hex
+        try:
+            acquired = self._client().set(
+                self.LOCK_PREFIX + namespace.redis_key(key), token, nx=True, px=int(self.lock_ttl * 1000)
+            )
+        except redis.exceptions.RedisError:
+            return None
+        return token if acquired else False
+
+    def _release_remote_lock(self, namespace: CacheNamespace, key: str, token: str):
+        lock = self.LOCK_PREFIX + namespace.redis_key(key)
+        try:
+            client = self._client()
+            held = client.get(lock)
+            if held in (token, token.encode('utf-8')):
+                client.delete(lock)
+        except redis.exceptions.RedisError:
+            pass
+
+    def _wait_remote(self, namespace: CacheNamespace, key: str) -> Optional[bytes]:
+        """等待持有锁的进程写入 L2，锁释放或超时后返回（可能为 None）"""
+        lock = self.LOCK_PREFIX + namespace.redis_key(key)
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            blob = namespace._lookup(key, record=False)
+            if blob is not None:
+                return blob
+            try:
+                if not self._client().exists(lock):
+                    return namespace._lookup(key, record=False)
+            except redis.exceptions.RedisError:
+                return None
+        return None
+
+    # ---------- 统计 ----------
+
+    def stats(self) -> dict:
+        """
+        获取全部命名空间的统计信息
+
+        Returns:
+            dict: namespaces（各命名空间的统计）、bytes、max_bytes
+        """
+        namespaces = {name: namespace.stats() for name, namespace in list(self._namespaces.items())}
+        with self._lock:
+            return {
+                'namespaces': namespaces,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+class _KeyLock:
+    """进程内按键加锁，持有者为 0 时回收锁对象"""
+
+    def __init__(self, cache: TieredCache, full_key: tuple):
+        self.cache = cache
+        self.full_key = full_key
+
+    def __enter__(self):
+        with self.cache._lock:
+            slot = self.cache._key_locks.setdefault(self.full_key, [threading.Lock(), 0])
+            slot[1] += 1
+        slot[0].acquire()
+        return self
+
+    def __exit__(self, *exc):
+        with self.cache._lock:
+            slot = self.cache._key_locks[self.full_key]
+            slot[0].release()
+            slot[1] -= 1
+            if slot[1] == 0:
+                del self.cache._key_locks[self.full_key]
+        return False
+
+
+_tiered_cache = None
+
+
+def get_tiered_cache() -> TieredCache:
+    """获取进程内共享的两级缓存"""
+    global _tiered_cache
+    if _tiered_cache is None:
+        _tiered_cache = TieredCache()
+    return _tiered_cache
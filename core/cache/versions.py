@@ -0,0 +1,201 @@
+"""
+数据版本注册表
+记录向量库（vector）、知识图谱（graph）与图模式（schema）的版本号，构建脚本完成后递增对应的版本；
+依赖这些数据的缓存把相关版本放进缓存键（或随条目保存），并在版本变化时清空进程内缓存
+版本保存在 Redis 哈希 cache:versions 中，Redis 不可用时读写本地文件（单机部署的后备）
+"""
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import redis
+
+from config.settings import settings
+from core.cache.redis_client import get_redis_client
+
+
+VECTOR = 'vector'
+GRAPH = 'graph'
+SCHEMA = 'schema'
+SOURCES = (VECTOR, GRAPH, SCHEMA)
+
+
+class VersionRegistry:
+    """
+    数据版本注册表：Redis 哈希为主，本地 JSON 文件为后备
+    递增版本时两处都写入，Redis 不可用时只写文件；读取时取两处中较大的版本号，版本不会回退
+    """
+
+    REDIS_KEY = 'cache:versions'
+
+    def __init__(self, redis_client: redis.Redis = None, path: str = None):
+        """
+        Args:
+            redis_client: Redis客户端，如果为None则首次使用时创建
+            path: 后备文件路径，如果为None则使用配置中的值
+        """
+        self._redis = redis_client
+        self.path = Path(path or settings.DATA_VERSION_FILE)
+        self._file_lock = threading.Lock()
+
+    def _client(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = get_redis_client()
+        return self._redis
+
+    def _read_file(self) -> Dict[str, int]:
+        try:
+            return {source: int(version) for source, version in json.loads(self.path.read_text(encoding='utf-8')).items()}
+        except (OSError, TypeError, ValueError):
+            return {}
+
+    def _write_file(self, versions: Dict[str, int]):
+        with self._file_lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(versions, ensure_ascii=False), encoding='utf-8')
+            tmp.replace(self.path)
+
+    def get_all(self) -> Dict[str, int]:
+        """
+        读取全部数据版本
+
+        Returns:
+            数据源到版本号的映射，从未构建过的数据源版本为0
+        """
+        stored = self._read_file()
+        try:
+            for source, version in self._client().hgetall(self.REDIS_KEY).items():
+                source = source.decode('utf-8')
+                stored[source] = max(stored.get(source, 0), int(version))
+        except redis.exceptions.RedisError:
+            pass
+        return {source: stored.get(source, 0) for source in SOURCES}
+
+    def bump(self, source: str) -> int:
+        """
+        递增数据源的版本号（构建脚本完成后调用）
+
+        Args:
+            source: 数据源（vector / graph / schema）
+
+        Returns:
+            新的版本号
+        """
+        if source not in SOURCES:
+            raise ValueError(f'未知的数据源: {source}，可选: {", ".join(SOURCES)}')
+        versions = self._read_file()
+        version = versions.get(source, 0) + 1
+        try:
+            r = self._client()
+            incremented = int(r.hincrby(self.REDIS_KEY, source, 1))
+            if incremented < version:
+                # Redis 曾不可用（只写了文件）或数据丢失，以较大的版本为准
+                r.hset(self.REDIS_KEY, source, version)
+            version = max(version, incremented)
+        except redis.exceptions.RedisError as e:
+            print(f'⚠️ Redis 不可用，数据版本只写入本地文件: {str(e)}')
+        versions[source] = version
+        try:
+            self._write_file(versions)
+        except OSError as e:
+            print(f'⚠️ 写入数据版本文件失败: {str(e)}')
+        print(f'数据版本已更新: {source} = {version}')
+        return version
+
+
+class VersionWatcher:
+    """
+    数据版本观察者：按间隔轮询注册表（读取版本时顺带检查，不占用后台线程），
+    版本变化时调用已注册的回调（通常用于清空进程内缓存）
+    """
+
+    def __init__(self, registry: VersionRegistry = None, interval: float = None):
+        """
+        Args:
+            registry: 版本注册表，如果为None则创建默认的注册表
+            interval: 两次轮询的最小间隔（秒），如果为None则使用配置中的值
+        """
+        self.registry = registry or VersionRegistry()
+        self.interval = settings.DATA_VERSION_POLL_INTERVAL if interval is None else interval
+        self._versions: Dict[str, int] = {}
+        self._checked_at = None
+        self._listeners: List[Tuple[Tuple[str, ...], Callable[[], None]]] = []
+        self._lock = threading.Lock()
+
+    def on_change(self, callback: Callable[[], None], *sources: str):
+        """
+        注册回调，sources 中任一数据源的版本变化时调用
+
+        Args:
+            callback: 无参数的回调函数
+            sources: 关注的数据源，为空时关注全部数据源
+        """
+        with self._lock:
+            self._listeners.append((sources or SOURCES, callback))
+
+    def versions(self) -> Dict[str, int]:
+        """
+        获取当前的数据版本（超过轮询间隔时重新读取注册表）
+
+        Returns:
+            数据源到版本号的映射
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.interval:
+                return dict(self._versions)
+            self._checked_at = now
+            previous = self._versions
+        current = self.registry.get_all()
+        with self._lock:
+            self._versions = current
+            changed = {source for source in SOURCES if previous and previous.get(source) != current.get(source)}
+            listeners = [callback for sources, callback in self._listeners if changed & set(sources)]
+        if changed:
+            print(f'🔄 数据版本已变化: {", ".join(f"{s}={current[s]}" for s in sorted(changed))}')
+        for callback in listeners:
+            callback()
+        return dict(current)
+
+    def token(self, *sources: str) -> str:
+        """
+        生成放进缓存键的版本标记
+
+        Args:
+            sources: 缓存依赖的数据源
+
+        Returns:
+            例如 'v3.g5'（向量库版本 3、知识图谱版本 5）
+        """
+        versions = self.versions()
+        return '.'.join(f'{source[0]}{versions[source]}' for source in sources)
+
+
+_watcher = None
+
+
+def get_version_watcher() -> VersionWatcher:
+    """获取进程内共享的数据版本观察者"""
+    global _watcher
+    if _watcher is None:
+        _watcher = VersionWatcher()
+    return _watcher
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='查看或递增数据版本')
+    parser.add_argument('action', choices=['show', 'bump'], help='show：查看全部版本；bump：递增指定数据源的版本')
+    parser.add_argument('source', nargs='?', choices=SOURCES, help='数据源（bump 时必填）')
+    args = parser.parse_args()
+
+    registry = VersionRegistry()
+    if args.action == 'bump':
+        if not args.source:
+            parser.error('bump 需要指定数据源')
+        registry.bump(args.source)
+    print(registry.get_all())
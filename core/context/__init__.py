@@ -2,7 +2,8 @@
 上下文增强模块
 用于从对话历史中提取信息，增强用户问题
 """
-from .enhancer import enhance_query_with_context, extract_entities_from_history
+from .enhancer import enhance_query_with_context, extract_entities_from_history, link_entities
+from .planner import plan_query
 
-__all__ = ['enhance_query_with_context', 'extract_entities_from_history']
+__all__ = ['enhance_query_with_context', 'extract_entities_from_history', 'link_entities', 'plan_query']
 
@@ -4,8 +4,21 @@
 """
 import re
 import json
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Iterable, Optional, Tuple
+from config.settings import settings
 from core.models.llm import create_openrouter_client
+from core.graph.entities import EntityDictionary, get_entity_dictionary
+
+
+# 实体词典中参与上下文增强的标签
+ENTITY_KEYS = {'Disease': 'diseases', 'Symptom': 'symptoms', 'Drug': 'drugs'}
+
+# 可以直接替换为主题的指代词（"这个药"、"那个医院"等指的不是会话主题）
+REFERENCE = re.compile(r'(它们|它|这种病|这个病|该病|此病|(?:这个|那个)(?!药|医院|医生|检查|食物|东西|科室|方法))')
+
+# 省略主题的追问（如"那吃什么药呢"），补全时去掉开头的"那/那么"
+ELLIPSIS = re.compile(r'呢[？?！!。]*$')
+LEADING_CONJUNCTION = re.compile(r'^(那么|那)(?!个)')
 
 
 def has_reference_pronouns(query: str) -> bool:
@@ -55,14 +68,37 @@ def has_reference_pronouns(query: str) -> bool:
     return False
 
 
-def extract_entities_from_history(history: List[Dict[str, str]], max_history: int = 5) -> Dict[str, List[str]]:
+def link_entities(texts: Iterable[str], dictionary: EntityDictionary) -> Dict[str, List[str]]:
+    """
+    用实体词典从文本中识别疾病、症状、药物（最长匹配，不调用模型）
+
+    Args:
+        texts: 文本列表（按时间顺序）
+        dictionary: 实体词典
+
+    Returns:
+        dict: 与 extract_entities_from_history 相同的结构，主题为最先出现的疾病（没有时为症状、药物）
+    """
+    entities = {'diseases': [], 'symptoms': [], 'drugs': [], 'topics': []}
+    for text in texts:
+        for match in dictionary.find(text, ENTITY_KEYS):
+            for label in match.labels:
+                key = ENTITY_KEYS.get(label)
+                if key and match.name not in entities[key]:
+                    entities[key].append(match.name)
+    entities['topics'] = (entities['diseases'] or entities['symptoms'] or entities['drugs'])[:1]
+    return entities
+
+
+def extract_entities_from_history(history: List[Dict[str, str]], max_history: int = 5, use_llm: bool = True) -> Dict[str, List[str]]:
     """
     从对话历史中提取主题实体（疾病、症状、药物等）
-    使用大模型进行智能提取
+    优先用实体词典匹配历史问题（不调用模型），词典不可用或匹配不到时使用大模型进行智能提取
     
     Args:
         history: 对话历史列表，每个元素包含 question, answer, timestamp
         max_history: 最多使用最近几条历史记录，默认5条
+        use_llm: 词典匹配不到时是否调用大模型，为False时直接使用简单策略
         
     Returns:
         dict: 包含提取的实体信息
@@ -84,6 +120,15 @@ def extract_entities_from_history(history: List[Dict[str, str]], max_history: in
     if not recent_history:
         return entities
     
+    dictionary = get_entity_dictionary()
+    if dictionary is not None:
+        linked = link_entities((record.get('question', '') for record in recent_history), dictionary)
+        if linked['topics']:
+            return linked
+    
+    if not use_llm:
+        return _guess_entities(recent_history, entities)
+    
     try:
         # 使用大模型提取主题实体
         client = create_openrouter_client()
@@ -123,7 +168,6 @@ def extract_entities_from_history(history: List[Dict[str, str]], max_history: in
 请提取对话的核心主题，并以JSON格式返回。"""
         
         # 调用大模型
-        from config.settings import settings
         response = client.chat.completions.create(
             model=settings.OPENROUTER_LLM_MODEL,
             messages=[
@@ -180,45 +224,113 @@ def extract_entities_from_history(history: List[Dict[str, str]], max_history: in
     except Exception as e:
         # 如果大模型提取失败，使用简单的回退策略
         print(f"⚠️ 大模型提取失败，使用简单策略: {str(e)}")
-        
-        # 回退策略：从第一个问题中提取主题
-        first_question = recent_history[0].get('question', '')
-        if first_question:
-            # 从问题开头提取2-4字的名词短语
-            stop_words = ['的', '了', '是', '在', '有', '和', '就', '不', '人', '都', '一', '一个', 
-                         '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有', '看', 
-                         '好', '自己', '这', '什么', '怎么', '如何', '哪些', '应该', '可以', '需要',
-                         '患者', '注意', '饮食', '治疗', '预防', '症状', '表现', '感觉']
-            
-            words = re.findall(r'[\u4e00-\u9fa5]{2,4}', first_question)
-            meaningful_words = [w for w in words if w not in stop_words and len(w) >= 2]
+        return _guess_entities(recent_history, entities)
+    
+    return entities
+
+
+def _guess_entities(recent_history: List[Dict[str, str]], entities: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """简单策略：从第一个问题开头提取2-4字的名词短语作为主题"""
+    first_question = recent_history[0].get('question', '')
+    if first_question:
+        stop_words = ['的', '了', '是', '在', '有', '和', '就', '不', '人', '都', '一', '一个', 
+                     '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有', '看', 
+                     '好', '自己', '这', '什么', '怎么', '如何', '哪些', '应该', '可以', '需要',
+                     '患者', '注意', '饮食', '治疗', '预防', '症状', '表现', '感觉']
+        
+        words = re.findall(r'[\u4e00-\u9fa5]{2,4}', first_question)
+        meaningful_words = [w for w in words if w not in stop_words and len(w) >= 2]
+        
+        if meaningful_words:
+            main_topic = meaningful_words[0]
+            entities['topics'] = [main_topic]
             
-            if meaningful_words:
-                main_topic = meaningful_words[0]
-                entities['topics'] = [main_topic]
-                
-                # 根据关键词判断实体类型
-                if any(keyword in main_topic for keyword in ['病', '症', '炎', '癌', '瘤']):
-                    entities['diseases'] = [main_topic]
-                elif any(keyword in main_topic for keyword in ['症状', '表现', '感觉', '疼', '痛']):
-                    entities['symptoms'] = [main_topic]
+            # 根据关键词判断实体类型
+            if any(keyword in main_topic for keyword in ['病', '症', '炎', '癌', '瘤']):
+                entities['diseases'] = [main_topic]
+            elif any(keyword in main_topic for keyword in ['症状', '表现', '感觉', '疼', '痛']):
+                entities['symptoms'] = [main_topic]
     
     return entities
 
 
+def apply_topic(query: str, topic: str) -> str:
+    """
+    把主题补充到问题中：问题包含指代词时替换第一个指代词，否则加在问题前面（去掉开头的"那/那么"）
+    
+    Args:
+        query: 用户问题
+        topic: 主题（疾病、症状或药物名称）
+        
+    Returns:
+        str: 增强后的问题
+    """
+    if REFERENCE.search(query):
+        return REFERENCE.sub(topic, query, count=1)
+    query = LEADING_CONJUNCTION.sub('', query, count=1)
+    if any(word in query for word in ['有什么', '哪些', '怎么', '如何', '怎样', '什么']):
+        return f"{topic}{query}"
+    return f"{topic}，{query}"
+
+
+def resolve_query_locally(
+    query: str,
+    history: List[Dict[str, str]],
+    max_history: int = 5,
+    topic: Optional[str] = None
+) -> Optional[Tuple[str, bool]]:
+    """
+    不调用大模型判断问题是否需要增强
+    1. 问题中已有疾病/症状/药物（实体词典匹配）或已包含会话主题：问题完整，不增强
+    2. 问题有真正的指代或省略（它/这个/那个等指代词，或以"呢"结尾）且主题唯一（会话缓存的主题，或历史问题中唯一的疾病/症状/药物）：补全主题
+    其余情况（如"阿司匹林有什么副作用"这类实体不在词典中的问题、历史中有多个候选主题、词典不可用）无法确定，返回 None
+    （has_reference_pronouns 会匹配"什么"、"怎么"等几乎所有问句，不能作为补全主题的依据）
+    
+    Args:
+        query: 用户当前问题
+        history: 对话历史列表
+        max_history: 最多使用最近几条历史记录，默认5条
+        topic: 会话缓存的主题，为None时从历史问题中识别
+        
+    Returns:
+        tuple: (enhanced_query, was_enhanced)，无法在本地确定时返回 None
+    """
+    dictionary = get_entity_dictionary()
+    if dictionary is not None and dictionary.find(query, ENTITY_KEYS):
+        return query, False
+    if topic and topic in query:
+        return query, False
+    if not (REFERENCE.search(query) or ELLIPSIS.search(query)):
+        return None
+    
+    if topic:
+        candidates = [topic]
+    elif dictionary is not None:
+        recent_history = history[-max_history:] if len(history) > max_history else history
+        linked = link_entities((record.get('question', '') for record in recent_history), dictionary)
+        candidates = linked['diseases'] or linked['symptoms'] or linked['drugs']
+    else:
+        candidates = []
+    if len(candidates) != 1:
+        return None
+    return apply_topic(query, candidates[0]), True
+
+
 def enhance_query_with_context(
     query: str, 
     history: List[Dict[str, str]], 
-    max_history: int = 5
+    max_history: int = 5,
+    topic: Optional[str] = None
 ) -> Tuple[str, bool]:
     """
     根据对话历史增强用户问题
-    使用大模型智能判断是否需要增强以及如何增强
+    先在本地判断（resolve_query_locally），无法确定时使用大模型智能判断是否需要增强以及如何增强
     
     Args:
         query: 用户当前问题
         history: 对话历史列表
         max_history: 最多使用最近几条历史记录，默认5条
+        topic: 会话缓存的主题，为None时从历史问题中识别
         
     Returns:
         tuple: (enhanced_query, was_enhanced)
@@ -229,6 +341,11 @@ def enhance_query_with_context(
     if not history:
         return query, False
     
+    if settings.CONTEXT_LOCAL_FILTER_ENABLED:
+        resolved = resolve_query_locally(query, history, max_history, topic)
+        if resolved is not None:
+            return resolved
+    
     try:
         # 使用大模型进行智能增强
         client = create_openrouter_client()
@@ -284,7 +401,6 @@ def enhance_query_with_context(
 请以JSON格式返回结果。"""
         
         # 调用大模型
-        from config.settings import settings
         response = client.chat.completions.create(
             model=settings.OPENROUTER_LLM_MODEL,
             messages=[
@@ -342,16 +458,16 @@ def enhance_query_with_context(
         if not has_reference_pronouns(query):
             return query, False
         
-        # 从历史中提取实体
-        entities = extract_entities_from_history(history, max_history)
+        # 从历史中提取实体（大模型已经失败，不再调用）
+        entities = extract_entities_from_history(history, max_history, use_llm=False)
         
-        # 优先使用疾病名称，如果没有则使用主题关键词
-        main_topic = None
-        if entities['diseases']:
+        # 优先使用会话缓存的主题，其次疾病名称，再次主题关键词
+        main_topic = topic
+        if not main_topic and entities['diseases']:
             main_topic = entities['diseases'][0]
-        elif entities['topics']:
+        elif not main_topic and entities['topics']:
             main_topic = entities['topics'][0]
-        elif entities['symptoms']:
+        elif not main_topic and entities['symptoms']:
             main_topic = entities['symptoms'][0]
         
         # 如果找到了主题，增强问题
@@ -366,16 +482,7 @@ def enhance_query_with_context(
                 return query, False
             
             # 根据问题类型增强
-            if '有什么' in query or '哪些' in query:
-                enhanced = f"{main_topic}{query}"
-            elif '怎么' in query or '如何' in query or '怎样' in query:
-                enhanced = f"{main_topic}{query}"
-            elif '什么' in query:
-                enhanced = f"{main_topic}{query}"
-            else:
-                enhanced = f"{main_topic}，{query}"
-            
-            return enhanced, True
+            return apply_topic(query, main_topic), True
         
         return query, False
 
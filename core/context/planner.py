@@ -0,0 +1,99 @@
+"""
+合并模式的问题规划
+追问原本需要先后调用大模型增强问题、再由知识图谱服务调用大模型生成 Cypher；
+合并模式把对话历史与图模式一起交给大模型，一次结构化输出同时得到补全后的问题、其中的实体和 Cypher，
+补全后的问题用于向量检索，Cypher 随 /query 请求交给知识图谱服务验证并执行（不再生成）
+"""
+import re
+import json
+from typing import Dict, List, Optional
+
+from config.settings import settings
+from core.models.llm import create_openrouter_client
+from core.graph.prompts import create_plan_prompt
+from core.graph.schemas import EXAMPLE_SCHEMA
+
+
+def plan_query(
+    query: str,
+    history: List[Dict[str, str]],
+    max_history: int = 5,
+    topic: Optional[str] = None,
+    llm_client=None
+) -> Optional[Dict]:
+    """
+    一次大模型调用完成 问题补全、实体提取、Cypher 生成
+
+    Args:
+        query: 用户当前问题
+        history: 对话历史列表
+        max_history: 最多使用最近几条历史记录，默认5条
+        topic: 会话缓存的主题（作为提示提供给模型）
+        llm_client: OpenRouter 客户端，为None时创建
+
+    Returns:
+        dict: 规划结果，调用或解析失败时返回 None
+            - query: 补全后的问题（不需要补全时为原问题）
+            - enhanced: 是否进行了补全
+            - entities: 包含 diseases、symptoms、drugs 的字典
+            - cypher_query: Cypher 查询语句，模型认为无法用知识图谱回答时为空字符串
+    """
+    recent_history = history[-max_history:] if len(history) > max_history else history
+    history_text = ""
+    for i, record in enumerate(recent_history, 1):
+        answer = record.get('answer', '')
+        # 只取答案的前100字，避免过长
+        answer_short = answer[:100] + '...' if len(answer) > 100 else answer
+        history_text += f"问题{i}: {record.get('question', '')}\n回答{i}: {answer_short}\n\n"
+    user_prompt = f"对话历史：\n{history_text}"
+    if topic:
+        user_prompt += f"当前会话主题：{topic}\n\n"
+    user_prompt += f"当前问题：{query}"
+
+    try:
+        response = (llm_client or create_openrouter_client()).chat.completions.create(
+            model=settings.OPENROUTER_LLM_MODEL,
+            messages=[
+                {"role": "system", "content": create_plan_prompt(str(EXAMPLE_SCHEMA.model_dump()))},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.1,
+            max_tokens=2048
+        )
+        result = _parse_json(response.choices[0].message.content)
+    except Exception as e:
+        print(f"⚠️ 合并模式规划失败: {str(e)}")
+        return None
+
+    rewritten = str(result.get('rewritten_query') or '').strip() or query
+    entities = result.get('entities') if isinstance(result.get('entities'), dict) else {}
+    plan = {
+        'query': rewritten,
+        'enhanced': rewritten != query,
+        'entities': {key: _names(entities.get(key)) for key in ('diseases', 'symptoms', 'drugs')},
+        'cypher_query': str(result.get('cypher_query') or '').strip()
+    }
+    print(f"🧭 合并模式规划: {query} -> {rewritten}，Cypher: {plan['cypher_query'] or '无'}")
+    return plan
+
+
+def _names(value) -> List[str]:
+    """规范化模型输出的实体字段：字符串视为单个实体，列表保留非空项，其他类型忽略"""
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        return []
+    return [str(name).strip() for name in value if isinstance(name, (str, int, float)) and str(name).strip()]
+
+
+def _parse_json(text: str) -> dict:
+    """从模型输出中解析 JSON 对象（去掉 markdown 代码块标记，取第一个 { 到最后一个 }）"""
+    text = re.sub(r'```(json)?\s*', '', text or '').strip()
+    start_idx = text.find('{')
+    end_idx = text.rfind('}')
+    if start_idx == -1 or end_idx <= start_idx:
+        raise ValueError(f'模型输出中没有 JSON: {text[:100]}')
+    result = json.loads(text[start_idx:end_idx + 1])
+    if not isinstance(result, dict):
+        raise ValueError('模型输出的 JSON 不是对象')
+    return result
@@ -4,9 +4,28 @@ Neo4j知识图谱相关功能
 """
 from core.graph.schemas import EXAMPLE_SCHEMA, GraphSchema, NodeSchema, RelationshipSchema
 from core.graph.validators import CypherValidator, RuleBasedValidator
-from core.graph.prompts import create_system_prompt, create_validation_prompt
+from core.graph.prompts import create_system_prompt, create_validation_prompt, create_plan_prompt
 from core.graph.neo4j_client import Neo4jClient
-from core.graph.models import NL2CypherRequest, CypherResponse, ValidationRequest, ValidationResponse, QueryType
+from core.graph.api_client import GraphServiceClient
+from core.graph.explanations import ExplanationStore, cypher_fingerprint
+from core.graph.cypher_cache import CypherCache, schema_fingerprint
+from core.graph.result_cache import GraphResultCache, canonicalize_cypher
+from core.graph.intents import detect_relation_intents, describe_relation, group_neighborhood
+from core.graph.entities import AhoCorasick, EntityDictionary, EntityMatch, get_entity_dictionary
+from core.graph.templates import CypherTemplates
+from core.graph.models import (
+    NL2CypherRequest,
+    CypherResponse,
+    ValidationRequest,
+    ValidationResponse,
+    GraphQueryRequest,
+    GraphQueryResponse,
+    ExplanationResponse,
+    NeighborhoodRequest,
+    NeighborhoodResponse,
+    AnnotationMode,
+    QueryType
+)
 
 __all__ = [
     'EXAMPLE_SCHEMA',
@@ -17,11 +36,33 @@ __all__ = [
     'RuleBasedValidator',
     'create_system_prompt',
     'create_validation_prompt',
+    'create_plan_prompt',
     'Neo4jClient',
+    'GraphServiceClient',
+    'ExplanationStore',
+    'cypher_fingerprint',
+    'CypherCache',
+    'schema_fingerprint',
+    'GraphResultCache',
+    'canonicalize_cypher',
+    'detect_relation_intents',
+    'describe_relation',
+    'group_neighborhood',
+    'AhoCorasick',
+    'EntityDictionary',
+    'EntityMatch',
+    'get_entity_dictionary',
+    'CypherTemplates',
     'NL2CypherRequest',
     'CypherResponse',
     'ValidationRequest',
     'ValidationResponse',
+    'GraphQueryRequest',
+    'GraphQueryResponse',
+    'ExplanationResponse',
+    'NeighborhoodRequest',
+    'NeighborhoodResponse',
+    'AnnotationMode',
     'QueryType'
 ]
 
@@ -0,0 +1,123 @@
+"""
+知识图谱服务异步客户端
+Agent 服务调用 Graph 服务时复用的连接池客户端，支持主/备地址故障切换
+"""
+import httpx
+from typing import Any, Dict, Optional
+
+from config.settings import settings
+
+
+class GraphServiceClient:
+    """
+    知识图谱服务 HTTP 客户端
+    基于 httpx.AsyncClient，长连接复用，应在应用生命周期内只创建一次
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        backup_url: Optional[str] = None,
+        max_connections: int = None,
+        max_keepalive_connections: int = None,
+        connect_timeout: float = None
+    ):
+        """
+        初始化客户端
+
+        Args:
+            base_url: 知识图谱服务主地址
+            backup_url: 知识图谱服务备用地址，主地址连接失败时切换
+            max_connections: 连接池最大连接数，如果为None则使用配置中的值
+            max_keepalive_connections: 最大保持的空闲长连接数，如果为None则使用配置中的值
+            connect_timeout: 建立连接的超时时间（秒），如果为None则使用配置中的值
+        """
+        self.base_url = base_url.rstrip('/')
+        self.backup_url = backup_url.rstrip('/') if backup_url else None
+        self.connect_timeout = connect_timeout or settings.GRAPH_CLIENT_CONNECT_TIMEOUT
+
+        limits = httpx.Limits(
+            max_connections=max_connections or settings.GRAPH_CLIENT_MAX_CONNECTIONS,
+            max_keepalive_connections=max_keepalive_connections or settings.GRAPH_CLIENT_MAX_KEEPALIVE
+        )
+        # trust_env=False：本地服务间调用不走系统代理
+        self._client = httpx.AsyncClient(limits=limits, trust_env=False)
+
+    def _timeout(self, timeout: float) -> httpx.Timeout:
+        """构造单次调用的超时配置"""
+        return httpx.Timeout(timeout, connect=min(self.connect_timeout, timeout))
+
+    async def post(self, path: str, payload: dict, timeout: float) -> httpx.Response:
+        """
+        调用知识图谱服务接口，主地址连接失败时自动切换到备用地址
+
+        Args:
+            path: 接口路径，如 '/query'
+            payload: 请求JSON
+            timeout: 本次调用的超时时间（秒）
+
+        Returns:
+            httpx.Response 响应对象
+
+        Raises:
+            httpx.TimeoutException: 请求超时
+            httpx.ConnectError: 主备地址均无法连接
+        """
+        try:
+            return await self._client.post(
+                f'{self.base_url}{path}',
+                json=payload,
+                timeout=self._timeout(timeout)
+            )
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            if not self.backup_url:
+                raise
+            print(f'⚠️ 主地址连接失败，尝试备用地址: {self.backup_url}')
+            return await self._client.post(
+                f'{self.backup_url}{path}',
+                json=payload,
+                timeout=self._timeout(timeout)
+            )
+
+    async def query(self, natural_language_query: str, min_confidence: float = 0.7, cypher_query: str = None) -> Dict[str, Any]:
+        """
+        调用 /query，一次往返完成 生成-验证-执行
+
+        Args:
+            natural_language_query: 自然语言问题
+            min_confidence: 执行查询所需的最低置信度
+            cypher_query: 已生成的 Cypher（合并模式），提供时服务不再生成，只验证并执行
+
+        Returns:
+            GraphQueryResponse 格式的字典
+
+        Raises:
+            httpx.HTTPStatusError: 服务返回非 2xx 状态码
+        """
+        payload = {'natural_language_query': natural_language_query, 'min_confidence': min_confidence}
+        if cypher_query:
+            payload['cypher_query'] = cypher_query
+        response = await self.post('/query', payload, settings.GRAPH_QUERY_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    async def neighborhood(self, entity: str) -> Dict[str, Any]:
+        """
+        调用 /neighborhood，获取疾病的一跳邻域
+
+        Args:
+            entity: 疾病名称
+
+        Returns:
+            NeighborhoodResponse 格式的字典
+
+        Raises:
+            httpx.HTTPStatusError: 服务返回非 2xx 状态码
+        """
+        response = await self.post('/neighborhood', {'entity': entity}, settings.GRAPH_EXECUTE_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self):
+        """关闭连接池"""
+        await self._client.aclose()
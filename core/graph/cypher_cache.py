@@ -0,0 +1,115 @@
+"""
+NL2Cypher 生成结果缓存
+按 规范化的问题 + 查询类型 + 图模式版本（模式指纹 + 注册表中的 schema 版本）缓存清理并验证后的 Cypher 及其置信度，
+热门问题不再调用 LLM 生成查询；只缓存通过验证并执行成功的查询
+两级缓存（core/cache/tiered.py）：进程内缓存，以及 Redis（带过期时间，多个进程/副本共享）
+"""
+import json
+import hashlib
+from typing import Any, Dict, Optional
+
+from config.settings import settings
+from core.cache.keys import normalize_query
+from core.cache.tiered import TieredCache, get_tiered_cache
+from core.cache.versions import VersionWatcher, get_version_watcher, SCHEMA
+from core.graph.schemas import EXAMPLE_SCHEMA
+
+
+def schema_fingerprint(schema=None) -> str:
+    """
+    计算图模式的指纹，图模式变化后旧的生成结果自动失效
+
+    Args:
+        schema: 图模式（GraphSchema），如果为None则使用 EXAMPLE_SCHEMA
+
+    Returns:
+        12 位十六进制指纹字符串
+    """
+    dumped = json.dumps((schema or EXAMPLE_SCHEMA).model_dump(), ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(dumped.encode('utf-8')).hexdigest()[:12]
+
+
+class CypherCache:
+    """
+    Cypher 生成结果的两级缓存，基于两级缓存框架的 cypher 命名空间
+    每条记录包含 cypher_query、confidence、validated、validation_errors
+    """
+
+    NAMESPACE = 'cypher'
+    # 重建代价：一次 LLM 生成加验证（约 3 秒），L1 满时优先保留
+    COST = 3000
+
+    def __init__(
+        self,
+        ttl: int = None,
+        tiered_cache: TieredCache = None,
+        schema_version: str = None,
+        watcher: VersionWatcher = None
+    ):
+        """
+        初始化缓存
+
+        Args:
+            ttl: 每条记录的过期时间（秒），如果为None则使用配置中的值
+            tiered_cache: 两级缓存，如果为None则使用进程内共享的两级缓存
+            schema_version: 图模式指纹，如果为None则使用 EXAMPLE_SCHEMA 的指纹
+            watcher: 数据版本观察者，如果为None则使用进程内共享的观察者
+        """
+        self.namespace = (tiered_cache or get_tiered_cache()).namespace(
+            self.NAMESPACE, ttl or settings.CYPHER_CACHE_TTL, cost=self.COST
+        )
+        self.schema_version = schema_version or schema_fingerprint()
+        self.watcher = watcher or get_version_watcher()
+        # 图模式版本变化（python -m core.cache.versions bump schema）后旧的生成结果不再命中
+        self.watcher.on_change(self.clear, SCHEMA)
+
+    def key(self, natural_language: str, query_type: str = None) -> str:
+        """问题对应的缓存键（规范化问题 + 查询类型 + 图模式版本）"""
+        raw = f'{self.schema_version}.{self.watcher.token(SCHEMA)}\n{query_type or ""}\n{normalize_query(natural_language)}'
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, natural_language: str, query_type: str = None) -> Optional[Dict[str, Any]]:
+        """
+        读取问题对应的生成结果
+
+        Args:
+            natural_language: 自然语言问题
+            query_type: 查询类型
+
+        Returns:
+            包含 cypher_query、confidence、validated、validation_errors 的字典，未缓存返回 None
+        """
+        return self.namespace.get(self.key(natural_language, query_type))
+
+    def set(self, natural_language: str, query_type: str, result: Dict[str, Any]):
+        """
+        缓存生成结果（调用方保证查询已通过验证并执行成功）
+
+        Args:
+            natural_language: 自然语言问题
+            query_type: 查询类型
+            result: query_graph 的结果字典
+        """
+        self.namespace.set(self.key(natural_language, query_type), {
+            'cypher_query': result['cypher_query'],
+            'confidence': result['confidence'],
+            'validated': result['validated'],
+            'validation_errors': result['validation_errors']
+        })
+
+    def invalidate(self, natural_language: str, query_type: str = None):
+        """删除问题对应的生成结果（缓存的查询执行失败时调用）"""
+        self.namespace.delete(self.key(natural_language, query_type))
+
+    def clear(self):
+        """清空进程内缓存"""
+        self.namespace.clear()
+
+    def stats(self) -> dict:
+        """
+        获取缓存的统计信息
+
+        Returns:
+            dict: 命名空间的统计信息（见 CacheNamespace.stats），以及 schema_version
+        """
+        return {**self.namespace.stats(), 'schema_version': f'{self.schema_version}.{self.watcher.token(SCHEMA)}'}
@@ -0,0 +1,304 @@
+"""
+实体词典
+按标签保存知识图谱中全部节点的名称（data/dict/*.txt，由 utils/build_dict.py 从 Neo4j 或 medical.jsonl 导出），
+编译为 Aho-Corasick 自动机，对任意文本做线性时间的最长匹配实体链接；
+上下文增强、Cypher 模板快速路径等按名称识别实体的功能共用进程内的同一个词典
+"""
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from config.settings import settings
+from core.cache.versions import get_version_watcher, GRAPH
+
+
+# 节点标签与词表文件
+ENTITY_FILES = {
+    'Disease': 'disease.txt',
+    'Drug': 'drug.txt',
+    'Food': 'food.txt',
+    'Symptom': 'symptom.txt',
+    'Check': 'check.txt',
+    'Department': 'department.txt',
+    'Producer': 'producer.txt',
+    'Category': 'category.txt',
+    'Treatment': 'treatment.txt'
+}
+
+# 读取一种标签的全部节点名称（标签不能参数化，只使用 ENTITY_FILES 中的标签）
+ENTITY_NAMES_QUERY = "MATCH (n:{label}) WHERE n.name IS NOT NULL RETURN DISTINCT n.name AS name"
+
+# 参与匹配的名称最短长度（单字名称容易误匹配）
+MIN_NAME_LENGTH = 2
+
+
+class EntityMatch(NamedTuple):
+    """文本中匹配到的实体"""
+    name: str
+    labels: Tuple[str, ...]
+    start: int
+    end: int
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick 多模式匹配自动机
+    add() 添加全部词后调用 build()，之后 iter() / longest() 对文本的扫描时间与文本长度成线性（另加匹配数）
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 以该状态结尾的词（词长, 附带的数据），没有时为 None
+        self._word: List[Optional[Tuple[int, object]]] = [None]
+        # 沿失败链最近的一个以词结尾的状态，没有时为 -1
+        self._output: List[int] = [-1]
+        self._size = 0
+
+    def add(self, word: str, payload: object = None):
+        """
+        添加一个词（重复添加时覆盖附带的数据）
+
+        Args:
+            word: 词
+            payload: 匹配时返回的数据
+        """
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._word.append(None)
+                self._output.append(-1)
+            state = next_state
+        if self._word[state] is None:
+            self._size += 1
+        self._word[state] = (len(word), payload)
+
+    def build(self):
+        """按广度优先计算失败链与输出链"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                target = self._fail[next_state]
+                self._output[next_state] = target if self._word[target] is not None else self._output[target]
+                queue.append(next_state)
+
+    def iter(self, text: str) -> Iterator[Tuple[int, int, object]]:
+        """
+        查找文本中出现的全部词（可重叠）
+
+        Args:
+            text: 文本
+
+        Yields:
+            (起始位置, 结束位置, 附带的数据)
+        """
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            match = state if self._word[state] is not None else self._output[state]
+            while match > 0:
+                length, payload = self._word[match]
+                yield i + 1 - length, i + 1, payload
+                match = self._output[match]
+
+    def longest(self, text: str) -> List[Tuple[int, int, object]]:
+        """
+        最左最长匹配：从左到右选取不重叠的词，同一起点取最长的词（如"糖尿病肾病"不会再匹配出"糖尿病"）
+
+        Args:
+            text: 文本
+
+        Returns:
+            [(起始位置, 结束位置, 附带的数据)]，按位置排序
+        """
+        selected = []
+        position = 0
+        for start, end, payload in sorted(self.iter(text), key=lambda match: (match[0], -match[1])):
+            if start >= position:
+                selected.append((start, end, payload))
+                position = end
+        return selected
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class EntityDictionary:
+    """按标签保存的实体名称，编译为一个 Aho-Corasick 自动机（同名实体可以有多个标签，如既是疾病也是症状）"""
+
+    def __init__(self, entities: Dict[str, Iterable[str]]):
+        """
+        Args:
+            entities: 标签到名称列表的映射（短于 MIN_NAME_LENGTH 的名称忽略）
+        """
+        labels: Dict[str, List[str]] = {}
+        self.counts: Dict[str, int] = {}
+        for label, names in entities.items():
+            unique = {name.strip() for name in names if name and len(name.strip()) >= MIN_NAME_LENGTH}
+            self.counts[label] = len(unique)
+            for name in unique:
+                labels.setdefault(name, []).append(label)
+        self.automaton = AhoCorasick()
+        for name, name_labels in labels.items():
+            self.automaton.add(name, (name, tuple(name_labels)))
+        self.automaton.build()
+
+    @classmethod
+    def load(cls, path: str = None) -> Optional['EntityDictionary']:
+        """
+        从词表目录加载（每个标签一个文件，每行一个名称）
+
+        Args:
+            path: 词表目录，如果为None则使用配置中的 DATA_DICT_PATH
+
+        Returns:
+            实体词典，目录中没有任何词表文件时返回 None
+        """
+        directory = Path(path or settings.DATA_DICT_PATH)
+        entities = {
+            label: (directory / filename).read_text(encoding='utf-8').splitlines()
+            for label, filename in ENTITY_FILES.items()
+            if (directory / filename).exists()
+        }
+        return cls(entities) if entities else None
+
+    @classmethod
+    def from_graph(cls, driver) -> 'EntityDictionary':
+        """
+        从知识图谱读取全部节点名称
+
+        Args:
+            driver: Neo4j 驱动
+
+        Returns:
+            实体词典
+        """
+        return cls(read_graph_entities(driver))
+
+    def find(self, text: str, labels: Iterable[str] = None) -> List[EntityMatch]:
+        """
+        在文本中做最长匹配实体链接
+
+        Args:
+            text: 文本
+            labels: 只返回带有这些标签之一的实体，为None时返回全部
+
+        Returns:
+            匹配到的实体，按出现位置排序（同一实体可能出现多次）
+        """
+        wanted = set(labels) if labels is not None else None
+        matches = []
+        for start, end, (name, name_labels) in self.automaton.longest(text or ''):
+            if wanted is None or wanted & set(name_labels):
+                matches.append(EntityMatch(name, name_labels, start, end))
+        return matches
+
+    def names(self, text: str, label: str) -> List[str]:
+        """
+        文本中带有指定标签的实体名称
+
+        Args:
+            text: 文本
+            label: 节点标签（如 'Disease'）
+
+        Returns:
+            名称列表（去重、保持出现顺序）
+        """
+        return list(dict.fromkeys(match.name for match in self.find(text, [label])))
+
+    def __len__(self) -> int:
+        return len(self.automaton)
+
+
+def read_graph_entities(driver) -> Dict[str, List[str]]:
+    """
+    从知识图谱读取每种标签的全部节点名称
+
+    Args:
+        driver: Neo4j 驱动
+
+    Returns:
+        标签到名称列表的映射
+    """
+    entities = {}
+    with driver.session() as session:
+        for label in ENTITY_FILES:
+            entities[label] = [record['name'] for record in session.run(ENTITY_NAMES_QUERY.format(label=label))]
+    return entities
+
+
+def dump_entities(entities: Dict[str, Iterable[str]], path: str = None) -> Dict[str, int]:
+    """
+    把实体名称写入词表目录（每个标签一个文件，名称去重排序）
+
+    Args:
+        entities: 标签到名称列表的映射（只写入 ENTITY_FILES 中的标签）
+        path: 词表目录，如果为None则使用配置中的 DATA_DICT_PATH
+
+    Returns:
+        每种标签写入的名称数
+    """
+    directory = Path(path or settings.DATA_DICT_PATH)
+    directory.mkdir(parents=True, exist_ok=True)
+    counts = {}
+    for label, names in entities.items():
+        if label not in ENTITY_FILES:
+            continue
+        unique = sorted({name.strip() for name in names if name and name.strip()})
+        (directory / ENTITY_FILES[label]).write_text('\n'.join(unique) + '\n', encoding='utf-8')
+        counts[label] = len(unique)
+    return counts
+
+
+_dictionary: Optional[EntityDictionary] = None
+_lock = threading.Lock()
+_watching = False
+
+
+def _reset():
+    global _dictionary
+    _dictionary = None
+
+
+def get_entity_dictionary(driver=None) -> Optional[EntityDictionary]:
+    """
+    获取进程内共享的实体词典，首次使用时加载：优先词表目录，其次（提供 driver 时）知识图谱
+    知识图谱版本变化后丢弃，下次使用时重新加载
+
+    Args:
+        driver: Neo4j 驱动，词表目录为空时用于读取节点名称
+
+    Returns:
+        实体词典，都不可用时返回 None（下次调用时重试）
+    """
+    global _dictionary, _watching
+    if _dictionary is not None:
+        return _dictionary
+    with _lock:
+        if not _watching:
+            get_version_watcher().on_change(_reset, GRAPH)
+            _watching = True
+        if _dictionary is None:
+            dictionary = EntityDictionary.load()
+            if dictionary is None and driver is not None:
+                try:
+                    dictionary = EntityDictionary.from_graph(driver)
+                except Exception as e:
+                    print(f'⚠️ 从知识图谱读取实体名称失败: {str(e)}')
+            if dictionary is not None:
+                print(f'✅ 实体词典已加载: {len(dictionary)} 个名称')
+            _dictionary = dictionary
+    return _dictionary
@@ -0,0 +1,101 @@
+"""
+Cypher 查询解释与改进建议缓存
+解释和建议需要额外的 LLM 调用，按 Cypher 指纹缓存，可在后台计算后通过单独接口获取
+"""
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from config.settings import settings
+
+
+def cypher_fingerprint(cypher_query: str) -> str:
+    """
+    计算 Cypher 查询的指纹（忽略大小写与空白差异）
+
+    Args:
+        cypher_query: Cypher 查询语句
+
+    Returns:
+        16 位十六进制指纹字符串
+    """
+    normalized = re.sub(r'\s+', ' ', cypher_query or '').strip().lower()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+class ExplanationStore:
+    """
+    解释/建议的进程内 LRU 缓存（线程安全）
+    每个指纹对应一条记录：cypher_query、explanation、suggestions 及其计算状态
+    """
+
+    def __init__(self, max_size: int = None):
+        """
+        初始化缓存
+
+        Args:
+            max_size: 最多缓存的指纹数量，如果为None则使用配置中的值
+        """
+        self.max_size = max_size or settings.GRAPH_EXPLANATION_CACHE_SIZE
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, fingerprint: str, cypher_query: str) -> Dict[str, Any]:
+        """获取或创建记录（调用方需持有锁）"""
+        entry = self._entries.get(fingerprint)
+        if entry is None:
+            entry = {
+                'cypher_query': cypher_query,
+                'explanation': None,
+                'suggestions': None,
+                'pending': set()
+            }
+            self._entries[fingerprint] = entry
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        self._entries.move_to_end(fingerprint)
+        return entry
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        获取指纹对应的记录
+
+        Returns:
+            包含 cypher_query、explanation、suggestions、pending 的字典，不存在时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                return None
+            self._entries.move_to_end(fingerprint)
+            return {**entry, 'pending': sorted(entry['pending'])}
+
+    def mark_pending(self, cypher_query: str, field: str) -> bool:
+        """
+        标记某个字段（'explanation' 或 'suggestions'）正在后台计算
+
+        Returns:
+            需要调度计算时返回 True；已缓存或已在计算中返回 False
+        """
+        fingerprint = cypher_fingerprint(cypher_query)
+        with self._lock:
+            entry = self._entry(fingerprint, cypher_query)
+            if entry[field] is not None or field in entry['pending']:
+                return False
+            entry['pending'].add(field)
+            return True
+
+    def set(self, cypher_query: str, field: str, value):
+        """写入某个字段的计算结果（None 表示计算失败、不缓存），并清除其计算中状态"""
+        fingerprint = cypher_fingerprint(cypher_query)
+        with self._lock:
+            entry = self._entry(fingerprint, cypher_query)
+            entry[field] = value
+            entry['pending'].discard(field)
+
+    def lookup(self, cypher_query: str, field: str):
+        """按查询语句读取已缓存的字段值，未缓存返回 None"""
+        entry = self.get(cypher_fingerprint(cypher_query))
+        return entry[field] if entry else None
@@ -0,0 +1,133 @@
+"""
+疾病邻域与关系意图
+一次参数化查询取回疾病的全部一跳邻居（症状、药物、食物、检查、科室、并发症、治疗方式、类别），按关系分组；
+追问只涉及这些关系时（如"那吃什么药"、"要做什么检查"），按关键词识别关系意图，直接从邻域中取答案，
+不需要 LLM 生成 Cypher，也不需要再访问 Neo4j
+"""
+import re
+from typing import Any, Dict, List, Tuple
+
+
+# 关系类型描述映射
+RELATIONSHIP_DESCRIPTIONS = {
+    'not_eat': '不能吃',
+    'do_eat': '适合吃',
+    'recommand_eat': '推荐吃',
+    'has_symptom': '的症状',
+    'recommand_drug': '推荐使用的药物',
+    'command_drug': '推荐使用的药物',
+    'need_check': '需要做的检查',
+    'belongs_to': '所属科室',
+    'acompany_with': '的并发症',
+    'drugs_of': '的生产厂商',
+    'treated_by': '的治疗方式',
+    'has_category': '所属类别'
+}
+
+# 描述为"{疾病}患者{描述}的食物"的关系
+FOOD_RELATIONS = ('not_eat', 'do_eat', 'recommand_eat')
+# 描述为"{疾病}{描述}"的关系
+DIRECT_RELATIONS = ('has_symptom', 'recommand_drug', 'command_drug', 'need_check', 'belongs_to', 'acompany_with', 'treated_by', 'has_category')
+
+# 邻域包含的关系（均从 Disease 出发）
+NEIGHBORHOOD_RELATIONS = FOOD_RELATIONS + DIRECT_RELATIONS
+
+# 取回疾病一跳邻域的参数化查询，参数：name、relations、limit（每种关系最多返回的邻居数）
+# 按关系分别截断，邻居很多的关系不会占满其他关系的名额
+NEIGHBORHOOD_QUERY = (
+    "MATCH (d:Disease {name: $name})-[r]->(n) "
+    "WHERE type(r) IN $relations "
+    "WITH type(r) AS relation, collect(DISTINCT n.name)[..$limit] AS names "
+    "RETURN relation, names"
+)
+
+# 关系意图：按顺序匹配，匹配到的文字不再参与后续匹配（如"不能吃"不会再被识别为"吃什么"）
+RELATION_INTENTS = [
+    (re.compile(r'(吃|用|服|开)?(什么|哪些|啥)?(药物|药品|药)'), ('recommand_drug', 'command_drug')),
+    (re.compile(r'不能吃|不可以吃|不宜吃|不要吃|忌口|忌吃|少吃|禁食|避免吃'), ('not_eat',)),
+    (re.compile(r'吃什么|吃哪些|吃啥|能吃|可以吃|宜吃|多吃|饮食|食物|食疗|补充什么'), ('do_eat', 'recommand_eat')),
+    (re.compile(r'症状|表现|征兆|迹象'), ('has_symptom',)),
+    (re.compile(r'检查|化验|检测|诊断'), ('need_check',)),
+    (re.compile(r'科室|哪个科|什么科|挂.{0,2}科|挂号'), ('belongs_to',)),
+    (re.compile(r'并发症|并发|伴随|引起什么病'), ('acompany_with',)),
+    (re.compile(r'治疗|怎么治|如何治|疗法|治法|治好'), ('treated_by',)),
+    (re.compile(r'类别|分类|哪类|什么类|哪一类'), ('has_category',)),
+]
+
+
+def detect_intents(question: str) -> List[Tuple[str, ...]]:
+    """
+    按关键词识别问题涉及的关系意图（不调用模型）
+
+    Args:
+        question: 问题（通常是增强后的问题）
+
+    Returns:
+        意图列表，每个意图是一组关系类型（如药物意图为 ('recommand_drug', 'command_drug')），按 RELATION_INTENTS 的顺序
+    """
+    remaining = question or ''
+    intents = []
+    for pattern, intent_relations in RELATION_INTENTS:
+        if pattern.search(remaining):
+            intents.append(intent_relations)
+            remaining = pattern.sub(' ', remaining)
+    return intents
+
+
+def detect_relation_intents(question: str) -> List[str]:
+    """
+    按关键词识别问题涉及的关系（不调用模型）
+
+    Args:
+        question: 问题（通常是增强后的问题）
+
+    Returns:
+        关系类型列表，按 RELATION_INTENTS 的顺序；没有识别到时返回空列表
+    """
+    return [relation for intent_relations in detect_intents(question) for relation in intent_relations]
+
+
+def group_neighborhood(records: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    把邻域查询的记录按关系分组
+
+    Args:
+        records: NEIGHBORHOOD_QUERY 返回的记录（relation、names），也接受每条记录一个邻居的 relation、name
+
+    Returns:
+        关系类型到邻居名称列表（去重、保持顺序）的映射
+    """
+    grouped: Dict[str, List[str]] = {}
+    for record in records:
+        relation = record.get('relation')
+        if not relation:
+            continue
+        names = record['names'] if isinstance(record.get('names'), list) else [record.get('name')]
+        for name in names:
+            if name and name not in grouped.setdefault(relation, []):
+                grouped[relation].append(name)
+    return grouped
+
+
+def describe_relation(entity: str, relation: str, names: List[str]) -> str:
+    """
+    把一种关系的查询结果格式化为描述性文本
+
+    Args:
+        entity: 主实体（疾病）名称
+        relation: 关系类型，同类关系可用 | 连接（如 'recommand_drug|command_drug'）
+        names: 邻居名称列表
+
+    Returns:
+        描述性文本，如"高血压推荐使用的药物：卡托普利, 硝苯地平"
+    """
+    relations = (relation or '').split('|')
+    description = '、'.join(dict.fromkeys(RELATIONSHIP_DESCRIPTIONS.get(item, '相关') for item in relations))
+    if all(item in FOOD_RELATIONS for item in relations):
+        return f"{entity}患者{description}的食物：{', '.join(names)}"
+    if all(item in DIRECT_RELATIONS for item in relations):
+        return f"{entity}{description}：{', '.join(names)}"
+    if len(relations) > 1:
+        # 不同类的关系混在一起时不拼接描述
+        description = '相关'
+    return f"{entity}的{description}：{', '.join(names)}"
@@ -17,6 +17,13 @@ class QueryType(str, Enum):
     REMOVE = "REMOVE"
 
 
+class AnnotationMode(str, Enum):
+    """解释/改进建议的计算方式"""
+    NONE = "none"    # 不计算
+    SYNC = "sync"    # 在本次请求中同步计算并返回
+    ASYNC = "async"  # 后台计算，通过 GET /explanations/{fingerprint} 获取
+
+
 class NL2CypherRequest(BaseModel):
     """自然语言转Cypher请求模型"""
     natural_language_query: str = Field(
@@ -35,6 +42,11 @@ class NL2CypherRequest(BaseModel):
         ge=1,
         le=1000
     )
+    
+    explain: AnnotationMode = Field(
+        default=AnnotationMode.NONE,
+        description="是否生成查询解释(需要额外一次LLM调用), 默认不生成"
+    )
 
 
 class CypherResponse(BaseModel):
@@ -45,8 +57,8 @@ class CypherResponse(BaseModel):
     )
     
     explanation: str = Field(
-        ...,
-        description="对生成的Cypher查询的解释"
+        default="",
+        description="对生成的Cypher查询的解释, 未请求或后台计算时为空"
     )
     
     confidence: float = Field(
@@ -65,6 +77,11 @@ class CypherResponse(BaseModel):
         default_factory=list,
         description="验证过程中发现的错误"
     )
+    
+    fingerprint: str = Field(
+        default="",
+        description="Cypher查询指纹, 用于通过 GET /explanations/{fingerprint} 获取后台计算的解释"
+    )
 
 
 class ValidationRequest(BaseModel):
@@ -73,6 +90,11 @@ class ValidationRequest(BaseModel):
         ...,
         description="需要验证的Cypher查询"
     )
+    
+    suggest: AnnotationMode = Field(
+        default=AnnotationMode.NONE,
+        description="验证失败时是否生成改进建议(需要额外一次LLM调用), 默认不生成"
+    )
 
 
 class ValidationResponse(BaseModel):
@@ -89,6 +111,180 @@ class ValidationResponse(BaseModel):
     
     suggestions: List[str] = Field(
         default_factory=list,
-        description="改进建议"
+        description="改进建议, 未请求或后台计算时为空"
+    )
+    
+    fingerprint: str = Field(
+        default="",
+        description="Cypher查询指纹, 用于通过 GET /explanations/{fingerprint} 获取后台计算的建议"
+    )
+
+
+class ExplanationResponse(BaseModel):
+    """按Cypher指纹查询解释与改进建议的响应模型"""
+    fingerprint: str = Field(
+        ...,
+        description="Cypher查询指纹"
+    )
+    
+    cypher_query: str = Field(
+        ...,
+        description="指纹对应的Cypher查询语句"
+    )
+    
+    explanation: Optional[str] = Field(
+        default=None,
+        description="查询解释, 尚未计算时为空"
+    )
+    
+    suggestions: Optional[List[str]] = Field(
+        default=None,
+        description="改进建议, 尚未计算时为空"
+    )
+    
+    pending: List[str] = Field(
+        default_factory=list,
+        description="仍在后台计算中的字段"
+    )
+
+
+
+class GraphQueryRequest(BaseModel):
+    """一次往返完成 生成-验证-执行 的请求模型"""
+    natural_language_query: str = Field(
+        description="自然语言描述需求",
+        examples=["感冒有什么症状?"]
+    )
+    
+    query_type: Optional[QueryType] = Field(
+        default=None,
+        description="指定查询类型,如果不指定则由模型推断"
+    )
+    
+    min_confidence: float = Field(
+        default=0.7,
+        description="执行查询所需的最低置信度, 低于该值只返回生成结果不执行",
+        ge=0,
+        le=1
+    )
+    
+    cypher_query: Optional[str] = Field(
+        default=None,
+        description="调用方已生成的Cypher(合并模式), 提供时不再调用 LLM 生成, 只清理、验证并执行"
+    )
+
+
+class GraphQueryResponse(BaseModel):
+    """一次往返完成 生成-验证-执行 的响应模型"""
+    cypher_query: str = Field(
+        ...,
+        description="生成并清理后的Cypher查询语句"
+    )
+    
+    confidence: float = Field(
+        ...,
+        description="模型对生成查询的信心度(0-1)",
+        ge=0,
+        le=1,
+    )
+    
+    validated: bool = Field(
+        default=False,
+        description="查询是否通过模式验证"
+    )
+    
+    validation_errors: List[str] = Field(
+        default_factory=list,
+        description="验证过程中发现的错误"
+    )
+    
+    cached: bool = Field(
+        default=False,
+        description="Cypher 是否来自生成结果缓存(命中时未调用 LLM)"
+    )
+    
+    template: bool = Field(
+        default=False,
+        description="Cypher 是否来自模板快速路径(未调用 LLM)"
+    )
+    
+    planned: bool = Field(
+        default=False,
+        description="Cypher 是否由调用方提供(合并模式, 本服务未调用 LLM)"
+    )
+    
+    parameters: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Cypher 查询参数(模板查询为 {'name': 疾病名称})"
+    )
+    
+    executed: bool = Field(
+        default=False,
+        description="查询是否已执行"
+    )
+    
+    success: bool = Field(
+        default=False,
+        description="查询是否执行成功"
+    )
+    
+    records: List[Dict[str, Any]] = Field(
+        default_factory=list,
+        description="查询返回的记录"
+    )
+    
+    count: int = Field(
+        default=0,
+        description="返回的记录数"
+    )
+    
+    execution_time: float = Field(
+        default=0,
+        description="查询执行耗时(秒)"
+    )
+    
+    result_cached: bool = Field(
+        default=False,
+        description="查询结果是否来自结果缓存(命中时未访问 Neo4j)"
+    )
+    
+    error: Optional[str] = Field(
+        default=None,
+        description="执行失败时的错误信息"
+    )
+
+
+class NeighborhoodRequest(BaseModel):
+    """疾病一跳邻域请求模型"""
+    entity: str = Field(
+        description="疾病名称(需与知识图谱中的名称完全一致)",
+        examples=["高血压"]
     )
 
+
+class NeighborhoodResponse(BaseModel):
+    """疾病一跳邻域响应模型"""
+    entity: str = Field(
+        ...,
+        description="疾病名称"
+    )
+    
+    found: bool = Field(
+        default=False,
+        description="知识图谱中是否存在该疾病的邻居"
+    )
+    
+    relations: Dict[str, List[str]] = Field(
+        default_factory=dict,
+        description="关系类型到邻居名称列表的映射"
+    )
+    
+    count: int = Field(
+        default=0,
+        description="返回的邻居数"
+    )
+    
+    result_cached: bool = Field(
+        default=False,
+        description="查询结果是否来自结果缓存(命中时未访问 Neo4j)"
+    )
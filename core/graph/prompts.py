@@ -136,3 +136,25 @@ def create_validation_prompt(cypher_query: str) -> str:
     建议: [提供改进建议]
     """
 
+
+
+def create_plan_prompt(schema: str) -> str:
+    """
+    创建合并模式的系统提示词：一次调用完成 问题补全、实体提取、Cypher 生成
+    
+    Args:
+        schema: 图模式字符串
+        
+    Returns:
+        系统提示词（Cypher 规则与示例同 create_system_prompt）
+    """
+    return create_system_prompt(schema) + """
+    # 合并模式（覆盖上面最后一句的要求）
+    这次的输入包含对话历史和用户当前问题, 请一次完成以下三件事:
+    1. 如果当前问题依赖上下文(包含指代或省略了主题, 如"有什么特效药?"), 用对话历史中的核心主题把它补全为完整, 独立的问题; 否则保持原问题
+    2. 提取补全后问题中的疾病, 症状, 药物名称
+    3. 按上面的规则为补全后的问题生成一条Cypher查询, 无法用知识图谱回答时为空字符串
+    
+    只返回JSON, 不要返回其他内容:
+    {"rewritten_query": "补全后的问题", "entities": {"diseases": [], "symptoms": [], "drugs": []}, "cypher_query": "Cypher查询"}
+    """
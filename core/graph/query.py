@@ -0,0 +1,581 @@
+"""
+知识图谱查询
+NL2Cypher 生成 -> 清理 -> 验证 -> 执行，以及疾病邻域查询；
+图谱服务（services/graph_service.py）与嵌入模式的 EmbeddedGraphClient 共用这些函数。
+本模块导入时不配置日志、不创建 LLM 客户端或 Web 应用，嵌入模式只需导入本模块
+"""
+import re
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Dict, Any
+
+from openai import OpenAI
+
+from config.settings import settings
+from core.graph.schemas import EXAMPLE_SCHEMA
+from core.graph.prompts import create_system_prompt
+from core.graph.validators import CypherValidator, RuleBasedValidator
+from core.graph.cypher_cache import CypherCache
+from core.graph.templates import CypherTemplates
+from core.graph.result_cache import GraphResultCache
+from core.graph.intents import NEIGHBORHOOD_QUERY, NEIGHBORHOOD_RELATIONS, group_neighborhood
+from core.models.llm import create_openrouter_client
+
+logger = logging.getLogger(__name__)
+
+# NL2Cypher 生成结果缓存（按规范化问题 + 图模式版本）
+cypher_cache = CypherCache() if settings.CYPHER_CACHE_ENABLED else None
+
+# 只读 Cypher 查询结果缓存（按规范化查询 + 参数 + 数据版本）
+result_cache = GraphResultCache() if settings.GRAPH_RESULT_CACHE_ENABLED else None
+
+# NL2Cypher 模板快速路径（关系意图 + 疾病名称 -> 参数化 Cypher，不调用 LLM）
+cypher_templates = CypherTemplates() if settings.CYPHER_TEMPLATE_ENABLED else None
+
+_llm_client = None
+
+
+class GraphQueryError(Exception):
+    """生成或执行查询失败，status_code 为对应的 HTTP 状态码，由图谱服务转换为错误响应"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def get_llm_client() -> OpenAI:
+    """获取共享的 OpenRouter 客户端（首次使用时创建）"""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = create_openrouter_client()
+    return _llm_client
+
+
+def merge_multiple_queries(cypher_query: str) -> str:
+    """检测并合并多个独立的 Cypher 查询（多个 MATCH-RETURN 语句）"""
+    # 检测是否有多个 RETURN 语句（不在 UNION 中）
+    return_count = len(re.findall(r'\bRETURN\b', cypher_query, re.IGNORECASE))
+    
+    # 如果只有一个 RETURN，不需要合并
+    if return_count <= 1:
+        return cypher_query
+    
+    # 检查是否有 UNION，如果有 UNION 则不需要合并
+    if re.search(r'\bUNION\b', cypher_query, re.IGNORECASE):
+        return cypher_query
+    
+    logger.warning(f"检测到 {return_count} 个 RETURN 语句，正在合并多个查询...")
+    
+    # 按 MATCH 分割查询块
+    query_blocks = re.split(r'(?=\bMATCH\b)', cypher_query, flags=re.IGNORECASE)
+    queries = [q.strip() for q in query_blocks if q.strip() and re.search(r'\bMATCH\b', q, re.IGNORECASE) and re.search(r'\bRETURN\b', q, re.IGNORECASE)]
+    
+    if len(queries) <= 1:
+        return cypher_query
+    
+    # 解析每个查询
+    main_node_var = None
+    main_node_label = None
+    common_where = None
+    optional_matches = []
+    return_fields = []
+    
+    for i, query in enumerate(queries):
+        # 提取完整的 MATCH 子句（包括关系和目标节点）
+        match_full = re.search(r'MATCH\s+(.+?)(?:\n|WHERE|RETURN|$)', query, re.IGNORECASE | re.DOTALL)
+        where_clause = re.search(r'WHERE\s+(.+?)(?:\n|RETURN|$)', query, re.IGNORECASE | re.DOTALL)
+        return_clause = re.search(r'RETURN\s+(.+?)$', query, re.IGNORECASE | re.DOTALL)
+        
+        if match_full:
+            match_pattern = match_full.group(1).strip()
+            
+            # 提取第一个节点（主节点）
+            first_node = re.search(r'\((\w+)(?::(\w+))?\)', match_pattern)
+            if first_node:
+                node_var = first_node.group(1)
+                node_label = first_node.group(2)
+                
+                if i == 0:
+                    # 第一个查询：确定主节点和 WHERE
+                    main_node_var = node_var
+                    main_node_label = node_label
+                    if where_clause:
+                        common_where = where_clause.group(1).strip()
+                    
+                    # 第一个查询的完整模式转为 OPTIONAL MATCH（如果包含关系）
+                    if re.search(r'[-[]', match_pattern):
+                        # 提取关系部分（从第一个节点之后开始）
+                        # 查找第一个节点后的内容
+                        node_pattern = f"({node_var}{':' + node_label if node_label else ''})"
+                        if match_pattern.startswith(node_pattern):
+                            rel_part = match_pattern[len(node_pattern):].strip()
+                            if rel_part:
+                                optional_matches.append(f"OPTIONAL MATCH ({main_node_var}{':' + main_node_label if main_node_label else ''}){rel_part}")
+                        else:
+                            optional_matches.append(f"OPTIONAL MATCH {match_pattern}")
+                else:
+                    # 后续查询：转换为 OPTIONAL MATCH
+                    if node_var == main_node_var:
+                        # 使用相同的主节点，提取关系部分
+                        node_pattern = f"({node_var}{':' + node_label if node_label else ''})"
+                        if match_pattern.startswith(node_pattern):
+                            rel_part = match_pattern[len(node_pattern):].strip()
+                            if rel_part:
+                                optional_matches.append(f"OPTIONAL MATCH ({main_node_var}{':' + main_node_label if main_node_label else ''}){rel_part}")
+                        else:
+                            optional_matches.append(f"OPTIONAL MATCH {match_pattern}")
+                    else:
+                        # 替换节点变量
+                        new_pattern = re.sub(
+                            rf'\(\s*{node_var}(?::\w+)?\s*\)',
+                            f'({main_node_var}{":" + main_node_label if main_node_label else ""})',
+                            match_pattern,
+                            count=1
+                        )
+                        optional_matches.append(f"OPTIONAL MATCH {new_pattern}")
+        
+        # 收集 RETURN 字段
+        if return_clause:
+            fields = return_clause.group(1).strip()
+            field_list = [f.strip() for f in re.split(r',(?![^()]*\))', fields) if f.strip()]
+            return_fields.extend(field_list)
+    
+    # 构建合并后的查询
+    if main_node_var:
+        parts = []
+        
+        # 主 MATCH（只匹配主节点）
+        if main_node_label:
+            parts.append(f"MATCH ({main_node_var}:{main_node_label})")
+        else:
+            parts.append(f"MATCH ({main_node_var})")
+        
+        # WHERE
+        if common_where:
+            parts.append(f"WHERE {common_where}")
+        
+        # OPTIONAL MATCH
+        parts.extend(optional_matches)
+        
+        # RETURN（去重）
+        seen = set()
+        unique = []
+        for field in return_fields:
+            alias_match = re.search(r'AS\s+(\w+)', field, re.IGNORECASE)
+            if alias_match:
+                alias = alias_match.group(1)
+                if alias not in seen:
+                    unique.append(field)
+                    seen.add(alias)
+            elif field not in unique:
+                unique.append(field)
+        
+        if unique:
+            parts.append('RETURN ' + ', '.join(unique))
+        
+        merged = '\n'.join(parts)
+        logger.info(f"合并后的查询:\n{merged}")
+        return merged
+    
+    return cypher_query
+
+
+def clean_cypher_query(cypher_query: str) -> str:
+    """清理 Cypher 查询字符串，移除 markdown 代码块标记和注释，修复关系类型语法"""
+    if not cypher_query:
+        return cypher_query
+    
+    # 移除 markdown 代码块标记
+    pattern = r'```(?:cypher)?\s*\n?(.*?)\n?```'
+    match = re.search(pattern, cypher_query, re.DOTALL | re.IGNORECASE)
+    if match:
+        cypher_query = match.group(1).strip()
+    else:
+        cypher_query = cypher_query.strip()
+    
+    # 移除可能残留的前导/尾随标记
+    cypher_query = re.sub(r'^```(?:cypher)?\s*', '', cypher_query, flags=re.IGNORECASE)
+    cypher_query = re.sub(r'```\s*$', '', cypher_query)
+    
+    # 移除 Cypher 多行注释 /* ... */
+    cypher_query = re.sub(r'/\*.*?\*/', '', cypher_query, flags=re.DOTALL)
+    
+    # 移除 Cypher 单行注释 // ...
+    lines = []
+    for line in cypher_query.split('\n'):
+        if '//' in line:
+            comment_pos = line.find('//')
+            if comment_pos >= 0:
+                line = line[:comment_pos].rstrip()
+        if line.strip():
+            lines.append(line)
+    
+    cypher_query = '\n'.join(lines)
+    
+    # 检测并合并多个独立查询（必须在其他修复之前进行）
+    cypher_query = merge_multiple_queries(cypher_query)
+    
+    # 修复关系类型语法错误：将 :type1|:type2 修复为 :type1|type2
+    # Neo4j 新版本不支持在关系类型列表中使用多个冒号
+    # 匹配模式：-[r:type1|:type2]- 或 -[:type1|:type2]- 或 [r:type1|:type2|:type3]
+    cypher_query = re.sub(r':(\w+)\|:(\w+)', r':\1|\2', cypher_query)
+    # 处理多个关系类型的情况，如 :type1|:type2|:type3
+    while re.search(r':(\w+)\|:(\w+)', cypher_query):
+        cypher_query = re.sub(r':(\w+)\|:(\w+)', r':\1|\2', cypher_query)
+    
+    # 修复 COLLECT 函数中的 AS 语法错误
+    # 错误: COLLECT(DISTINCT field.name AS alias)
+    # 正确: COLLECT(DISTINCT field.name) AS alias
+    # 匹配 COLLECT(... AS alias) 的模式，将 AS 移到函数外面
+    def fix_collect_as(match):
+        collect_content = match.group(1)  # COLLECT 函数内的内容（包含 AS alias）
+        # 移除内部的 AS 和别名，保留表达式
+        # 例如: "DISTINCT bad_food.name AS foods_to_avoid" -> "DISTINCT bad_food.name"
+        # 提取别名
+        alias_match = re.search(r'\s+AS\s+(\w+)\s*$', collect_content, re.IGNORECASE)
+        if alias_match:
+            alias = alias_match.group(1)
+            # 移除 AS alias 部分
+            collect_content = re.sub(r'\s+AS\s+\w+\s*$', '', collect_content, flags=re.IGNORECASE).strip()
+            return f'COLLECT({collect_content}) AS {alias}'
+        return match.group(0)
+    
+    # 匹配 COLLECT(... AS alias) 的模式（AS 在函数内部）
+    cypher_query = re.sub(
+        r'COLLECT\s*\(([^)]+\s+AS\s+\w+)\)',
+        fix_collect_as,
+        cypher_query,
+        flags=re.IGNORECASE
+    )
+    
+    # 修复可能不存在的关系类型：将 drugs_of 关系转换为 OPTIONAL MATCH
+    # 如果查询是 MATCH (d:Drug)-[:drugs_of]->(p:Producer) 形式，转换为 OPTIONAL MATCH
+    # 这样可以避免关系不存在时的查询失败
+    if re.search(r'\bdrugs_of\b', cypher_query, re.IGNORECASE):
+        if not re.search(r'OPTIONAL\s+MATCH.*drugs_of', cypher_query, re.IGNORECASE):
+            # 匹配模式：MATCH (var:Label)-[:drugs_of]->(target)
+            def convert_drugs_of(match):
+                full_match = match.group(0)
+                # 提取节点变量和标签
+                node_match = re.search(r'MATCH\s+\((\w+)(?::(\w+))?\)', full_match, re.IGNORECASE)
+                if node_match:
+                    node_var = node_match.group(1)
+                    node_label = node_match.group(2) if node_match.group(2) else ''
+                    # 提取关系部分
+                    rel_match = re.search(r'(-\[[^\]]*drugs_of[^\]]*\][^W]*)', full_match, re.IGNORECASE | re.DOTALL)
+                    if rel_match:
+                        rel_part = rel_match.group(1)
+                        label_str = f':{node_label}' if node_label else ''
+                        return f"MATCH ({node_var}{label_str})\nOPTIONAL MATCH ({node_var}){rel_part}"
+                return full_match
+            
+            # 替换 MATCH ... -[:drugs_of]-> 模式
+            cypher_query = re.sub(
+                r'MATCH\s+\([^)]+\)\s*-\[[^\]]*drugs_of[^\]]*\][^W]*(?=WHERE|RETURN|$)',
+                convert_drugs_of,
+                cypher_query,
+                count=1,
+                flags=re.IGNORECASE | re.DOTALL
+            )
+    
+    # 清理多余的空行
+    cypher_query = re.sub(r'\n\s*\n+', '\n', cypher_query)
+    
+    return cypher_query.strip()
+
+
+def generate_cypher_query(natural_language: str, query_type: str = None, llm_client: OpenAI = None) -> str:
+    """使用 OpenRouter 生成 Cypher 查询（llm_client 为空时使用共享的客户端）"""
+    system_prompt = create_system_prompt(str(EXAMPLE_SCHEMA.model_dump()))
+    user_prompt = natural_language
+    if query_type:
+        user_prompt = f"{query_type}查询: {natural_language}"
+    
+    try:
+        response = (llm_client or get_llm_client()).chat.completions.create(
+            model=settings.OPENROUTER_LLM_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.1,
+            max_tokens=2048,
+            stream=False
+        )
+        raw_query = response.choices[0].message.content.strip()
+        return clean_cypher_query(raw_query)
+    except Exception as e:
+        raise GraphQueryError(500, f"OpenRouter API错误: {str(e)}")
+
+
+def execute_cypher_query(cypher_query: str, driver, clean: bool = True, parameters: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    执行Cypher查询并返回结果（clean=False 表示查询已清理过，跳过重复清理）
+    只读查询的结果（包括空结果）按数据版本缓存，命中时不访问 Neo4j
+    """
+    if not driver:
+        raise GraphQueryError(503, "Neo4j 连接不可用")
+    
+    if clean:
+        cypher_query = clean_cypher_query(cypher_query)
+    
+    start_time = datetime.now()
+    cached = result_cache.get(cypher_query, parameters) if result_cache else None
+    if cached is not None:
+        execution_time = (datetime.now() - start_time).total_seconds()
+        logger.info(f"命中查询结果缓存，返回 {len(cached)} 条记录: {cypher_query}")
+        return {
+            "success": True,
+            "records": cached,
+            "count": len(cached),
+            "execution_time": execution_time,
+            "result_cached": True
+        }
+    
+    logger.info(f"执行 Cypher 查询: {cypher_query}")
+    
+    try:
+        with driver.session() as session:
+            result = session.run(cypher_query, parameters)
+            
+            records = []
+            for record in result:
+                record_dict = {}
+                for key in record.keys():
+                    value = record[key]
+                    if hasattr(value, 'id'):
+                        if hasattr(value, 'labels'):
+                            record_dict[key] = {
+                                'type': 'Node',
+                                'labels': list(value.labels),
+                                'properties': dict(value)
+                            }
+                        elif hasattr(value, 'type'):
+                            record_dict[key] = {
+                                'type': 'Relationship',
+                                'relationship_type': value.type,
+                                'properties': dict(value)
+                            }
+                        else:
+                            record_dict[key] = str(value)
+                    else:
+                        record_dict[key] = value
+                records.append(record_dict)
+            
+            execution_time = (datetime.now() - start_time).total_seconds()
+            result_count = len(records)
+            
+            logger.info(f"查询执行成功，耗时: {execution_time:.3f}秒，返回 {result_count} 条记录")
+            if result_cache:
+                result_cache.set(cypher_query, records, parameters)
+            
+            return {
+                "success": True,
+                "records": records,
+                "count": result_count,
+                "execution_time": execution_time,
+                "result_cached": False
+            }
+    except Exception as e:
+        execution_time = (datetime.now() - start_time).total_seconds()
+        error_msg = str(e)
+        logger.error(f"查询执行失败，耗时: {execution_time:.3f}秒，错误: {error_msg}")
+        raise GraphQueryError(500, f"查询执行失败: {error_msg}")
+
+
+def compute_confidence(errors: List[str]) -> float:
+    """根据验证错误数量计算生成查询的置信度"""
+    confidence = 0.9
+    if errors:
+        confidence = max(0.3, confidence - len(errors) * 0.1)
+    return confidence
+
+
+def query_graph(
+    natural_language: str,
+    validator,
+    driver,
+    query_type: str = None,
+    min_confidence: float = 0.7,
+    llm_client: OpenAI = None,
+    planned_cypher: str = None
+) -> Dict[str, Any]:
+    """
+    一次完成 生成 -> 清理 -> 验证 -> 执行
+    生成结果只做一次模式验证，且不调用 LLM 生成解释或改进建议；
+    单一疾病、单一关系意图的问题直接使用参数化的 Cypher 模板（不调用 LLM）；
+    命中 Cypher 缓存时跳过生成与验证（优先于调用方提供的 Cypher），执行成功的生成结果写入缓存；
+    调用方提供了 Cypher（合并模式）且缓存未命中时不再生成，清理、验证后执行
+    
+    Args:
+        natural_language: 自然语言问题
+        validator: Cypher 验证器
+        driver: Neo4j 驱动
+        query_type: 查询类型
+        min_confidence: 执行查询所需的最低置信度
+        llm_client: 生成 Cypher 使用的 LLM 客户端，为空时使用共享的客户端
+        planned_cypher: 调用方已生成的 Cypher（合并模式），模板与 Cypher 缓存均未命中时使用
+        
+    Returns:
+        包含 Cypher、置信度、验证结果和查询记录的字典
+    """
+    template = cypher_templates.match(natural_language, driver) if cypher_templates else None
+    # 缓存的查询已验证并执行成功，优先于调用方新生成的 Cypher
+    cached = cypher_cache.get(natural_language, query_type) if cypher_cache and not template else None
+    planned = clean_cypher_query(planned_cypher) if planned_cypher and not template and not cached else None
+    parameters = None
+    if template:
+        cypher_query, parameters = template['cypher_query'], template['parameters']
+        # 模板由图模式生成，无需再验证
+        is_valid, errors, confidence = True, [], compute_confidence([])
+        logger.info(f"命中 Cypher 模板: {cypher_query}，参数: {parameters}")
+    elif cached:
+        cypher_query = cached['cypher_query']
+        is_valid, errors, confidence = cached['validated'], cached['validation_errors'], cached['confidence']
+        logger.info(f"命中 Cypher 缓存: {cypher_query}")
+    elif planned:
+        cypher_query = planned
+        logger.info(f"使用调用方提供的 Cypher 查询: {cypher_query}")
+        is_valid, errors = validator.validate_against_schema(cypher_query, EXAMPLE_SCHEMA)
+        if errors:
+            logger.warning(f"查询验证发现错误: {errors}")
+        confidence = compute_confidence(errors)
+    else:
+        # generate_cypher_query 返回的查询已经过 clean_cypher_query 清理
+        cypher_query = generate_cypher_query(natural_language, query_type, llm_client)
+        logger.info(f"生成的 Cypher 查询: {cypher_query}")
+        
+        is_valid, errors = validator.validate_against_schema(cypher_query, EXAMPLE_SCHEMA)
+        if errors:
+            logger.warning(f"查询验证发现错误: {errors}")
+        
+        confidence = compute_confidence(errors)
+    result = {
+        "cypher_query": cypher_query,
+        "confidence": confidence,
+        "validated": is_valid,
+        "validation_errors": errors,
+        "cached": cached is not None,
+        "template": template is not None,
+        "planned": planned is not None,
+        "parameters": parameters or {},
+        "executed": False,
+        "success": False,
+        "records": [],
+        "count": 0,
+        "execution_time": 0,
+        "result_cached": False,
+        "error": None
+    }
+    
+    if not (cypher_query and is_valid and confidence >= min_confidence):
+        logger.info("查询未通过验证或置信度不足，跳过执行")
+        return result
+    
+    result["executed"] = True
+    try:
+        execute_result = execute_cypher_query(cypher_query, driver, clean=False, parameters=parameters)
+        result.update(execute_result)
+    except GraphQueryError as e:
+        result["error"] = str(e.detail)
+    
+    if cypher_cache and not template:
+        if result["success"] and not cached:
+            cypher_cache.set(natural_language, query_type, result)
+        elif not result["success"] and cached and driver:
+            # 缓存的查询执行失败（如图谱结构已变化），删除后下次重新生成
+            cypher_cache.invalidate(natural_language, query_type)
+    return result
+
+
+def fetch_neighborhood(entity: str, driver, limit: int = None) -> Dict[str, Any]:
+    """
+    一次参数化查询获取疾病的一跳邻域（症状、药物、食物、检查、科室、并发症、治疗方式、类别），按关系分组
+    查询结果与其他只读查询一样按数据版本缓存
+    
+    Args:
+        entity: 疾病名称
+        driver: Neo4j 驱动
+        limit: 每种关系最多返回的邻居数，如果为None则使用配置中的值
+        
+    Returns:
+        包含 entity、found、relations、count、result_cached 的字典
+    """
+    parameters = {
+        "name": entity,
+        "relations": list(NEIGHBORHOOD_RELATIONS),
+        "limit": limit or settings.GRAPH_NEIGHBORHOOD_LIMIT
+    }
+    execute_result = execute_cypher_query(NEIGHBORHOOD_QUERY, driver, clean=False, parameters=parameters)
+    relations = group_neighborhood(execute_result["records"])
+    count = sum(len(names) for names in relations.values())
+    logger.info(f"获取疾病邻域: {entity}，{len(relations)} 种关系，{count} 个邻居")
+    return {
+        "entity": entity,
+        "found": bool(relations),
+        "relations": relations,
+        "count": count,
+        "result_cached": execute_result["result_cached"]
+    }
+
+
+class EmbeddedGraphClient:
+    """
+    进程内知识图谱查询客户端（嵌入模式）
+    与 GraphServiceClient 提供相同的 query() 接口，但直接调用 query_graph，
+    复用调用方的 Neo4j 驱动和 LLM 客户端，没有 HTTP 往返与 JSON 编解码
+    """
+    
+    def __init__(self, neo4j_driver=None, llm_client: OpenAI = None):
+        """
+        初始化客户端
+        
+        Args:
+            neo4j_driver: 共享的 Neo4j 驱动，为空时只生成查询、不执行
+            llm_client: 共享的 OpenRouter 客户端，为空时使用本模块共享的客户端
+        """
+        self.neo4j_driver = neo4j_driver
+        self.llm_client = llm_client
+        self.validator = CypherValidator(driver=neo4j_driver) if neo4j_driver else RuleBasedValidator()
+    
+    async def query(self, natural_language_query: str, min_confidence: float = 0.7, cypher_query: str = None) -> Dict[str, Any]:
+        """
+        一次完成 生成-验证-执行（在线程中运行，不阻塞事件循环）
+        
+        Args:
+            natural_language_query: 自然语言问题
+            min_confidence: 执行查询所需的最低置信度
+            cypher_query: 已生成的 Cypher（合并模式），提供时不再生成
+            
+        Returns:
+            与 /query 接口相同结构的字典
+        """
+        return await asyncio.to_thread(
+            query_graph,
+            natural_language_query,
+            self.validator,
+            self.neo4j_driver,
+            None,
+            min_confidence,
+            self.llm_client,
+            cypher_query
+        )
+    
+    async def neighborhood(self, entity: str) -> Dict[str, Any]:
+        """
+        获取疾病的一跳邻域（在线程中运行）
+        
+        Args:
+            entity: 疾病名称
+            
+        Returns:
+            与 /neighborhood 接口相同结构的字典
+        """
+        return await asyncio.to_thread(fetch_neighborhood, entity, self.neo4j_driver)
+    
+    async def aclose(self):
+        """释放资源（Neo4j 驱动与 LLM 客户端由调用方管理，这里不关闭）"""
+        if hasattr(self.validator, "close"):
+            self.validator.close()
@@ -0,0 +1,128 @@
+"""
+知识图谱查询结果缓存
+医疗知识图谱只在 utils/create_graph.py 重新导入时变化，相同的只读 Cypher 查询结果可以直接复用
+按 规范化的 Cypher + 参数 + 知识图谱版本 缓存序列化后的记录，空结果也缓存（较短的过期时间）
+两级缓存（core/cache/tiered.py）：进程内缓存，以及 Redis（多个进程/副本共享）；知识图谱版本变化后旧记录不再命中，进程内缓存清空
+"""
+import re
+import json
+import hashlib
+from typing import Any, Dict, List, Optional
+
+from config.settings import settings
+from core.cache.tiered import TieredCache, get_tiered_cache
+from core.cache.versions import VersionWatcher, get_version_watcher, GRAPH
+
+
+# 字符串字面量（单引号或双引号，支持转义）
+_STRING_LITERAL = re.compile(r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")""")
+# 写操作子句：包含这些子句的查询不缓存
+_WRITE_CLAUSE = re.compile(r'\b(CREATE|MERGE|DELETE|DETACH|SET|REMOVE|DROP|LOAD\s+CSV|CALL|FOREACH)\b', re.IGNORECASE)
+
+
+def canonicalize_cypher(cypher_query: str) -> str:
+    """
+    规范化 Cypher 查询：合并字符串字面量之外的空白、去掉末尾分号
+    字面量保持原样（实体名称区分大小写）
+
+    Args:
+        cypher_query: Cypher 查询语句
+
+    Returns:
+        规范化后的查询语句
+    """
+    parts = _STRING_LITERAL.split(cypher_query or '')
+    # split 的结果中奇数位置是字符串字面量
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r'\s+', ' ', parts[i])
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+def is_read_only(cypher_query: str) -> bool:
+    """判断查询是否只读（忽略字符串字面量中的关键字）"""
+    return not _WRITE_CLAUSE.search(_STRING_LITERAL.sub("''", cypher_query or ''))
+
+
+class GraphResultCache:
+    """
+    Cypher 查询结果的两级缓存，基于两级缓存框架的 graph_result 命名空间
+    每条记录为序列化后的记录列表；只缓存只读查询，执行失败的查询不缓存
+    """
+
+    NAMESPACE = 'graph_result'
+    # 重建代价：一次 Neo4j 查询（约 50 毫秒），L1 满时先于 LLM 生成的结果淘汰
+    COST = 50
+
+    def __init__(
+        self,
+        ttl: int = None,
+        negative_ttl: int = None,
+        tiered_cache: TieredCache = None,
+        watcher: VersionWatcher = None
+    ):
+        """
+        初始化缓存
+
+        Args:
+            ttl: 非空结果的过期时间（秒），如果为None则使用配置中的值
+            negative_ttl: 空结果的过期时间（秒），如果为None则使用配置中的值
+            tiered_cache: 两级缓存，如果为None则使用进程内共享的两级缓存
+            watcher: 数据版本观察者，如果为None则使用进程内共享的观察者
+        """
+        self.namespace = (tiered_cache or get_tiered_cache()).namespace(
+            self.NAMESPACE, ttl or settings.GRAPH_RESULT_CACHE_TTL, cost=self.COST
+        )
+        self.negative_ttl = negative_ttl or settings.GRAPH_RESULT_CACHE_NEGATIVE_TTL
+        self.watcher = watcher or get_version_watcher()
+        self.negative_hits = 0
+        self.watcher.on_change(self.clear, GRAPH)
+
+    def key(self, cypher_query: str, parameters: Dict[str, Any] = None) -> str:
+        """查询对应的缓存键（知识图谱版本 + 规范化查询 + 参数）"""
+        raw = f'{canonicalize_cypher(cypher_query)}\n{json.dumps(parameters or {}, ensure_ascii=False, sort_keys=True, default=str)}'
+        return f'{self.watcher.token(GRAPH)}:{hashlib.sha1(raw.encode("utf-8")).hexdigest()}'
+
+    def get(self, cypher_query: str, parameters: Dict[str, Any] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        读取查询结果
+
+        Args:
+            cypher_query: Cypher 查询语句
+            parameters: 查询参数
+
+        Returns:
+            记录列表（可能为空列表，表示缓存的空结果），未缓存返回 None
+        """
+        if not is_read_only(cypher_query):
+            return None
+        records = self.namespace.get(self.key(cypher_query, parameters))
+        if records == []:
+            self.negative_hits += 1
+        return records
+
+    def set(self, cypher_query: str, records: List[Dict[str, Any]], parameters: Dict[str, Any] = None):
+        """
+        缓存执行成功的查询结果（空结果使用较短的过期时间）
+
+        Args:
+            cypher_query: Cypher 查询语句
+            records: 序列化后的记录列表
+            parameters: 查询参数
+        """
+        if not is_read_only(cypher_query):
+            return
+        self.namespace.set(self.key(cypher_query, parameters), records, ttl=None if records else self.negative_ttl)
+
+    def clear(self):
+        """清空进程内缓存（Redis 中旧版本的记录不再命中，按过期时间自然淘汰）"""
+        self.namespace.clear()
+
+    def stats(self) -> dict:
+        """
+        获取缓存的统计信息
+
+        Returns:
+            dict: 命名空间的统计信息（见 CacheNamespace.stats），以及 negative_hits（命中缓存的空结果）、graph_version
+        """
+        graph_version = self.watcher.versions()[GRAPH]
+        return {**self.namespace.stats(), 'negative_hits': self.negative_hits, 'graph_version': graph_version}
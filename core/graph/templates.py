@@ -0,0 +1,141 @@
+"""
+NL2Cypher 模板快速路径
+大部分知识图谱问题是"某疾病的症状/忌口/宜吃/药物/检查/科室/并发症/治疗方式/类别"，与图模式中从 Disease 出发的关系一一对应；
+按关键词识别关系意图（core/graph/intents.py）、用实体词典（core/graph/entities.py）匹配疾病名称，直接生成参数化的 Cypher，不调用 LLM
+识别不到意图、匹配不到疾病或有歧义（多个意图、多个疾病）时返回 None，由 LLM 生成
+"""
+import re
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from core.graph.entities import EntityDictionary, get_entity_dictionary
+from core.graph.intents import detect_intents
+from core.graph.schemas import EXAMPLE_SCHEMA
+
+
+# 使用模板的关系（治疗方式、类别等问题的问法较多，仍由 LLM 生成）
+TEMPLATE_RELATIONS = (
+    'has_symptom', 'not_eat', 'do_eat', 'recommand_eat', 'recommand_drug', 'command_drug',
+    'need_check', 'belongs_to', 'acompany_with'
+)
+
+# 反向问题（由症状/药物/食物问疾病，如"头痛是什么病的症状"）不使用模板
+REVERSE_QUESTION = re.compile(r'什么病|哪些病|哪种病|什么疾病|哪些疾病|哪种疾病')
+
+
+def disease_targets(schema=None) -> Dict[str, str]:
+    """
+    从图模式中取出从 Disease 出发的关系及其终点标签
+
+    Args:
+        schema: 图模式（GraphSchema），如果为None则使用 EXAMPLE_SCHEMA
+
+    Returns:
+        关系类型到终点节点标签的映射，如 {'has_symptom': 'Symptom'}
+    """
+    return {
+        relationship.type: relationship.to_node
+        for relationship in (schema or EXAMPLE_SCHEMA).relationships
+        if relationship.from_node == 'Disease'
+    }
+
+
+def build_template(relations: Tuple[str, ...], targets: Dict[str, str]) -> Optional[str]:
+    """
+    为一个关系意图生成参数化的 Cypher（参数 name 为疾病名称）
+
+    Args:
+        relations: 意图包含的关系类型
+        targets: 关系类型到终点节点标签的映射（见 disease_targets）
+
+    Returns:
+        Cypher 查询语句，关系不在图模式中或终点标签不一致时返回 None
+    """
+    labels = {targets.get(relation) for relation in relations}
+    if None in labels or len(labels) != 1:
+        return None
+    return f"match (p:Disease)-[r:{'|'.join(relations)}]->(n:{labels.pop()}) where p.name=$name return n.name"
+
+
+class CypherTemplates:
+    """
+    模板快速路径：关系意图 + 疾病名称 -> 参数化 Cypher
+    疾病名称来自进程内共享的实体词典（core/graph/entities.py）
+    """
+
+    def __init__(self, names: Iterable[str] = None, schema=None):
+        """
+        初始化模板
+
+        Args:
+            names: 疾病名称，提供时使用由这些名称构成的词典，否则使用共享的实体词典
+            schema: 图模式，如果为None则使用 EXAMPLE_SCHEMA
+        """
+        self.targets = disease_targets(schema)
+        self.templates = {}
+        self._dictionary = EntityDictionary({'Disease': names}) if names is not None else None
+        self.hits = 0
+        self.misses = 0
+
+    def dictionary(self, driver=None) -> Optional[EntityDictionary]:
+        """
+        获取用于匹配疾病名称的实体词典
+
+        Args:
+            driver: Neo4j 驱动，词表文件不存在时用于读取节点名称
+
+        Returns:
+            实体词典，不可用时返回 None
+        """
+        return self._dictionary if self._dictionary is not None else get_entity_dictionary(driver)
+
+    def template(self, relations: Tuple[str, ...]) -> Optional[str]:
+        """意图对应的参数化 Cypher（按意图缓存）"""
+        if relations not in self.templates:
+            self.templates[relations] = build_template(relations, self.targets)
+        return self.templates[relations]
+
+    def match(self, question: str, driver=None) -> Optional[Dict[str, Any]]:
+        """
+        尝试用模板回答问题
+
+        Args:
+            question: 自然语言问题
+            driver: Neo4j 驱动，词表文件不存在时用于读取节点名称
+
+        Returns:
+            包含 cypher_query、parameters、entity、relations 的字典；
+            不是单一意图（TEMPLATE_RELATIONS 中的关系）、单一疾病的问题返回 None
+        """
+        intents = [] if REVERSE_QUESTION.search(question or '') else detect_intents(question)
+        if len(intents) != 1 or not set(intents[0]) <= set(TEMPLATE_RELATIONS):
+            self.misses += 1
+            return None
+        dictionary = self.dictionary(driver)
+        diseases = dictionary.names(question, 'Disease') if dictionary is not None else []
+        cypher_query = self.template(intents[0]) if len(diseases) == 1 else None
+        if not cypher_query:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return {
+            'cypher_query': cypher_query,
+            'parameters': {'name': diseases[0]},
+            'entity': diseases[0],
+            'relations': list(intents[0])
+        }
+
+    def stats(self) -> dict:
+        """
+        获取模板匹配的统计信息
+
+        Returns:
+            dict: hits（命中模板）、misses（交给 LLM）、hit_ratio、diseases（词典中的疾病名称数，词典未加载为 None）
+        """
+        total = self.hits + self.misses
+        dictionary = self._dictionary if self._dictionary is not None else get_entity_dictionary()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'diseases': dictionary.counts.get('Disease', 0) if dictionary is not None else None
+        }
@@ -11,7 +11,7 @@ from core.graph.schemas import GraphSchema
 class CypherValidator:
     """Cypher查询验证器（使用Neo4j连接）"""
     
-    def __init__(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str):
+    def __init__(self, neo4j_uri: str = None, neo4j_user: str = None, neo4j_password: str = None, driver=None):
         """
         初始化验证器
         
@@ -19,8 +19,10 @@ class CypherValidator:
             neo4j_uri: Neo4j URI
             neo4j_user: Neo4j用户名
             neo4j_password: Neo4j密码
+            driver: 已创建的 Neo4j 驱动，传入时复用该驱动且关闭验证器时不关闭它
         """
-        self.driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+        self._owns_driver = driver is None
+        self.driver = driver or GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
     
     def validate_syntax(self, cypher_query: str) -> Tuple[bool, List[str]]:
         """
@@ -97,8 +99,9 @@ class CypherValidator:
         return len(errors) == 0, errors
     
     def close(self):
-        """关闭Neo4j连接"""
-        self.driver.close()
+        """关闭Neo4j连接（共享的驱动由其创建方负责关闭）"""
+        if self._owns_driver:
+            self.driver.close()
 
 
 class RuleBasedValidator:
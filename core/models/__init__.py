@@ -5,8 +5,11 @@
 from core.models.embeddings import ZhipuAIEmbeddings, OpenRouterEmbeddings
 from core.models.llm import (
     create_openrouter_client, 
+    create_async_openrouter_client,
     create_deepseek_client,  # 向后兼容别名
     generate_openrouter_answer,
+    stream_openrouter_answer,
+    clean_markdown,
     generate_deepseek_answer  # 向后兼容别名
 )
 
@@ -14,8 +17,11 @@ __all__ = [
     'ZhipuAIEmbeddings',
     'OpenRouterEmbeddings',
     'create_openrouter_client',
+    'create_async_openrouter_client',
     'create_deepseek_client',  # 向后兼容别名
     'generate_openrouter_answer',
+    'stream_openrouter_answer',
+    'clean_markdown',
     'generate_deepseek_answer'  # 向后兼容别名
 ]
 
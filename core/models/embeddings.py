@@ -1,10 +1,23 @@
 """
 统一的Embedding模型封装
 智谱AI Embedding模型封装
+查询向量（embed_query）经过两级缓存（tiered 的 embedding 命名空间：进程内 GreedyDual-Size L1 + Redis L2），相同问题不重复调用远程接口
 """
+from typing import Optional
 from langchain.embeddings.base import Embeddings
 from zai import ZhipuAiClient
 from config.settings import settings
+from core.cache.embedding_cache import EmbeddingCache
+
+
+def default_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    根据配置创建查询向量缓存
+    
+    Returns:
+        EmbeddingCache 实例，未启用时返回 None
+    """
+    return EmbeddingCache() if settings.EMBEDDING_CACHE_ENABLED else None
 
 
 class ZhipuAIEmbeddings(Embeddings):
@@ -13,17 +26,21 @@ class ZhipuAIEmbeddings(Embeddings):
     统一管理，避免在多个文件中重复定义
     """
     
-    def __init__(self, client: ZhipuAiClient = None):
+    model = 'embedding-3'
+    
+    def __init__(self, client: ZhipuAiClient = None, cache: Optional[EmbeddingCache] = None):
         """
         初始化Embedding模型
         
         Args:
             client: ZhipuAiClient实例，如果为None则自动创建
+            cache: 查询向量缓存，如果为None则按配置创建（EMBEDDING_CACHE_ENABLED 为 False 时不缓存）
         """
         if client is None:
             self.client = ZhipuAiClient(api_key=settings.ZHIPU_API_KEY)
         else:
             self.client = client
+        self.cache = cache or default_embedding_cache()
     
     def embed_documents(self, texts: list) -> list:
         """
@@ -38,7 +55,7 @@ class ZhipuAIEmbeddings(Embeddings):
         embeddings = []
         for text in texts:
             embedding = self.client.embeddings.create(
-                model='embedding-3',
+                model=self.model,
                 input=[text]
             )
             embeddings.append(embedding.data[0].embedding)
@@ -54,7 +71,9 @@ class ZhipuAIEmbeddings(Embeddings):
         Returns:
             嵌入向量
         """
-        return self.embed_documents([text])[0]
+        if self.cache is None:
+            return self.embed_documents([text])[0]
+        return self.cache.get_or_compute(self.model, text, lambda: self.embed_documents([text])[0])
 
 
 # OpenRouter Embedding 类（保留用于未来扩展）
@@ -64,13 +83,14 @@ class OpenRouterEmbeddings(Embeddings):
     用于通过 OpenRouter 调用其他 Embedding 模型
     """
     
-    def __init__(self, client=None, model: str = None):
+    def __init__(self, client=None, model: str = None, cache: Optional[EmbeddingCache] = None):
         """
         初始化Embedding模型
         
         Args:
             client: OpenAI客户端实例（配置为OpenRouter），如果为None则自动创建
             model: Embedding模型名称，如果为None则使用配置中的默认模型
+            cache: 查询向量缓存，如果为None则按配置创建（EMBEDDING_CACHE_ENABLED 为 False 时不缓存）
         """
         from openai import OpenAI
         if client is None:
@@ -82,6 +102,7 @@ class OpenRouterEmbeddings(Embeddings):
             self.client = client
         
         self.model = model or settings.OPENROUTER_EMBEDDING_MODEL
+        self.cache = cache or default_embedding_cache()
     
     def embed_documents(self, texts: list) -> list:
         """
@@ -112,5 +133,7 @@ class OpenRouterEmbeddings(Embeddings):
         Returns:
             嵌入向量
         """
-        return self.embed_documents([text])[0]
+        if self.cache is None:
+            return self.embed_documents([text])[0]
+        return self.cache.get_or_compute(self.model, text, lambda: self.embed_documents([text])[0])
 
@@ -5,7 +5,8 @@
 """
 import os
 import re
-from openai import OpenAI
+from typing import AsyncIterator, Dict, List
+from openai import OpenAI, AsyncOpenAI
 from config.settings import settings
 
 
@@ -23,6 +24,21 @@ def create_openrouter_client() -> OpenAI:
     return client
 
 
+def create_async_openrouter_client() -> AsyncOpenAI:
+    """
+    创建 OpenRouter 异步客户端
+    用于在事件循环中流式生成回答，等待 token 时不阻塞其他请求
+    
+    Returns:
+        AsyncOpenAI客户端实例（配置为 OpenRouter API）
+    """
+    client = AsyncOpenAI(
+        api_key=settings.OPENROUTER_API_KEY,
+        base_url='https://openrouter.ai/api/v1'
+    )
+    return client
+
+
 # 保持向后兼容的别名
 def create_deepseek_client() -> OpenAI:
     """
@@ -65,7 +81,19 @@ def generate_openrouter_answer(client: OpenAI, question: str, model: str = None)
     
     content = response.choices[0].message.content
     
-    # 后处理：移除可能的 Markdown 格式标记
+    return clean_markdown(content)
+
+
+def clean_markdown(content: str) -> str:
+    """
+    后处理：移除可能的 Markdown 格式标记
+    
+    Args:
+        content: 模型生成的原始文本
+        
+    Returns:
+        清理后的纯文本
+    """
     # 移除 Markdown 粗体 **text**
     content = re.sub(r'\*\*(.*?)\*\*', r'\1', content)
     # 移除 Markdown 斜体 *text*
@@ -84,6 +112,45 @@ def generate_openrouter_answer(client: OpenAI, question: str, model: str = None)
     return content.strip()
 
 
+async def stream_openrouter_answer(
+    client: AsyncOpenAI,
+    messages: List[Dict[str, str]],
+    model: str = None,
+    temperature: float = 0.7,
+    max_tokens: int = 2048
+) -> AsyncIterator[str]:
+    """
+    使用 OpenRouter 异步流式生成答案
+    调用方停止迭代（如客户端断开、任务被取消）时会关闭底层 HTTP 流，不再继续消耗 token
+    
+    Args:
+        client: OpenRouter 异步客户端
+        messages: 对话消息列表
+        model: 模型名称，如果为 None 则使用配置中的默认模型
+        temperature: 采样温度
+        max_tokens: 最大生成 token 数
+        
+    Yields:
+        回答文本片段
+    """
+    if model is None:
+        model = settings.OPENROUTER_LLM_MODEL
+    
+    response = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        stream=True,
+    )
+    try:
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        await response.close()
+
+
 # 保持向后兼容的别名
 def generate_deepseek_answer(client: OpenAI, question: str) -> str:
     """
@@ -2,7 +2,8 @@
 向量存储模块
 Milvus向量数据库相关功能
 """
-from core.vector_store.milvus_client import MilvusVectorStore, PDFRetriever
+from core.vector_store.milvus_client import MilvusVectorStore
+from core.vector_store.result_cache import VectorResultCache
 
-__all__ = ['MilvusVectorStore', 'PDFRetriever']
+__all__ = ['MilvusVectorStore', 'VectorResultCache']
 
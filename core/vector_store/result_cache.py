@@ -0,0 +1,113 @@
+"""
+向量检索结果缓存
+Milvus 混合检索的结果只在 utils/create_vector.py 重建向量库时变化，相同问题、相同检索参数的结果可以直接复用
+按 规范化的问题 + k + 重排参数 + 向量库版本 缓存，命中时既不调用 embedding 接口也不访问 Milvus
+只保存文档 ID 与截断后的文本（JSON），不保存 Document 对象；
+两级缓存（core/cache/tiered.py）：进程内缓存，以及 Redis（多个进程/副本共享）；向量库版本变化后旧记录不再命中，进程内缓存清空
+"""
+import json
+import hashlib
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+from config.settings import settings
+from core.cache.keys import normalize_query
+from core.cache.tiered import TieredCache, get_tiered_cache
+from core.cache.versions import VersionWatcher, get_version_watcher, VECTOR
+
+
+class VectorResultCache:
+    """
+    向量检索结果的两级缓存，基于两级缓存框架的 vector_result 命名空间
+    每条记录为 [{'id': 主键, 'content': 截断后的文本}, ...]；检索失败不缓存
+    """
+
+    NAMESPACE = 'vector_result'
+    # 重建代价：一次远程 embedding 调用加一次 Milvus 混合检索（约 400 毫秒）
+    COST = 400
+
+    def __init__(
+        self,
+        ttl: int = None,
+        max_chars: int = None,
+        tiered_cache: TieredCache = None,
+        watcher: VersionWatcher = None
+    ):
+        """
+        初始化缓存
+
+        Args:
+            ttl: 每条记录的过期时间（秒），如果为None则使用配置中的值
+            max_chars: 每个文档最多保存的字符数，如果为None则使用配置中的值
+            tiered_cache: 两级缓存，如果为None则使用进程内共享的两级缓存
+            watcher: 数据版本观察者，如果为None则使用进程内共享的观察者
+        """
+        self.namespace = (tiered_cache or get_tiered_cache()).namespace(
+            self.NAMESPACE, ttl or settings.VECTOR_RESULT_CACHE_TTL, cost=self.COST
+        )
+        self.max_chars = max_chars or settings.VECTOR_RESULT_CACHE_MAX_CHARS
+        self.watcher = watcher or get_version_watcher()
+        self.watcher.on_change(self.clear, VECTOR)
+
+    def key(self, query: str, k: int, ranker_type: str = None, ranker_params: Dict[str, Any] = None) -> str:
+        """检索对应的缓存键（向量库版本 + 规范化问题 + 检索参数）"""
+        raw = json.dumps(
+            [normalize_query(query), k, ranker_type, ranker_params or {}],
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str
+        )
+        return f'{self.watcher.token(VECTOR)}:{hashlib.sha1(raw.encode("utf-8")).hexdigest()}'
+
+    def _compact(self, docs: List[Document]) -> List[Dict[str, Any]]:
+        """把检索结果压缩为 ID 与截断后的文本"""
+        return [
+            {'id': (doc.metadata or {}).get('pk', getattr(doc, 'id', None)), 'content': doc.page_content[:self.max_chars]}
+            for doc in docs
+        ]
+
+    def search(
+        self,
+        vectorstore,
+        query: str,
+        k: int = 10,
+        ranker_type: str = None,
+        ranker_params: Dict[str, Any] = None
+    ) -> Tuple[List[Document], bool]:
+        """
+        执行混合检索，相同问题与参数的结果直接从缓存返回（同一问题并发未命中时只检索一次）
+
+        Args:
+            vectorstore: Milvus向量存储实例
+            query: 检索问题
+            k: 返回的文档数
+            ranker_type: 重排方式（如 'rrf'）
+            ranker_params: 重排参数
+
+        Returns:
+            (文档列表, 是否命中缓存)；文档只包含 pk 元数据与截断后的文本
+        """
+        computed = []
+
+        def compute():
+            computed.append(True)
+            docs = vectorstore.similarity_search(query, k=k, ranker_type=ranker_type, ranker_params=ranker_params)
+            return self._compact(docs)
+
+        items = self.namespace.get_or_compute(self.key(query, k, ranker_type, ranker_params), compute)
+        docs = [Document(page_content=item['content'], metadata={'pk': item['id']}) for item in items or []]
+        return docs, not computed
+
+    def clear(self):
+        """清空进程内缓存（Redis 中旧版本的记录不再命中，按过期时间自然淘汰）"""
+        self.namespace.clear()
+
+    def stats(self) -> dict:
+        """
+        获取缓存的统计信息
+
+        Returns:
+            dict: 命名空间的统计信息（见 CacheNamespace.stats），以及 vector_version
+        """
+        return {**self.namespace.stats(), 'vector_version': self.watcher.versions()[VECTOR]}
@@ -4,25 +4,33 @@
 基于Agent/agent2.py重构，使用新的模块结构
 """
 import os
-import re
 import json
-import datetime
 import uuid
-import requests
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, StreamingResponse
 from pathlib import Path
+from typing import Optional
+from contextlib import asynccontextmanager
 from langchain_milvus import Milvus, BM25BuiltInFunction
 
 from config.settings import settings
 from config.neo4j_config import NEO4J_CONFIG
 from core.models.embeddings import ZhipuAIEmbeddings
-from core.models.llm import create_openrouter_client, generate_openrouter_answer
-from core.cache.redis_client import get_redis_client, save_conversation_history, save_session_to_history, get_conversation_history_list, get_session_conversations
+from core.models.llm import create_openrouter_client, create_async_openrouter_client
+from core.graph.api_client import GraphServiceClient
+from core.graph.entities import get_entity_dictionary
+from core.cache.redis_client import get_redis_client, save_session_to_history, get_conversation_history_list, get_session_conversations, cache_stats
+from core.cache.singleflight import create_singleflight
+from core.cache.semantic_cache import SemanticAnswerCache
+from core.cache.session_memory import SessionRetrievalMemory
+from core.cache.session_topic import SessionTopicState
+from core.cache.tiered import get_tiered_cache
+from core.vector_store.result_cache import VectorResultCache
 from neo4j import GraphDatabase
 
+from .pipeline import ChatPipeline
 from .streaming_handler import chatbot_stream
 
 
@@ -33,8 +41,49 @@ os.environ["TOKENIZERS_PARALLELISM"] = "false"
 os.environ["GRPC_VERBOSITY"] = "ERROR"  # 只显示错误级别的 gRPC 日志
 os.environ["GLOG_minloglevel"] = "2"  # 抑制 INFO 级别的日志（0=INFO, 1=WARNING, 2=ERROR）
 
+# 知识图谱服务地址
+GRAPH_API_URL = f'http://localhost:{settings.GRAPH_SERVICE_PORT}'
+GRAPH_API_URL_BACKUP = f'http://0.0.0.0:{settings.GRAPH_SERVICE_PORT}'
+
+
+# 生命周期管理
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.GRAPH_QUERY_MODE == 'embedded':
+        # 嵌入模式：进程内直接调用 NL2Cypher 管线，复用本服务的 Neo4j 驱动和 LLM 客户端
+        from core.graph.query import EmbeddedGraphClient
+        app.state.graph_client = EmbeddedGraphClient(neo4j_driver=neo4j_driver, llm_client=client_llm)
+        print('知识图谱查询使用嵌入模式（进程内调用）')
+    else:
+        # 远程模式：启动时创建共享的知识图谱服务客户端（长连接复用）
+        app.state.graph_client = GraphServiceClient(GRAPH_API_URL, GRAPH_API_URL_BACKUP)
+    # 语义答案缓存（进程内），通过数据版本注册表感知向量库/知识图谱重建
+    app.state.semantic_cache = SemanticAnswerCache() if settings.SEMANTIC_CACHE_ENABLED else None
+    # Milvus 混合检索结果缓存（两级），向量库重建后自动失效
+    app.state.vector_cache = VectorResultCache() if settings.VECTOR_RESULT_CACHE_ENABLED else None
+    # 预加载实体词典（上下文增强、Cypher 模板共用），词表文件不存在时从知识图谱读取
+    get_entity_dictionary(neo4j_driver)
+    # 流式与非流式接口共用的问答管线
+    app.state.pipeline = ChatPipeline(
+        milvus_vectorstore=milvus_vectorstore,
+        client_llm=async_client_llm,
+        graph_client=app.state.graph_client,
+        format_docs_func=format_docs,
+        singleflight=create_singleflight(),
+        semantic_cache=app.state.semantic_cache,
+        embedding_model=embedding_model,
+        session_memory=SessionRetrievalMemory() if settings.SESSION_MEMORY_ENABLED else None,
+        vector_cache=app.state.vector_cache,
+        session_topics=SessionTopicState() if settings.SESSION_TOPIC_ENABLED else None
+    )
+    yield
+
+    # 关闭时清理
+    await app.state.graph_client.aclose()
+
+
 # 创建FastAPI应用
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # 添加CORS中间件
 app.add_middleware(
@@ -102,6 +151,8 @@ except Exception as e:
 
 # 创建大语言模型客户端
 client_llm = create_openrouter_client()
+# 流式接口使用异步客户端，等待 token 时不阻塞其他请求
+async_client_llm = create_async_openrouter_client()
 print('创建 OpenRouter 客户端成功...')
 
 # 初始化 Neo4j 驱动（用于知识图谱查询）
@@ -115,11 +166,6 @@ except Exception as e:
     neo4j_driver = None
     print(f'Neo4j 连接失败: {str(e)}，将跳过知识图谱查询')
 
-# 知识图谱服务地址
-GRAPH_API_URL = f'http://localhost:{settings.GRAPH_SERVICE_PORT}'
-GRAPH_API_URL_BACKUP = f'http://0.0.0.0:{settings.GRAPH_SERVICE_PORT}'
-
-
 def format_docs(docs):
     """格式化文档列表为字符串"""
     return "\n\n".join(doc.page_content for doc in docs)
@@ -151,6 +197,24 @@ def get_or_create_session_id(json_post_list: dict) -> str:
     return session_id
 
 
+def get_request_deadline(json_post_list: dict) -> Optional[float]:
+    """
+    从请求中获取本次问答的时间预算（秒），未提供或无效时返回None（使用配置中的默认值）
+    
+    Args:
+        json_post_list: 请求的JSON数据字典
+        
+    Returns:
+        时间预算（秒）或None
+    """
+    deadline = json_post_list.get('deadline')
+    try:
+        deadline = float(deadline)
+    except (TypeError, ValueError):
+        return None
+    return deadline if deadline > 0 else None
+
+
 @app.get("/")
 async def root():
     """根路径，返回前端页面或服务信息"""
@@ -177,10 +241,12 @@ async def api_info():
         "version": "1.0",
         "endpoints": {
             "GET /": "前端页面",
-            "POST /": "医学问答接口，需要传递 {'question': '你的问题'}",
+            "POST /": "医学问答接口，需要传递 {'question': '你的问题'}，可选 'deadline'（本次请求的时间预算，秒）",
             "GET /api/info": "API信息",
             "POST /api/new_session": "创建新会话",
-            "GET /api/sessions": "获取历史会话列表"
+            "GET /api/sessions": "获取历史会话列表",
+            "GET /api/cache/stats": "答案缓存统计",
+            "GET /api/admin/cache": "两级缓存各命名空间的命中率、大小与淘汰次数"
         },
         "port": settings.AGENT_SERVICE_PORT
     }
@@ -277,6 +343,39 @@ async def get_session_detail(session_id: str):
             'error': str(e)
         }
 
+@app.get("/api/cache/stats")
+async def get_cache_stats(request: Request):
+    """
+    获取答案缓存、语义答案缓存、查询向量缓存与向量检索结果缓存的统计信息（命中次数、未命中次数、命中率、当前条目数）
+    """
+    try:
+        redis_client = get_redis_client()
+        semantic_cache = request.app.state.semantic_cache
+        vector_cache = request.app.state.vector_cache
+        return {
+            'status': 200,
+            'answer_cache': cache_stats(redis_client),
+            'semantic_cache': semantic_cache.stats() if semantic_cache else None,
+            'embedding_cache': embedding_model.cache.stats() if embedding_model.cache else None,
+            'vector_result_cache': vector_cache.stats() if vector_cache else None
+        }
+    except Exception as e:
+        print(f"获取缓存统计失败: {str(e)}")
+        return {
+            'status': 500,
+            'error': str(e)
+        }
+
+@app.get("/api/admin/cache")
+async def get_tiered_cache_stats():
+    """
+    获取两级缓存各命名空间的统计信息（命中率、L1 条目数与字节数、淘汰次数）
+    """
+    return {
+        'status': 200,
+        **get_tiered_cache().stats()
+    }
+
 @app.post("/")
 async def chatbot(request: Request):
     """
@@ -312,6 +411,8 @@ async def chatbot(request: Request):
     
     # 检查是否请求流式输出
     use_stream = json_post_list.get('stream', False)
+    # 本次请求的时间预算（可选，覆盖默认的 PIPELINE_DEADLINE）
+    deadline = get_request_deadline(json_post_list)
     
     if use_stream:
         # 返回流式响应
@@ -319,11 +420,8 @@ async def chatbot(request: Request):
             chatbot_stream(
                 query=query,
                 session_id=session_id,
-                milvus_vectorstore=milvus_vectorstore,
-                client_llm=client_llm,
-                graph_api_url=GRAPH_API_URL,
-                graph_api_url_backup=GRAPH_API_URL_BACKUP,
-                format_docs_func=format_docs
+                pipeline=app.state.pipeline,
+                deadline=deadline
             ),
             media_type="text/event-stream",
             headers={
@@ -333,284 +431,31 @@ async def chatbot(request: Request):
             }
         )
 
-    # 初始化搜索路径和结果追踪
-    search_path = []
-    search_stages = {
-        'milvus_vector': {'status': 'pending', 'results': [], 'count': 0, 'description': '向量数据库检索'},
-        'knowledge_graph': {'status': 'pending', 'results': [], 'count': 0, 'description': '知识图谱查询', 'cypher_query': '', 'confidence': 0}
-    }
+    # 非流式：执行同一条问答管线，收集流式输出后一次性返回
+    result = None
+    error = None
+    async for event_type, data in app.state.pipeline.run(query, session_id, deadline):
+        if event_type == 'answer_complete':
+            result = data
+        elif event_type == 'answer_error':
+            error = data
 
-    # 1、向量数据库检索
-    try:
-        recall_rerank_milvus = milvus_vectorstore.similarity_search(
-            query,
-            k=10,
-            ranker_type='rrf',
-            ranker_params={'k': 100}
-        )
-        
-        if recall_rerank_milvus:
-            context = format_docs(recall_rerank_milvus)
-            search_stages['milvus_vector']['status'] = 'success'
-            search_stages['milvus_vector']['count'] = len(recall_rerank_milvus)
-            search_stages['milvus_vector']['results'] = [
-                doc.page_content[:200] + '...' if len(doc.page_content) > 200 else doc.page_content
-                for doc in recall_rerank_milvus[:3]
-            ]
-            search_path.append('milvus_vector')
-        else:
-            context = ""
-            search_stages['milvus_vector']['status'] = 'empty'
-    except Exception as e:
-        context = ""
-        search_stages['milvus_vector']['status'] = 'error'
-        search_stages['milvus_vector']['error'] = str(e)
-        print(f'向量检索错误: {str(e)}')
-
-    # 2、知识图谱查询
-    graph_context = ""
-    current_api_url = GRAPH_API_URL
-    
-    try:
-        graph_data = {'natural_language_query': query}
-        
-        try:
-            graph_response = requests.post(
-                f'{current_api_url}/generate',
-                json=graph_data,
-                timeout=60,
-                proxies={'http': None, 'https': None}
-            )
-        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-            print(f'⚠️ 主地址连接失败，尝试备用地址: {GRAPH_API_URL_BACKUP}')
-            current_api_url = GRAPH_API_URL_BACKUP
-            graph_response = requests.post(
-                f'{current_api_url}/generate',
-                json=graph_data,
-                timeout=60,
-                proxies={'http': None, 'https': None}
-            )
-        
-        if graph_response.status_code == 200:
-            graph_response_data = graph_response.json()
-            cypher_query = graph_response_data.get('cypher_query')
-            confidence = graph_response_data.get('confidence', 0)
-            is_valid = graph_response_data.get('validated', False)
-            
-            search_stages['knowledge_graph']['cypher_query'] = cypher_query or ''
-            search_stages['knowledge_graph']['confidence'] = float(confidence) if confidence else 0
-            
-            if cypher_query and float(confidence) >= 0.7 and is_valid:
-                print(f'知识图谱查询生成成功，置信度: {confidence}')
-                
-                # 验证查询
-                validate_data = {'cypher_query': cypher_query}
-                validate_response = requests.post(
-                    f'{current_api_url}/validate',
-                    json=validate_data,
-                    timeout=15,
-                    proxies={'http': None, 'https': None}
-                )
-                
-                if validate_response.status_code == 200:
-                    validate_data = validate_response.json()
-                    if validate_data.get('is_valid', False):
-                        # 执行查询
-                        execute_data = {'cypher_query': cypher_query}
-                        execute_response = requests.post(
-                            f'{current_api_url}/execute',
-                            json=execute_data,
-                            timeout=20,
-                            proxies={'http': None, 'https': None}
-                        )
-                        
-                        if execute_response.status_code == 200:
-                            execute_result = execute_response.json()
-                            if execute_result.get('success') and execute_result.get('records'):
-                                records = execute_result['records']
-                                
-                                # 解析Cypher查询，提取关键信息
-                                relationship_type = None
-                                disease_name = None
-                                entity_type = None
-                                
-                                rel_match = re.search(r'\[[^:]*:(.*?)\]', cypher_query)
-                                if rel_match:
-                                    relationship_type = rel_match.group(1).strip()
-                                
-                                disease_match = re.search(r"p\.name\s*=\s*['\"](.*?)['\"]", cypher_query)
-                                if disease_match:
-                                    disease_name = disease_match.group(1)
-                                
-                                return_match = re.search(r'RETURN\s+(\w+)\.name', cypher_query, re.IGNORECASE)
-                                if return_match:
-                                    var_name = return_match.group(1)
-                                    var_def_match = re.search(rf'\({var_name}:(\w+)\)', cypher_query)
-                                    if var_def_match:
-                                        entity_type = var_def_match.group(1)
-                                
-                                # 关系类型描述映射
-                                relationship_descriptions = {
-                                    'not_eat': '不能吃',
-                                    'do_eat': '适合吃',
-                                    'recommand_eat': '推荐吃',
-                                    'has_symptom': '的症状',
-                                    'recommand_drug': '推荐使用的药物',
-                                    'command_drug': '推荐使用的药物',
-                                    'need_check': '需要做的检查',
-                                    'belongs_to': '所属科室',
-                                    'acompany_with': '的并发症',
-                                    'drugs_of': '的生产厂商'
-                                }
-                                
-                                relationship_desc = relationship_descriptions.get(relationship_type, '相关')
-                                
-                                # 格式化知识图谱查询结果
-                                graph_results = []
-                                entity_names = []
-                                
-                                for record in records:
-                                    for key, value in record.items():
-                                        if isinstance(value, dict):
-                                            if value.get('type') == 'Node':
-                                                props = value.get('properties', {})
-                                                if 'name' in props:
-                                                    entity_names.append(props['name'])
-                                            elif value.get('type') == 'Relationship':
-                                                props = value.get('properties', {})
-                                                if 'name' in props:
-                                                    entity_names.append(props['name'])
-                                        else:
-                                            if value is not None:
-                                                value_str = str(value).strip()
-                                                if value_str:
-                                                    entity_names.append(value_str)
-                                
-                                # 生成描述性文本
-                                if entity_names:
-                                    if disease_name and relationship_desc:
-                                        if relationship_type in ['not_eat', 'do_eat', 'recommand_eat']:
-                                            graph_results.append(f"{disease_name}患者{relationship_desc}的食物：{', '.join(entity_names)}")
-                                        elif relationship_type == 'has_symptom':
-                                            graph_results.append(f"{disease_name}{relationship_desc}：{', '.join(entity_names)}")
-                                        elif relationship_type in ['recommand_drug', 'command_drug']:
-                                            graph_results.append(f"{disease_name}{relationship_desc}：{', '.join(entity_names)}")
-                                        elif relationship_type == 'need_check':
-                                            graph_results.append(f"{disease_name}{relationship_desc}：{', '.join(entity_names)}")
-                                        elif relationship_type == 'belongs_to':
-                                            graph_results.append(f"{disease_name}{relationship_desc}：{', '.join(entity_names)}")
-                                        elif relationship_type == 'acompany_with':
-                                            graph_results.append(f"{disease_name}{relationship_desc}：{', '.join(entity_names)}")
-                                        else:
-                                            graph_results.append(f"{disease_name}的{relationship_desc}：{', '.join(entity_names)}")
-                                    else:
-                                        if entity_names:
-                                            graph_results.append(f"查询结果：{', '.join(entity_names)}")
-                                
-                                if graph_results:
-                                    graph_context = "【知识图谱查询结果 - 这是从结构化知识图谱数据库中查询到的准确信息，请作为回答的核心依据】\n" + "\n".join(graph_results)
-                                    search_stages['knowledge_graph']['status'] = 'success'
-                                    search_stages['knowledge_graph']['count'] = len(entity_names)
-                                    search_stages['knowledge_graph']['results'] = graph_results
-                                    search_path.append('knowledge_graph')
-                                    print(f'✅ 知识图谱查询成功，返回 {len(entity_names)} 条结果')
-                                
-    except requests.exceptions.Timeout as e:
-        search_stages['knowledge_graph']['status'] = 'error'
-        search_stages['knowledge_graph']['error'] = f'请求超时: {str(e)}'
-        print(f'⚠️ 知识图谱服务请求超时: {str(e)}')
-    except requests.exceptions.ConnectionError as e:
-        search_stages['knowledge_graph']['status'] = 'error'
-        search_stages['knowledge_graph']['error'] = f'连接失败: {str(e)}'
-        print(f'⚠️ 知识图谱服务连接失败: {str(e)}')
-    except Exception as e:
-        search_stages['knowledge_graph']['status'] = 'error'
-        search_stages['knowledge_graph']['error'] = f'查询异常: {str(e)}'
-        print(f'⚠️ 知识图谱查询异常: {str(e)}')
-    
-    # 合并所有上下文 - 以知识图谱为核心，结合向量搜索结果
-    vector_context_label = ""
-    if context:
-        vector_context_label = "【向量检索补充信息 - 这些信息来自向量数据库检索，可作为补充和参考，帮助完善答案】"
-    
-    if graph_context:
-        # 如果有知识图谱结果，以知识图谱为核心，向量检索作为补充
-        if context:
-            context = graph_context + '\n\n' + vector_context_label + '\n' + context
-        else:
-            context = graph_context
-        print(f'📝 最终上下文长度: {len(context)} 字符（知识图谱为核心，向量检索作为补充）')
-    else:
-        # 如果没有知识图谱结果，使用向量检索结果
-        if context:
-            context = vector_context_label + '\n' + context
-        print('⚠️ 本次查询未使用知识图谱结果，仅使用向量检索结果')
-
-    # 定义系统提示和用户提示
-    SYSTEM_PROMPT = """
-        System: 你是一个非常得力的医学助手, 你可以通过从数据库中检索出的信息找到问题的答案.
-        
-        重要要求：
-        1. 回答必须使用纯文本格式，不要使用任何 Markdown 格式（如 **粗体**、*斜体*、# 标题等）
-        2. 不要使用任何 HTML 标签（如 <p>、<br>、<div> 等）
-        3. 不要使用代码块格式（如 ``` 等）
-        4. 直接使用普通的中文文本回答，使用换行符分隔段落
-        5. 保持回答简洁、清晰、专业
-        6. **以知识图谱为核心，结合向量搜索结果**：
-           - 如果上下文中包含"【知识图谱查询结果】"部分，这些信息是从结构化知识图谱数据库中查询到的准确信息，必须作为回答的核心依据。
-           - 如果上下文中还包含"【向量检索补充信息】"部分，这些信息来自向量数据库检索，应该结合知识图谱结果一起使用，帮助完善和丰富答案。
-           - 知识图谱结果具有更高的准确性和权威性，应该优先使用；向量检索结果可以作为补充，提供更全面的信息。
-    """
-
-    USER_PROMPT = f"""
-        User: 利用介于<context>和</context>之间的从数据库中检索出的信息来回答问题, 具体的问题介于<question>和</question>之间.
-        
-        **重要提示 - 综合使用两路查询结果**：
-        1. **以知识图谱为核心**：如果上下文中包含"【知识图谱查询结果】"部分，这些信息是从结构化知识图谱数据库中查询到的准确信息，必须作为回答的核心依据和主要信息来源。
-        2. **结合向量搜索结果**：如果上下文中还包含"【向量检索补充信息】"部分，这些信息来自向量数据库检索，应该与知识图谱结果结合使用，帮助完善、丰富和补充答案，提供更全面的信息。
-        3. **综合策略**：
-           - 优先使用知识图谱查询结果作为核心答案
-           - 使用向量检索结果补充细节、背景信息或相关知识点
-           - 如果知识图谱结果和向量检索结果有冲突，以知识图谱结果为准
-           - 如果只有向量检索结果，可以使用它作为主要信息来源
-        4. 如果提供的信息为空, 则按照你的经验知识来给出尽可能严谨准确的回答。
-        5. 不知道的时候坦诚的承认不了解, 不要编造不真实的信息。
-        6. 请用纯文本格式回答，不要使用任何特殊标签或格式标记。
-        
-        <context>
-        {context}
-        </context>
-
-        <question>
-        {query}
-        </question>
-    """
-
-    # 使用 OpenRouter 模型生成回复
-    response = generate_openrouter_answer(client_llm, SYSTEM_PROMPT + USER_PROMPT)
-
-    # 保存对话历史到Redis
-    new_session_id = None
-    try:
-        redis_client = get_redis_client()
-        new_session_id, should_create_new = save_conversation_history(redis_client, session_id, query, response)
-        
-        # 如果达到10条，需要创建新会话
-        if should_create_new and new_session_id:
-            print(f"对话达到10条，自动创建新会话: {new_session_id}")
-    except Exception as e:
-        print(f"保存对话历史失败: {str(e)}")
+    if result is None:
+        return {
+            'status': 500,
+            'session_id': session_id,
+            'error': error.get('error') if error else '未知错误'
+        }
 
-    now = datetime.datetime.now()
-    time = now.strftime("%Y-%m-%d %H:%M:%S")
+    new_session_id = result['new_session_id']
     answer = {
-        'response': response,
+        'response': result['response'],
         'status': 200,
-        'time': time,
+        'time': result['time'],
         'session_id': new_session_id if new_session_id else session_id,  # 如果创建了新会话，返回新的session_id
-        'new_session_created': new_session_id is not None,  # 标识是否创建了新会话
-        'search_path': search_path,
-        'search_stages': search_stages
+        'new_session_created': result['new_session_created'],  # 标识是否创建了新会话
+        'search_path': result['search_path'],
+        'search_stages': result['search_stages']
     }
     return answer
 
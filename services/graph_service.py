@@ -4,24 +4,47 @@
 基于Agent/GraphDatabase/main.py重构，使用新的模块结构
 """
 import os
-import re
 import logging
-from datetime import datetime
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from contextlib import asynccontextmanager
-from openai import OpenAI
 from dotenv import load_dotenv
 from neo4j import GraphDatabase
-from typing import List, Dict, Any
+from typing import List
 
 from config.settings import settings
 from config.neo4j_config import NEO4J_CONFIG
-from core.graph.models import NL2CypherRequest, CypherResponse, ValidationRequest, ValidationResponse
+from core.graph.models import (
+    NL2CypherRequest,
+    CypherResponse,
+    ValidationRequest,
+    ValidationResponse,
+    GraphQueryRequest,
+    GraphQueryResponse,
+    ExplanationResponse,
+    NeighborhoodRequest,
+    NeighborhoodResponse,
+    AnnotationMode
+)
 from core.graph.schemas import EXAMPLE_SCHEMA
-from core.graph.prompts import create_system_prompt, create_validation_prompt
+from core.graph.prompts import create_validation_prompt
 from core.graph.validators import CypherValidator, RuleBasedValidator
+from core.graph.explanations import ExplanationStore, cypher_fingerprint
+from core.graph.query import (
+    GraphQueryError,
+    cypher_cache,
+    result_cache,
+    cypher_templates,
+    generate_cypher_query,
+    execute_cypher_query,
+    compute_confidence,
+    query_graph,
+    fetch_neighborhood,
+    get_llm_client
+)
+from core.cache.tiered import get_tiered_cache
 
 # 加载环境变量
 load_dotenv()
@@ -38,239 +61,6 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def merge_multiple_queries(cypher_query: str) -> str:
-    """检测并合并多个独立的 Cypher 查询（多个 MATCH-RETURN 语句）"""
-    # 检测是否有多个 RETURN 语句（不在 UNION 中）
-    return_count = len(re.findall(r'\bRETURN\b', cypher_query, re.IGNORECASE))
-    
-    # 如果只有一个 RETURN，不需要合并
-    if return_count <= 1:
-        return cypher_query
-    
-    # 检查是否有 UNION，如果有 UNION 则不需要合并
-    if re.search(r'\bUNION\b', cypher_query, re.IGNORECASE):
-        return cypher_query
-    
-    logger.warning(f"检测到 {return_count} 个 RETURN 语句，正在合并多个查询...")
-    
-    # 按 MATCH 分割查询块
-    query_blocks = re.split(r'(?=\bMATCH\b)', cypher_query, flags=re.IGNORECASE)
-    queries = [q.strip() for q in query_blocks if q.strip() and re.search(r'\bMATCH\b', q, re.IGNORECASE) and re.search(r'\bRETURN\b', q, re.IGNORECASE)]
-    
-    if len(queries) <= 1:
-        return cypher_query
-    
-    # 解析每个查询
-    main_node_var = None
-    main_node_label = None
-    common_where = None
-    optional_matches = []
-    return_fields = []
-    
-    for i, query in enumerate(queries):
-        # 提取完整的 MATCH 子句（包括关系和目标节点）
-        match_full = re.search(r'MATCH\s+(.+?)(?:\n|WHERE|RETURN|$)', query, re.IGNORECASE | re.DOTALL)
-        where_clause = re.search(r'WHERE\s+(.+?)(?:\n|RETURN|$)', query, re.IGNORECASE | re.DOTALL)
-        return_clause = re.search(r'RETURN\s+(.+?)$', query, re.IGNORECASE | re.DOTALL)
-        
-        if match_full:
-            match_pattern = match_full.group(1).strip()
-            
-            # 提取第一个节点（主节点）
-            first_node = re.search(r'\((\w+)(?::(\w+))?\)', match_pattern)
-            if first_node:
-                node_var = first_node.group(1)
-                node_label = first_node.group(2)
-                
-                if i == 0:
-                    # 第一个查询：确定主节点和 WHERE
-                    main_node_var = node_var
-                    main_node_label = node_label
-                    if where_clause:
-                        common_where = where_clause.group(1).strip()
-                    
-                    # 第一个查询的完整模式转为 OPTIONAL MATCH（如果包含关系）
-                    if re.search(r'[-[]', match_pattern):
-                        # 提取关系部分（从第一个节点之后开始）
-                        # 查找第一个节点后的内容
-                        node_pattern = f"({node_var}{':' + node_label if node_label else ''})"
-                        if match_pattern.startswith(node_pattern):
-                            rel_part = match_pattern[len(node_pattern):].strip()
-                            if rel_part:
-                                optional_matches.append(f"OPTIONAL MATCH ({main_node_var}{':' + main_node_label if main_node_label else ''}){rel_part}")
-                        else:
-                            optional_matches.append(f"OPTIONAL MATCH {match_pattern}")
-                else:
-                    # 后续查询：转换为 OPTIONAL MATCH
-                    if node_var == main_node_var:
-                        # 使用相同的主节点，提取关系部分
-                        node_pattern = f"({node_var}{':' + node_label if node_label else ''})"
-                        if match_pattern.startswith(node_pattern):
-                            rel_part = match_pattern[len(node_pattern):].strip()
-                            if rel_part:
-                                optional_matches.append(f"OPTIONAL MATCH ({main_node_var}{':' + main_node_label if main_node_label else ''}){rel_part}")
-                        else:
-                            optional_matches.append(f"OPTIONAL MATCH {match_pattern}")
-                    else:
-                        # 替换节点变量
-                        new_pattern = re.sub(
-                            rf'\(\s*{node_var}(?::\w+)?\s*\)',
-                            f'({main_node_var}{":" + main_node_label if main_node_label else ""})',
-                            match_pattern,
-                            count=1
-                        )
-                        optional_matches.append(f"OPTIONAL MATCH {new_pattern}")
-        
-        # 收集 RETURN 字段
-        if return_clause:
-            fields = return_clause.group(1).strip()
-            field_list = [f.strip() for f in re.split(r',(?![^()]*\))', fields) if f.strip()]
-            return_fields.extend(field_list)
-    
-    # 构建合并后的查询
-    if main_node_var:
-        parts = []
-        
-        # 主 MATCH（只匹配主节点）
-        if main_node_label:
-            parts.append(f"MATCH ({main_node_var}:{main_node_label})")
-        else:
-            parts.append(f"MATCH ({main_node_var})")
-        
-        # WHERE
-        if common_where:
-            parts.append(f"WHERE {common_where}")
-        
-        # OPTIONAL MATCH
-        parts.extend(optional_matches)
-        
-        # RETURN（去重）
-        seen = set()
-        unique = []
-        for field in return_fields:
-            alias_match = re.search(r'AS\s+(\w+)', field, re.IGNORECASE)
-            if alias_match:
-                alias = alias_match.group(1)
-                if alias not in seen:
-                    unique.append(field)
-                    seen.add(alias)
-            elif field not in unique:
-                unique.append(field)
-        
-        if unique:
-            parts.append('RETURN ' + ', '.join(unique))
-        
-        merged = '\n'.join(parts)
-        logger.info(f"合并后的查询:\n{merged}")
-        return merged
-    
-    return cypher_query
-
-
-def clean_cypher_query(cypher_query: str) -> str:
-    """清理 Cypher 查询字符串，移除 markdown 代码块标记和注释，修复关系类型语法"""
-    if not cypher_query:
-        return cypher_query
-    
-    # 移除 markdown 代码块标记
-    pattern = r'```(?:cypher)?\s*\n?(.*?)\n?```'
-    match = re.search(pattern, cypher_query, re.DOTALL | re.IGNORECASE)
-    if match:
-        cypher_query = match.group(1).strip()
-    else:
-        cypher_query = cypher_query.strip()
-    
-    # 移除可能残留的前导/尾随标记
-    cypher_query = re.sub(r'^```(?:cypher)?\s*', '', cypher_query, flags=re.IGNORECASE)
-    cypher_query = re.sub(r'```\s*$', '', cypher_query)
-    
-    # 移除 Cypher 多行注释 /* ... */
-    cypher_query = re.sub(r'/\*.*?\*/', '', cypher_query, flags=re.DOTALL)
-    
-    # 移除 Cypher 单行注释 // ...
-    lines = []
-    for line in cypher_query.split('\n'):
-        if '//' in line:
-            comment_pos = line.find('//')
-            if comment_pos >= 0:
-                line = line[:comment_pos].rstrip()
-        if line.strip():
-            lines.append(line)
-    
-    cypher_query = '\n'.join(lines)
-    
-    # 检测并合并多个独立查询（必须在其他修复之前进行）
-    cypher_query = merge_multiple_queries(cypher_query)
-    
-    # 修复关系类型语法错误：将 :type1|:type2 修复为 :type1|type2
-    # Neo4j 新版本不支持在关系类型列表中使用多个冒号
-    # 匹配模式：-[r:type1|:type2]- 或 -[:type1|:type2]- 或 [r:type1|:type2|:type3]
-    cypher_query = re.sub(r':(\w+)\|:(\w+)', r':\1|\2', cypher_query)
-    # 处理多个关系类型的情况，如 :type1|:type2|:type3
-    while re.search(r':(\w+)\|:(\w+)', cypher_query):
-        cypher_query = re.sub(r':(\w+)\|:(\w+)', r':\1|\2', cypher_query)
-    
-    # 修复 COLLECT 函数中的 AS 语法错误
-    # 错误: COLLECT(DISTINCT field.name AS alias)
-    # 正确: COLLECT(DISTINCT field.name) AS alias
-    # 匹配 COLLECT(... AS alias) 的模式，将 AS 移到函数外面
-    def fix_collect_as(match):
-        collect_content = match.group(1)  # COLLECT 函数内的内容（包含 AS alias）
-        # 移除内部的 AS 和别名，保留表达式
-        # 例如: "DISTINCT bad_food.name AS foods_to_avoid" -> "DISTINCT bad_food.name"
-        # 提取别名
-        alias_match = re.search(r'\s+AS\s+(\w+)\s*$', collect_content, re.IGNORECASE)
-        if alias_match:
-            alias = alias_match.group(1)
-            # 移除 AS alias 部分
-            collect_content = re.sub(r'\s+AS\s+\w+\s*$', '', collect_content, flags=re.IGNORECASE).strip()
-            return f'COLLECT({collect_content}) AS {alias}'
-        return match.group(0)
-    
-    # 匹配 COLLECT(... AS alias) 的模式（AS 在函数内部）
-    cypher_query = re.sub(
-        r'COLLECT\s*\(([^)]+\s+AS\s+\w+)\)',
-        fix_collect_as,
-        cypher_query,
-        flags=re.IGNORECASE
-    )
-    
-    # 修复可能不存在的关系类型：将 drugs_of 关系转换为 OPTIONAL MATCH
-    # 如果查询是 MATCH (d:Drug)-[:drugs_of]->(p:Producer) 形式，转换为 OPTIONAL MATCH
-    # 这样可以避免关系不存在时的查询失败
-    if re.search(r'\bdrugs_of\b', cypher_query, re.IGNORECASE):
-        if not re.search(r'OPTIONAL\s+MATCH.*drugs_of', cypher_query, re.IGNORECASE):
-            # 匹配模式：MATCH (var:Label)-[:drugs_of]->(target)
-            def convert_drugs_of(match):
-                full_match = match.group(0)
-                # 提取节点变量和标签
-                node_match = re.search(r'MATCH\s+\((\w+)(?::(\w+))?\)', full_match, re.IGNORECASE)
-                if node_match:
-                    node_var = node_match.group(1)
-                    node_label = node_match.group(2) if node_match.group(2) else ''
-                    # 提取关系部分
-                    rel_match = re.search(r'(-\[[^\]]*drugs_of[^\]]*\][^W]*)', full_match, re.IGNORECASE | re.DOTALL)
-                    if rel_match:
-                        rel_part = rel_match.group(1)
-                        label_str = f':{node_label}' if node_label else ''
-                        return f"MATCH ({node_var}{label_str})\nOPTIONAL MATCH ({node_var}){rel_part}"
-                return full_match
-            
-            # 替换 MATCH ... -[:drugs_of]-> 模式
-            cypher_query = re.sub(
-                r'MATCH\s+\([^)]+\)\s*-\[[^\]]*drugs_of[^\]]*\][^W]*(?=WHERE|RETURN|$)',
-                convert_drugs_of,
-                cypher_query,
-                count=1,
-                flags=re.IGNORECASE | re.DOTALL
-            )
-    
-    # 清理多余的空行
-    cypher_query = re.sub(r'\n\s*\n+', '\n', cypher_query)
-    
-    return cypher_query.strip()
-
-
 # 生命周期管理
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -304,11 +94,11 @@ async def lifespan(app: FastAPI):
 # 创建 FastAPI 应用
 app = FastAPI(title='NL2Cypher API', lifespan=lifespan)
 
-# 初始化 OpenRouter 客户端
-client = OpenAI(
-    api_key=settings.OPENROUTER_API_KEY,
-    base_url='https://openrouter.ai/api/v1'
-)
+# OpenRouter 客户端（与查询生成共用）
+client = get_llm_client()
+
+# 查询解释/改进建议缓存（按 Cypher 指纹）
+explanation_store = ExplanationStore()
 
 # 添加CORS中间件
 app.add_middleware(
@@ -320,28 +110,10 @@ app.add_middleware(
 )
 
 
-def generate_cypher_query(natural_language: str, query_type: str = None) -> str:
-    """使用 OpenRouter 生成 Cypher 查询"""
-    system_prompt = create_system_prompt(str(EXAMPLE_SCHEMA.model_dump()))
-    user_prompt = natural_language
-    if query_type:
-        user_prompt = f"{query_type}查询: {natural_language}"
-    
-    try:
-        response = client.chat.completions.create(
-            model=settings.OPENROUTER_LLM_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.1,
-            max_tokens=2048,
-            stream=False
-        )
-        raw_query = response.choices[0].message.content.strip()
-        return clean_cypher_query(raw_query)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"OpenRouter API错误: {str(e)}")
+@app.exception_handler(GraphQueryError)
+async def graph_query_error_handler(request: Request, exc: GraphQueryError):
+    """查询生成或执行失败时返回对应的状态码（与 HTTPException 相同的响应结构）"""
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
 
 
 def explain_cypher_query(cypher_query: str) -> str:
@@ -362,65 +134,74 @@ def explain_cypher_query(cypher_query: str) -> str:
         return f"无法生成解释: {str(e)}"
 
 
-def execute_cypher_query(cypher_query: str, driver) -> Dict[str, Any]:
-    """执行Cypher查询并返回结果"""
-    if not driver:
-        raise HTTPException(status_code=503, detail="Neo4j 连接不可用")
-    
-    cypher_query = clean_cypher_query(cypher_query)
-    
-    logger.info(f"执行 Cypher 查询: {cypher_query}")
-    start_time = datetime.now()
-    
+def suggest_cypher_fixes(cypher_query: str) -> List[str]:
+    """使用 OpenRouter 生成Cypher查询的改进建议"""
     try:
-        with driver.session() as session:
-            result = session.run(cypher_query)
-            
-            records = []
-            for record in result:
-                record_dict = {}
-                for key in record.keys():
-                    value = record[key]
-                    if hasattr(value, 'id'):
-                        if hasattr(value, 'labels'):
-                            record_dict[key] = {
-                                'type': 'Node',
-                                'labels': list(value.labels),
-                                'properties': dict(value)
-                            }
-                        elif hasattr(value, 'type'):
-                            record_dict[key] = {
-                                'type': 'Relationship',
-                                'relationship_type': value.type,
-                                'properties': dict(value)
-                            }
-                        else:
-                            record_dict[key] = str(value)
-                    else:
-                        record_dict[key] = value
-                records.append(record_dict)
-            
-            execution_time = (datetime.now() - start_time).total_seconds()
-            result_count = len(records)
-            
-            logger.info(f"查询执行成功，耗时: {execution_time:.3f}秒，返回 {result_count} 条记录")
-            
-            return {
-                "success": True,
-                "records": records,
-                "count": result_count,
-                "execution_time": execution_time
-            }
+        response = client.chat.completions.create(
+            model=settings.OPENROUTER_LLM_MODEL,
+            messages=[
+                {"role": "system", "content": "你是一个Neo4j专家, 请提供Cypher查询的改进建议."},
+                {"role": "user", "content": create_validation_prompt(cypher_query)}
+            ],
+            temperature=0.1,
+            max_tokens=1024,
+            stream=False
+        )
+        suggestions = [response.choices[0].message.content.strip()]
+        logger.info(f"生成改进建议: {suggestions}")
+        return suggestions
     except Exception as e:
-        execution_time = (datetime.now() - start_time).total_seconds()
-        error_msg = str(e)
-        logger.error(f"查询执行失败，耗时: {execution_time:.3f}秒，错误: {error_msg}")
-        raise HTTPException(status_code=500, detail=f"查询执行失败: {error_msg}")
+        logger.error(f"生成改进建议失败: {str(e)}")
+        return ["无法生成建议"]
+
+
+def compute_annotation(cypher_query: str, field: str):
+    """
+    计算并缓存查询解释（field='explanation'）或改进建议（field='suggestions'）
+    可作为后台任务运行，结果通过 GET /explanations/{fingerprint} 获取
+    """
+    if field == 'explanation':
+        value = explain_cypher_query(cypher_query)
+        failed = value.startswith("无法生成解释")
+    else:
+        value = suggest_cypher_fixes(cypher_query)
+        failed = value == ["无法生成建议"]
+    # LLM 调用失败的结果不缓存，下次请求时重新计算
+    explanation_store.set(cypher_query, field, None if failed else value)
+    if failed:
+        return value
+    logger.info(f"已缓存查询{'解释' if field == 'explanation' else '改进建议'}: {cypher_fingerprint(cypher_query)}")
+    return value
+
+
+def annotate(cypher_query: str, field: str, mode: AnnotationMode, background_tasks: BackgroundTasks):
+    """
+    按请求的计算方式获取解释或改进建议，已缓存时直接返回
+
+    Args:
+        cypher_query: Cypher 查询语句
+        field: 'explanation' 或 'suggestions'
+        mode: 计算方式（不计算/同步/后台）
+        background_tasks: FastAPI 后台任务
+
+    Returns:
+        已缓存或同步计算的结果；不计算或后台计算时返回 None
+    """
+    if mode == AnnotationMode.NONE:
+        return None
+    cached = explanation_store.lookup(cypher_query, field)
+    if cached is not None:
+        return cached
+    if mode == AnnotationMode.SYNC:
+        return compute_annotation(cypher_query, field)
+    if explanation_store.mark_pending(cypher_query, field):
+        background_tasks.add_task(compute_annotation, cypher_query, field)
+    return None
 
 
 @app.post("/generate", response_model=CypherResponse)
-async def generate_cypher(request: NL2CypherRequest):
-    """生成Cypher查询端点"""
+async def generate_cypher(request: NL2CypherRequest, background_tasks: BackgroundTasks):
+    """生成Cypher查询端点（查询解释按 request.explain 可选，默认不生成）"""
     logger.info(f"收到生成查询请求: {request.natural_language_query}")
     
     cypher_query = generate_cypher_query(
@@ -429,8 +210,9 @@ async def generate_cypher(request: NL2CypherRequest):
     )
     logger.info(f"生成的 Cypher 查询: {cypher_query}")
     
-    explanation = explain_cypher_query(cypher_query)
-    logger.info(f"查询解释: {explanation}")
+    explanation = annotate(cypher_query, 'explanation', request.explain, background_tasks)
+    if explanation:
+        logger.info(f"查询解释: {explanation}")
     
     is_valid, errors = app.state.validator.validate_against_schema(cypher_query, EXAMPLE_SCHEMA)
     if errors:
@@ -438,22 +220,21 @@ async def generate_cypher(request: NL2CypherRequest):
     else:
         logger.info("查询验证通过")
     
-    confidence = 0.9
-    if errors:
-        confidence = max(0.3, confidence - len(errors) * 0.1)
+    confidence = compute_confidence(errors)
     
     return CypherResponse(
         cypher_query=cypher_query,
-        explanation=explanation,
+        explanation=explanation or "",
         confidence=confidence,
         validated=is_valid,
-        validation_errors=errors
+        validation_errors=errors,
+        fingerprint=cypher_fingerprint(cypher_query)
     )
 
 
 @app.post("/validate", response_model=ValidationResponse)
-async def validate_cypher(request: ValidationRequest):
-    """验证Cypher查询端点"""
+async def validate_cypher(request: ValidationRequest, background_tasks: BackgroundTasks):
+    """验证Cypher查询端点（改进建议按 request.suggest 可选，默认不生成）"""
     logger.info(f"收到验证查询请求: {request.cypher_query}")
     
     is_valid, errors = app.state.validator.validate_against_schema(request.cypher_query, EXAMPLE_SCHEMA)
@@ -465,27 +246,13 @@ async def validate_cypher(request: ValidationRequest):
     
     suggestions = []
     if errors:
-        try:
-            response = client.chat.completions.create(
-                model=settings.OPENROUTER_LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": "你是一个Neo4j专家, 请提供Cypher查询的改进建议."},
-                    {"role": "user", "content": create_validation_prompt(request.cypher_query)}
-                ],
-                temperature=0.1,
-                max_tokens=1024,
-                stream=False
-            )
-            suggestions = [response.choices[0].message.content.strip()]
-            logger.info(f"生成改进建议: {suggestions}")
-        except Exception as e:
-            suggestions = ["无法生成建议"]
-            logger.error(f"生成改进建议失败: {str(e)}")
+        suggestions = annotate(request.cypher_query, 'suggestions', request.suggest, background_tasks) or []
     
     return ValidationResponse(
         is_valid=is_valid,
         errors=errors,
-        suggestions=suggestions
+        suggestions=suggestions,
+        fingerprint=cypher_fingerprint(request.cypher_query)
     )
 
 
@@ -501,13 +268,74 @@ async def execute_query(request: ValidationRequest):
         result = execute_cypher_query(request.cypher_query, app.state.neo4j_driver)
         logger.info(f"查询执行完成，返回 {result['count']} 条记录")
         return result
-    except HTTPException:
+    except (HTTPException, GraphQueryError):
         raise
     except Exception as e:
         logger.error(f"执行查询时发生异常: {str(e)}")
         raise HTTPException(status_code=500, detail=f"执行查询失败: {str(e)}")
 
 
+@app.post("/query", response_model=GraphQueryResponse)
+def query_endpoint(request: GraphQueryRequest):
+    """
+    一次往返完成 生成-清理-验证-执行 的查询端点（请求带 cypher_query 时跳过生成）
+    使用同步函数定义，由 FastAPI 在线程池中执行，LLM 与 Neo4j 调用不阻塞事件循环
+    """
+    logger.info(f"收到组合查询请求: {request.natural_language_query}")
+    
+    result = query_graph(
+        request.natural_language_query,
+        app.state.validator,
+        getattr(app.state, "neo4j_driver", None),
+        request.query_type.value if request.query_type else None,
+        request.min_confidence,
+        planned_cypher=request.cypher_query
+    )
+    logger.info(f"组合查询完成，执行: {result['executed']}，返回 {result['count']} 条记录")
+    return GraphQueryResponse(**result)
+
+
+@app.post("/neighborhood", response_model=NeighborhoodResponse)
+def neighborhood_endpoint(request: NeighborhoodRequest):
+    """
+    获取疾病一跳邻域的端点（一次参数化查询，不调用 LLM）
+    会话的主疾病确定后由 Agent 服务预取，追问直接从邻域中回答
+    """
+    logger.info(f"收到疾病邻域请求: {request.entity}")
+    return NeighborhoodResponse(**fetch_neighborhood(request.entity, getattr(app.state, "neo4j_driver", None)))
+
+
+@app.get("/explanations/{fingerprint}", response_model=ExplanationResponse)
+async def get_explanation(fingerprint: str):
+    """按 Cypher 指纹获取已缓存或后台计算中的查询解释与改进建议"""
+    entry = explanation_store.get(fingerprint)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"未找到指纹对应的解释: {fingerprint}")
+    return ExplanationResponse(
+        fingerprint=fingerprint,
+        cypher_query=entry['cypher_query'],
+        explanation=entry['explanation'],
+        suggestions=entry['suggestions'],
+        pending=entry['pending']
+    )
+
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """获取 Cypher 生成结果缓存、查询结果缓存与 Cypher 模板的统计信息"""
+    return {
+        "cypher_cache": cypher_cache.stats() if cypher_cache else None,
+        "result_cache": result_cache.stats() if result_cache else None,
+        "cypher_templates": cypher_templates.stats() if cypher_templates else None
+    }
+
+
+@app.get("/admin/cache")
+async def get_tiered_cache_stats():
+    """获取两级缓存各命名空间的统计信息（命中率、L1 条目数与字节数、淘汰次数）"""
+    return get_tiered_cache().stats()
+
+
 @app.get("/")
 async def root():
     """根路径，返回服务信息"""
@@ -520,6 +348,11 @@ async def root():
             "POST /generate": "生成 Cypher 查询",
             "POST /validate": "验证 Cypher 查询",
             "POST /execute": "执行 Cypher 查询",
+            "POST /query": "一次完成 生成-验证-执行，返回 Cypher、置信度与查询结果",
+            "POST /neighborhood": "获取疾病的一跳邻域（按关系分组），用于会话追问的预取",
+            "GET /explanations/{fingerprint}": "获取查询解释与改进建议（explain/suggest 为 async 时后台计算）",
+            "GET /cache/stats": "获取 Cypher 生成结果缓存与查询结果缓存的统计信息",
+            "GET /admin/cache": "获取两级缓存各命名空间的命中率、大小与淘汰次数",
             "GET /schema": "获取图数据库模式"
         },
         "port": settings.GRAPH_SERVICE_PORT,
@@ -0,0 +1,1407 @@
+"""
+问答管线
+将一次医疗问答拆分为显式阶段：enhance（上下文增强）、vector（向量检索）、graph（知识图谱查询）、
+merge（上下文合并）、generate（回答生成）、persist（对话持久化）
+每个阶段单独计时，并有各自的超时时间和出错处理策略；流式与非流式接口共用同一条管线
+所有阶段共享一个端到端的请求截止时间，预算耗尽的阶段降级，并在 search_stages['budget_exhausted'] 中记录
+"""
+import re
+import copy
+import time
+import asyncio
+import datetime
+import httpx
+from contextlib import aclosing
+from typing import AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config.settings import settings
+from core.cache.redis_client import (
+    get_redis_client,
+    get_session_conversations,
+    save_conversation_history,
+    cache_get_entry,
+    cache_set
+)
+from core.cache.singleflight import SingleFlight, FlightError, flight_key
+from core.cache.semantic_cache import SemanticAnswerCache
+from core.cache.session_memory import SessionRetrievalMemory
+from core.cache.session_topic import SessionTopicState
+from core.cache.versions import get_version_watcher, VECTOR, GRAPH
+from core.context.enhancer import enhance_query_with_context, link_entities, resolve_query_locally
+from core.context.planner import plan_query
+from core.graph.entities import get_entity_dictionary
+from core.graph.api_client import GraphServiceClient
+from core.graph.intents import describe_relation, detect_intents, detect_relation_intents
+from core.models.llm import stream_openrouter_answer, clean_markdown
+from core.vector_store.result_cache import VectorResultCache
+
+
+# 知识图谱上下文的标题
+GRAPH_CONTEXT_HEADER = "【知识图谱查询结果 - 这是从结构化知识图谱数据库中查询到的准确信息，请作为回答的核心依据】\n"
+
+# 检索阶段事件回调类型：emit(event_type, data)
+EmitFunc = Callable[[str, dict], Awaitable[None]]
+
+
+async def _noop_emit(event_type: str, data: dict) -> None:
+    """不发送任何事件（非流式接口使用）"""
+    return None
+
+
+def create_search_stages() -> Dict[str, dict]:
+    """
+    初始化检索阶段状态
+
+    Returns:
+        search_stages 字典
+    """
+    return {
+        'milvus_vector': {'status': 'pending', 'results': [], 'count': 0, 'description': '向量数据库检索'},
+        'knowledge_graph': {'status': 'pending', 'results': [], 'count': 0, 'description': '知识图谱查询', 'cypher_query': '', 'confidence': 0}
+    }
+
+
+def format_graph_records(cypher_query: str, records: List[dict], parameters: Optional[dict] = None) -> Tuple[List[str], List[str]]:
+    """
+    将知识图谱查询结果格式化为描述性文本
+
+    Args:
+        cypher_query: 执行的Cypher查询
+        records: 查询返回的记录列表
+        parameters: 查询参数（模板查询的疾病名称在参数 name 中）
+
+    Returns:
+        (graph_results, entity_names): 描述性文本列表和实体名称列表
+    """
+    # 解析Cypher查询，提取关键信息
+    relationship_type = None
+    disease_name = None
+
+    rel_match = re.search(r'\[[^:]*:(.*?)\]', cypher_query)
+    if rel_match:
+        relationship_type = rel_match.group(1).strip()
+
+    disease_match = re.search(r"p\.name\s*=\s*['\"](.*?)['\"]", cypher_query)
+    if disease_match:
+        disease_name = disease_match.group(1)
+    elif re.search(r"p\.name\s*=\s*\$name\b", cypher_query):
+        disease_name = (parameters or {}).get('name')
+
+    # 格式化知识图谱查询结果
+    graph_results = []
+    entity_names = []
+
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, dict):
+                if value.get('type') in ('Node', 'Relationship'):
+                    props = value.get('properties', {})
+                    if 'name' in props:
+                        entity_names.append(props['name'])
+            else:
+                if value is not None:
+                    value_str = str(value).strip()
+                    if value_str:
+                        entity_names.append(value_str)
+
+    # 生成描述性文本
+    if entity_names:
+        if disease_name:
+            graph_results.append(describe_relation(disease_name, relationship_type, entity_names))
+        else:
+            graph_results.append(f"查询结果：{', '.join(entity_names)}")
+
+    return graph_results, entity_names
+
+
+def extract_main_entity(cypher_query: str, parameters: Optional[dict] = None) -> Optional[str]:
+    """
+    从 Cypher 查询中提取按名称匹配的主实体（如 MATCH (p:Disease) WHERE p.name = '高血压' 中的"高血压"）
+
+    Args:
+        cypher_query: Cypher 查询语句
+        parameters: 查询参数（按 $name 匹配时从参数中取值）
+
+    Returns:
+        主实体名称，未按名称匹配时返回 None
+    """
+    match = re.search(
+        r"\w+\.name\s*=\s*(?:['\"](.*?)['\"]|\$(\w+))|\{\s*name\s*:\s*(?:['\"](.*?)['\"]|\$(\w+))",
+        cypher_query or ''
+    )
+    if not match:
+        return None
+    parameter = match.group(2) or match.group(4)
+    value = (parameters or {}).get(parameter) if parameter else (match.group(1) or match.group(3))
+    return str(value or '').strip() or None
+
+
+async def run_vector_search(
+    query: str,
+    milvus_vectorstore,
+    format_docs_func,
+    search_stages: Dict[str, dict],
+    search_path: List[str],
+    emit: EmitFunc = _noop_emit,
+    result_cache: Optional[VectorResultCache] = None
+) -> str:
+    """
+    向量数据库检索分支
+    在线程池中执行 Milvus 混合检索，避免阻塞事件循环；提供结果缓存时相同问题直接复用之前的检索结果
+
+    Args:
+        query: 检索问题（增强后的问题）
+        milvus_vectorstore: Milvus向量存储实例
+        format_docs_func: 格式化文档的函数
+        search_stages: 检索阶段状态（原地更新）
+        search_path: 检索路径（原地追加）
+        emit: 事件回调
+        result_cache: 向量检索结果缓存，为None时每次都访问 Milvus
+
+    Returns:
+        向量检索上下文，失败或无结果时返回空字符串
+    """
+    await emit('search_stage', {
+        'stage': 'milvus_vector',
+        'status': 'pending',
+        'message': '开始向量数据库检索...'
+    })
+
+    try:
+        cached = False
+        if result_cache is not None:
+            recall_rerank_milvus, cached = await asyncio.to_thread(
+                result_cache.search,
+                milvus_vectorstore,
+                query,
+                k=10,
+                ranker_type='rrf',
+                ranker_params={'k': 100}
+            )
+            search_stages['milvus_vector']['cached'] = cached
+        else:
+            recall_rerank_milvus = await asyncio.to_thread(
+                milvus_vectorstore.similarity_search,
+                query,
+                k=10,
+                ranker_type='rrf',
+                ranker_params={'k': 100}
+            )
+
+        if recall_rerank_milvus:
+            search_stages['milvus_vector']['status'] = 'success'
+            search_stages['milvus_vector']['count'] = len(recall_rerank_milvus)
+            search_stages['milvus_vector']['results'] = [
+                doc.page_content[:200] + '...' if len(doc.page_content) > 200 else doc.page_content
+                for doc in recall_rerank_milvus[:3]
+            ]
+            search_path.append('milvus_vector')
+
+            # 发送向量检索完成事件
+            await emit('search_stage', {
+                'stage': 'milvus_vector',
+                'status': 'success',
+                'count': len(recall_rerank_milvus),
+                'results': search_stages['milvus_vector']['results'],
+                'cached': cached,
+                'message': f"向量检索完成，找到 {len(recall_rerank_milvus)} 条结果{'（缓存）' if cached else ''}"
+            })
+            return format_docs_func(recall_rerank_milvus)
+
+        search_stages['milvus_vector']['status'] = 'empty'
+        await emit('search_stage', {
+            'stage': 'milvus_vector',
+            'status': 'empty',
+            'message': '向量检索未找到结果'
+        })
+    except Exception as e:
+        search_stages['milvus_vector']['status'] = 'error'
+        search_stages['milvus_vector']['error'] = str(e)
+        print(f'向量检索错误: {str(e)}')
+        await emit('search_stage', {
+            'stage': 'milvus_vector',
+            'status': 'error',
+            'error': str(e),
+            'message': f'向量检索失败: {str(e)}'
+        })
+    return ""
+
+
+async def run_knowledge_graph_query(
+    query: str,
+    graph_client: GraphServiceClient,
+    search_stages: Dict[str, dict],
+    search_path: List[str],
+    emit: EmitFunc = _noop_emit,
+    cypher_query: Optional[str] = None
+) -> str:
+    """
+    知识图谱查询分支
+    通过知识图谱服务的 /query 接口一次往返完成 生成-验证-执行
+
+    Args:
+        query: 检索问题（增强后的问题）
+        graph_client: 知识图谱查询客户端（GraphServiceClient 或嵌入模式的 EmbeddedGraphClient）
+        search_stages: 检索阶段状态（原地更新）
+        search_path: 检索路径（原地追加）
+        emit: 事件回调
+        cypher_query: 合并模式已生成的 Cypher，提供时知识图谱服务只验证并执行
+
+    Returns:
+        知识图谱上下文，失败或无结果时返回空字符串
+    """
+    # 发送知识图谱查询开始事件
+    await emit('search_stage', {
+        'stage': 'knowledge_graph',
+        'status': 'pending',
+        'message': '开始知识图谱查询...',
+        'stage_detail': 'generating'  # 正在生成 Cypher 查询
+    })
+
+    try:
+        query_result = await graph_client.query(query, min_confidence=0.7, cypher_query=cypher_query)
+
+        cypher_query = query_result.get('cypher_query')
+        confidence = query_result.get('confidence', 0)
+
+        search_stages['knowledge_graph']['cypher_query'] = cypher_query or ''
+        search_stages['knowledge_graph']['confidence'] = float(confidence) if confidence else 0
+        search_stages['knowledge_graph']['cypher_cached'] = bool(query_result.get('cached'))
+        search_stages['knowledge_graph']['cypher_template'] = bool(query_result.get('template'))
+        search_stages['knowledge_graph']['cypher_planned'] = bool(query_result.get('planned'))
+        search_stages['knowledge_graph']['result_cached'] = bool(query_result.get('result_cached'))
+
+        if not query_result.get('executed'):
+            return ""
+
+        print(f'知识图谱查询生成成功，置信度: {confidence}')
+
+        if query_result.get('error'):
+            print(f"⚠️ 知识图谱查询执行失败: {query_result['error']}")
+        if not (query_result.get('success') and query_result.get('records')):
+            return ""
+
+        parameters = query_result.get('parameters') or {}
+        graph_results, entity_names = format_graph_records(cypher_query, query_result['records'], parameters)
+        if not graph_results:
+            return ""
+
+        search_stages['knowledge_graph']['status'] = 'success'
+        search_stages['knowledge_graph']['count'] = len(entity_names)
+        search_stages['knowledge_graph']['results'] = graph_results
+        search_stages['knowledge_graph']['entity'] = extract_main_entity(cypher_query, parameters)
+        search_stages['knowledge_graph']['entities'] = entity_names
+        search_path.append('knowledge_graph')
+        print(f'✅ 知识图谱查询成功，返回 {len(entity_names)} 条结果')
+
+        # 发送知识图谱查询完成事件
+        await emit('search_stage', {
+            'stage': 'knowledge_graph',
+            'status': 'success',
+            'count': len(entity_names),
+            'results': graph_results,
+            'cypher_query': cypher_query,
+            'confidence': float(confidence) if confidence else 0,
+            'message': f'知识图谱查询完成，找到 {len(entity_names)} 条结果'
+        })
+        return GRAPH_CONTEXT_HEADER + "\n".join(graph_results)
+
+    except httpx.TimeoutException as e:
+        search_stages['knowledge_graph']['status'] = 'error'
+        search_stages['knowledge_graph']['error'] = f'请求超时: {str(e)}'
+        print(f'⚠️ 知识图谱服务请求超时: {str(e)}')
+        await emit('search_stage', {
+            'stage': 'knowledge_graph',
+            'status': 'error',
+            'error': f'请求超时: {str(e)}',
+            'message': f'知识图谱查询超时'
+        })
+    except httpx.ConnectError as e:
+        search_stages['knowledge_graph']['status'] = 'error'
+        search_stages['knowledge_graph']['error'] = f'连接失败: {str(e)}'
+        print(f'⚠️ 知识图谱服务连接失败: {str(e)}')
+        await emit('search_stage', {
+            'stage': 'knowledge_graph',
+            'status': 'error',
+            'error': f'连接失败: {str(e)}',
+            'message': f'知识图谱服务连接失败'
+        })
+    except Exception as e:
+        search_stages['knowledge_graph']['status'] = 'error'
+        search_stages['knowledge_graph']['error'] = f'查询异常: {str(e)}'
+        print(f'⚠️ 知识图谱查询异常: {str(e)}')
+        await emit('search_stage', {
+            'stage': 'knowledge_graph',
+            'status': 'error',
+            'error': str(e),
+            'message': f'知识图谱查询异常'
+        })
+    return ""
+
+
+def merge_contexts(vector_context: str, graph_context: str) -> str:
+    """
+    合并所有上下文 - 以知识图谱为核心，结合向量搜索结果
+
+    Args:
+        vector_context: 向量检索上下文
+        graph_context: 知识图谱上下文
+
+    Returns:
+        合并后的上下文
+    """
+    context = vector_context
+    vector_context_label = ""
+    if context:
+        vector_context_label = "【向量检索补充信息 - 这些信息来自向量数据库检索，可作为补充和参考，帮助完善答案】"
+
+    if graph_context:
+        # 如果有知识图谱结果，以知识图谱为核心，向量检索作为补充
+        if context:
+            context = graph_context + '\n\n' + vector_context_label + '\n' + context
+        else:
+            context = graph_context
+        print(f'📝 最终上下文长度: {len(context)} 字符（知识图谱为核心，向量检索作为补充）')
+    else:
+        # 如果没有知识图谱结果，使用向量检索结果
+        if context:
+            context = vector_context_label + '\n' + context
+        print('⚠️ 本次查询未使用知识图谱结果，仅使用向量检索结果')
+    return context
+
+
+def build_answer_messages(context: str, enhanced_query: str) -> List[Dict[str, str]]:
+    """
+    构建回答生成阶段的对话消息
+
+    Args:
+        context: 合并后的检索上下文
+        enhanced_query: 增强后的问题
+
+    Returns:
+        OpenAI 格式的消息列表
+    """
+    # 定义系统提示和用户提示
+    SYSTEM_PROMPT = """
+        System: 你是一个非常得力的医学助手, 你可以通过从数据库中检索出的信息找到问题的答案.
+        
+        重要要求：
+        1. 回答必须使用纯文本格式，不要使用任何 Markdown 格式（如 **粗体**、*斜体*、# 标题等）
+        2. 不要使用任何 HTML 标签（如 <p>、<br>、<div> 等）
+        3. 不要使用代码块格式（如 ``` 等）
+        4. 直接使用普通的中文文本回答，使用换行符分隔段落
+        5. 保持回答简洁、清晰、专业
+        6. **以知识图谱为核心，结合向量搜索结果**：
+           - 如果上下文中包含"【知识图谱查询结果】"部分，这些信息是从结构化知识图谱数据库中查询到的准确信息，必须作为回答的核心依据。
+           - 如果上下文中还包含"【向量检索补充信息】"部分，这些信息来自向量数据库检索，应该结合知识图谱结果一起使用，帮助完善和丰富答案。
+           - 知识图谱结果具有更高的准确性和权威性，应该优先使用；向量检索结果可以作为补充，提供更全面的信息。
+    """
+
+    USER_PROMPT = f"""
+        User: 利用介于<context>和</context>之间的从数据库中检索出的信息来回答问题, 具体的问题介于<question>和</question>之间.
+        
+        **重要提示 - 综合使用两路查询结果**：
+        1. **以知识图谱为核心**：如果上下文中包含"【知识图谱查询结果】"部分，这些信息是从结构化知识图谱数据库中查询到的准确信息，必须作为回答的核心依据和主要信息来源。
+        2. **结合向量搜索结果**：如果上下文中还包含"【向量检索补充信息】"部分，这些信息来自向量数据库检索，应该与知识图谱结果结合使用，帮助完善、丰富和补充答案，提供更全面的信息。
+        3. **综合策略**：
+           - 优先使用知识图谱查询结果作为核心答案
+           - 使用向量检索结果补充细节、背景信息或相关知识点
+           - 如果知识图谱结果和向量检索结果有冲突，以知识图谱结果为准
+           - 如果只有向量检索结果，可以使用它作为主要信息来源
+        4. 如果提供的信息为空, 则按照你的经验知识来给出尽可能严谨准确的回答。
+        5. 不知道的时候坦诚的承认不了解, 不要编造不真实的信息。
+        6. 请用纯文本格式回答，不要使用任何特殊标签或格式标记。
+        
+        <context>
+        {context}
+        </context>
+
+        <question>
+        {enhanced_query}
+        </question>
+    """
+
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": USER_PROMPT},
+    ]
+
+
+def build_followup_messages(graph_context: str, enhanced_query: str, previous_answer: str) -> List[Dict[str, str]]:
+    """
+    构建补充回答的对话消息（提前回答后，知识图谱结果才返回时使用）
+
+    Args:
+        graph_context: 知识图谱上下文
+        enhanced_query: 增强后的问题
+        previous_answer: 已经基于向量检索结果给出的回答
+
+    Returns:
+        OpenAI 格式的消息列表
+    """
+    SYSTEM_PROMPT = """
+        System: 你是一个非常得力的医学助手. 你已经根据向量检索结果回答了用户的问题, 现在又从结构化知识图谱数据库中查询到了准确信息.
+        
+        重要要求：
+        1. 只输出简短的补充说明（不超过200字），不要重复已有回答的内容
+        2. 如果知识图谱结果与已有回答有冲突，以知识图谱结果为准并明确指出更正之处
+        3. 如果知识图谱结果没有提供新的信息，只输出"知识图谱结果与以上回答一致。"
+        4. 回答必须使用纯文本格式，不要使用任何 Markdown 格式或 HTML 标签
+    """
+
+    USER_PROMPT = f"""
+        User: 问题介于<question>和</question>之间, 已有回答介于<answer>和</answer>之间, 知识图谱查询结果介于<context>和</context>之间. 请给出补充说明.
+        
+        <context>
+        {graph_context}
+        </context>
+
+        <question>
+        {enhanced_query}
+        </question>
+
+        <answer>
+        {previous_answer}
+        </answer>
+    """
+
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": USER_PROMPT},
+    ]
+
+
+# 阶段名称与 search_stages 中对应条目的映射
+SEARCH_STAGE_KEYS = {
+    'vector': 'milvus_vector',
+    'graph': 'knowledge_graph',
+}
+
+
+class StageAborted(Exception):
+    """阶段失败且策略为终止管线时抛出"""
+
+    def __init__(self, stage: str, error: str, partial_response: str = ''):
+        """
+        Args:
+            stage: 阶段名称
+            error: 错误信息
+            partial_response: 终止前已经发送给用户的回答片段
+        """
+        super().__init__(f'{stage}: {error}')
+        self.stage = stage
+        self.error = error
+        self.partial_response = partial_response
+
+
+class StagePolicy:
+    """
+    阶段执行策略
+    timeout 为阶段超时时间（秒，None 表示不限制）；on_error 决定阶段出错或超时后的处理方式；
+    deadline_scope 决定阶段如何受请求截止时间约束
+    """
+
+    SKIP = 'skip'    # 记录错误，使用阶段默认结果继续执行后续阶段
+    ABORT = 'abort'  # 终止管线，发送 answer_error 事件
+
+    RETRIEVAL = 'retrieval'  # 回答前的阶段：必须在截止时间减去回答预留时间之前完成
+    ANSWER = 'answer'        # 回答生成：可以使用截止时间前的全部剩余时间
+    UNBOUNDED = 'unbounded'  # 不受截止时间约束，只受自身超时限制
+
+    def __init__(self, timeout: Optional[float] = None, on_error: str = SKIP, deadline_scope: str = RETRIEVAL):
+        self.timeout = timeout
+        self.on_error = on_error
+        self.deadline_scope = deadline_scope
+
+
+class Deadline:
+    """
+    单次请求的端到端截止时间
+    回答前的各阶段共享同一个时间预算，并为回答生成预留一部分时间，
+    预算耗尽的阶段直接降级（例如只用向量检索结果回答）
+    """
+
+    def __init__(self, budget: float, answer_reserve: float = None):
+        """
+        Args:
+            budget: 本次请求的总时间预算（秒）
+            answer_reserve: 为回答生成预留的时间（秒），如果为None则使用配置中的值；最多预留总预算的一半
+        """
+        if answer_reserve is None:
+            answer_reserve = settings.PIPELINE_ANSWER_RESERVE
+        self.budget = budget
+        self.answer_reserve = min(answer_reserve, budget / 2)
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        """距离截止时间的剩余秒数（可能为负）"""
+        return self.expires_at - time.monotonic()
+
+    def stage_timeout(self, policy: StagePolicy) -> Tuple[Optional[float], bool]:
+        """
+        计算阶段的实际超时时间：阶段自身超时与剩余预算中较小的一个
+
+        Args:
+            policy: 阶段执行策略
+
+        Returns:
+            (超时时间, 是否由截止时间决定)
+        """
+        if policy.deadline_scope == StagePolicy.UNBOUNDED:
+            return policy.timeout, False
+        budget = self.remaining()
+        if policy.deadline_scope == StagePolicy.RETRIEVAL:
+            budget -= self.answer_reserve
+        budget = max(budget, 0)
+        if policy.timeout is None or budget < policy.timeout:
+            return budget, True
+        return policy.timeout, False
+
+
+def default_stage_policies() -> Dict[str, StagePolicy]:
+    """
+    根据配置创建各阶段的默认执行策略
+
+    Returns:
+        阶段名称到 StagePolicy 的映射
+    """
+    return {
+        'enhance': StagePolicy(settings.PIPELINE_ENHANCE_TIMEOUT),
+        'cache': StagePolicy(settings.PIPELINE_CACHE_TIMEOUT),
+        'semantic_cache': StagePolicy(settings.PIPELINE_SEMANTIC_CACHE_TIMEOUT),
+        'session_memory': StagePolicy(settings.PIPELINE_SESSION_MEMORY_TIMEOUT),
+        'vector': StagePolicy(settings.PIPELINE_VECTOR_TIMEOUT),
+        'graph': StagePolicy(settings.PIPELINE_GRAPH_TIMEOUT),
+        # 合并上下文在回答预留时间内执行，检索预算耗尽时仍能用已有结果回答
+        'merge': StagePolicy(None, deadline_scope=StagePolicy.ANSWER),
+        # 截止时间只约束首个回答片段（见 _stage_generate），已开始流式输出的回答只受阶段自身超时约束
+        'generate': StagePolicy(settings.PIPELINE_GENERATE_TIMEOUT, StagePolicy.ABORT, StagePolicy.UNBOUNDED),
+        # 提前回答后的补充回答，失败时保留已有回答
+        'followup': StagePolicy(settings.PIPELINE_GENERATE_TIMEOUT, deadline_scope=StagePolicy.ANSWER),
+        # 回答已发送给用户，持久化不受截止时间约束，避免丢失对话历史
+        'persist': StagePolicy(settings.PIPELINE_PERSIST_TIMEOUT, deadline_scope=StagePolicy.UNBOUNDED),
+    }
+
+
+class EarlyAnswerPolicy:
+    """
+    知识图谱查询较慢时的提前回答策略
+    向量检索完成、而知识图谱查询在等待时间后仍未返回时，直接基于向量检索结果开始生成回答
+    """
+
+    OFF = 'off'            # 不提前回答，等待两路检索都完成
+    DROP = 'drop'          # 提前回答，并取消仍在进行的知识图谱查询
+    FOLLOWUP = 'followup'  # 提前回答，知识图谱结果返回后再生成一段简短的补充回答
+
+    def __init__(self, mode: str = OFF, wait_ms: float = 0):
+        """
+        Args:
+            mode: 策略（off / drop / followup）
+            wait_ms: 从检索开始计时，等待知识图谱查询的最长时间（毫秒）
+        """
+        if mode not in (self.OFF, self.DROP, self.FOLLOWUP):
+            print(f'⚠️ 未知的提前回答策略: {mode}，将不提前回答')
+            mode = self.OFF
+        self.mode = mode
+        self.wait_ms = wait_ms
+
+    @classmethod
+    def from_settings(cls) -> 'EarlyAnswerPolicy':
+        """根据配置创建提前回答策略"""
+        return cls(settings.PIPELINE_EARLY_ANSWER, settings.PIPELINE_EARLY_ANSWER_WAIT_MS)
+
+
+class PipelineContext:
+    """单次问答请求在各阶段之间传递的状态"""
+
+    def __init__(self, query: str, session_id: str, emit: EmitFunc, deadline: Deadline):
+        """
+        Args:
+            query: 用户问题
+            session_id: 会话ID
+            emit: 事件回调
+            deadline: 本次请求的截止时间
+        """
+        self.query = query
+        self.session_id = session_id
+        self.emit = emit
+        self.deadline = deadline
+        self.budget_exhausted: List[str] = []
+        self.enhanced_query = query
+        self.history: List[dict] = []
+        self.search_path: List[str] = []
+        self.search_stages = create_search_stages()
+        self.timings: Dict[str, float] = {}
+        self.vector_context = ""
+        self.graph_context = ""
+        self.context = ""
+        self.full_response = ""
+        self.partial_response = ""
+        self.early_answer = False
+        self.cached_answer: Optional[dict] = None
+        self.query_embedding: Optional[List[float]] = None
+        self.data_version: Optional[str] = None
+        self.session_memory: Optional[dict] = None
+        self.plan: Optional[dict] = None
+        self.new_session_id: Optional[str] = None
+
+    # 共享执行（单飞）产生、需要复制给每个请求的字段
+    SHARED_FIELDS = (
+        'search_path', 'search_stages', 'timings', 'budget_exhausted',
+        'vector_context', 'graph_context', 'context', 'full_response', 'early_answer'
+    )
+
+    def snapshot(self) -> dict:
+        """导出共享执行的结果（可 JSON 序列化）"""
+        return copy.deepcopy({field: getattr(self, field) for field in self.SHARED_FIELDS})
+
+    def restore(self, snapshot: dict):
+        """从共享执行的结果恢复，保留本请求自己的阶段耗时（如 enhance）"""
+        snapshot = copy.deepcopy(snapshot)
+        timings = snapshot.pop('timings', {})
+        budget_exhausted = snapshot.pop('budget_exhausted', [])
+        for field, value in snapshot.items():
+            setattr(self, field, value)
+        self.timings.update(timings)
+        self.budget_exhausted.extend(budget_exhausted)
+
+
+class ChatPipeline:
+    """
+    医疗问答管线
+    enhance -> [cache -> semantic_cache] -> [session_memory] -> (vector || graph) -> merge -> generate -> persist
+    答案缓存（精确匹配或语义相似）命中时跳过检索与生成，直接流式返回缓存的答案； (vector || graph) -> merge -> generate 可由相同问题的并发请求共享（单飞）
+    追问仍指向本会话的主实体时复用会话检索记忆：跳过向量检索，知识图谱事实在记忆的基础上增量扩充（不参与单飞）；
+    主疾病确定后在后台预取其一跳邻域，追问涉及的关系直接从邻域中回答，不生成 Cypher
+    开启提前回答时，知识图谱查询较慢则 enhance -> vector -> merge -> generate -> [graph -> followup] -> persist
+    应在应用生命周期内创建一次，所有请求共享
+    """
+
+    def __init__(
+        self,
+        milvus_vectorstore,
+        client_llm,
+        graph_client: GraphServiceClient,
+        format_docs_func,
+        policies: Optional[Dict[str, StagePolicy]] = None,
+        early_answer: Optional[EarlyAnswerPolicy] = None,
+        singleflight: Optional[SingleFlight] = None,
+        answer_cache: Optional[bool] = None,
+        semantic_cache: Optional[SemanticAnswerCache] = None,
+        embedding_model=None,
+        session_memory: Optional[SessionRetrievalMemory] = None,
+        vector_cache: Optional[VectorResultCache] = None,
+        session_topics: Optional[SessionTopicState] = None
+    ):
+        """
+        初始化问答管线
+
+        Args:
+            milvus_vectorstore: Milvus向量存储实例
+            client_llm: OpenRouter 异步LLM客户端（AsyncOpenAI）
+            graph_client: 知识图谱查询客户端（GraphServiceClient 或嵌入模式的 EmbeddedGraphClient）
+            format_docs_func: 格式化文档的函数
+            policies: 各阶段执行策略，如果为None则使用配置中的默认值
+            early_answer: 提前回答策略，如果为None则使用配置中的值
+            singleflight: 单飞实现（SingleFlight / RedisSingleFlight），为None时每个请求独立执行
+            answer_cache: 是否启用答案缓存，如果为None则使用配置中的值
+            semantic_cache: 语义答案缓存，为None时只按问题精确匹配
+            embedding_model: 计算问题向量的 embedding 模型（需提供 embed_query），启用语义答案缓存时必须提供
+            session_memory: 会话检索记忆，为None时每轮都重新检索
+            vector_cache: 向量检索结果缓存，为None时每次都访问 Milvus
+            session_topics: 会话主题状态，为None时每轮都从对话历史中识别主题
+        """
+        self.milvus_vectorstore = milvus_vectorstore
+        self.client_llm = client_llm
+        self.graph_client = graph_client
+        self.format_docs_func = format_docs_func
+        self.policies = default_stage_policies()
+        if policies:
+            self.policies.update(policies)
+        self.early_answer = early_answer or EarlyAnswerPolicy.from_settings()
+        self.singleflight = singleflight
+        self.answer_cache = settings.ANSWER_CACHE_ENABLED if answer_cache is None else answer_cache
+        self.semantic_cache = semantic_cache if embedding_model is not None else None
+        self.embedding_model = embedding_model
+        self.session_memory = session_memory
+        self.vector_cache = vector_cache
+        self.session_topics = session_topics
+        self.versions = get_version_watcher()
+        self._redis = None
+        self._prefetching = set()  # 进行中的邻域预取任务（保留引用，避免被回收）
+
+    async def run(
+        self,
+        query: str,
+        session_id: str,
+        deadline: Optional[float] = None
+    ) -> AsyncGenerator[Tuple[str, dict], None]:
+        """
+        执行问答管线
+
+        Args:
+            query: 用户问题
+            session_id: 会话ID
+            deadline: 本次请求的时间预算（秒），如果为None则使用配置中的值
+
+        Yields:
+            (event_type, data) 事件元组，事件在产生时立即转发
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def emit(event_type: str, data: dict) -> None:
+            await queue.put((event_type, data))
+
+        ctx = PipelineContext(query, session_id, emit, Deadline(deadline or settings.PIPELINE_DEADLINE))
+
+        # 发送会话ID事件（前端需要保存）
+        await emit('session_id', {'session_id': session_id})
+
+        runner = asyncio.create_task(self._execute(ctx))
+        runner.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield item
+            # 传播管线中未预期的异常
+            runner.result()
+        finally:
+            # 客户端断开时取消仍在执行的阶段
+            if not runner.done():
+                runner.cancel()
+
+    async def _execute(self, ctx: PipelineContext):
+        """按顺序执行各阶段；相同问题的并发请求共享检索与回答生成（单飞），对话持久化按请求各自执行"""
+        try:
+            await self._run_stage('enhance', ctx, self._stage_enhance)
+            # 检索之前先查答案缓存，命中时直接流式返回缓存的答案
+            if self.answer_cache:
+                await self._run_stage('cache', ctx, self._stage_cache_lookup)
+            if ctx.cached_answer is None and self.semantic_cache is not None:
+                await self._run_stage('semantic_cache', ctx, self._stage_semantic_cache_lookup)
+            if ctx.cached_answer is not None:
+                await self._replay_cached_answer(ctx)
+            else:
+                if self.session_memory is not None:
+                    await self._run_stage('session_memory', ctx, self._stage_session_memory)
+                await self._answer_shared(ctx)
+            await self._run_stage('persist', ctx, self._stage_persist)
+        except StageAborted as e:
+            if e.partial_response:
+                # 已经流式输出了部分回答，仍然写入对话历史
+                ctx.full_response = clean_markdown(e.partial_response)
+                await self._run_stage('persist', ctx, self._stage_persist)
+            await ctx.emit('answer_error', {
+                'error': e.error,
+                'message': f'生成回答失败: {e.error}'
+            })
+            return
+
+        ctx.search_stages['timings'] = dict(ctx.timings)
+        ctx.search_stages['budget_exhausted'] = list(ctx.budget_exhausted)
+
+        # 发送最终结果
+        now = datetime.datetime.now()
+        time_str = now.strftime("%Y-%m-%d %H:%M:%S")
+        await ctx.emit('answer_complete', {
+            'response': ctx.full_response,
+            'status': 200,
+            'time': time_str,
+            'session_id': ctx.session_id,  # 当前回答仍属于旧会话
+            'new_session_id': ctx.new_session_id if ctx.new_session_id else None,  # 如果创建了新会话，返回新的session_id供下次使用
+            'new_session_created': ctx.new_session_id is not None,  # 标识是否创建了新会话
+            'search_path': ctx.search_path,
+            'search_stages': ctx.search_stages
+        })
+
+    async def _answer_shared(self, ctx: PipelineContext):
+        """
+        通过单飞执行检索与回答生成：增强后问题相同的并发请求只执行一次，事件广播给所有请求
+
+        Raises:
+            StageAborted: 共享执行中的阶段失败且策略为 ABORT
+        """
+        # 复用会话检索记忆的回答依赖本会话的上下文，不与其他会话共享，也不写入全局的答案缓存
+        if self.singleflight is None or ctx.session_memory is not None:
+            await self._answer(ctx)
+            if ctx.session_memory is None:
+                await self._store_answer(ctx)
+            return
+
+        async def produce(publish: EmitFunc) -> dict:
+            # 共享执行使用独立的上下文，只依赖增强后的问题；截止时间沿用发起请求的截止时间
+            shared = PipelineContext(ctx.enhanced_query, ctx.session_id, publish, ctx.deadline)
+            shared.query_embedding = ctx.query_embedding
+            shared.data_version = ctx.data_version
+            shared.plan = ctx.plan
+            await self._answer(shared)
+            await self._store_answer(shared)
+            return shared.snapshot()
+
+        try:
+            result, role = await self.singleflight.do(flight_key(ctx.enhanced_query), produce, ctx.emit)
+        except FlightError as e:
+            if isinstance(e.error, StageAborted):
+                raise e.error
+            raise StageAborted('generate', str(e.error))
+        ctx.restore(result)
+        if role != SingleFlight.LEADER:
+            print(f'🔗 相同问题正在处理，已合并到进行中的请求（{role}）: {ctx.enhanced_query}')
+        ctx.search_stages['singleflight'] = role
+
+    async def _redis_client(self):
+        """获取管线共享的 Redis 客户端（首次使用时创建）"""
+        if self._redis is None:
+            self._redis = await asyncio.to_thread(get_redis_client)
+        return self._redis
+
+    async def _stage_cache_lookup(self, ctx: PipelineContext):
+        """答案缓存查询（按规范化后的增强问题精确匹配，向量库或知识图谱重建前缓存的条目不命中）"""
+        redis_client = await self._redis_client()
+        ctx.data_version = await asyncio.to_thread(self.versions.token, VECTOR, GRAPH)
+        entry = await asyncio.to_thread(cache_get_entry, redis_client, ctx.enhanced_query, ctx.data_version)
+        if entry and entry.get('answer'):
+            ctx.cached_answer = {**entry, 'match': 'exact'}
+            print(f'⚡ 命中答案缓存: {ctx.enhanced_query}')
+
+    async def _stage_semantic_cache_lookup(self, ctx: PipelineContext):
+        """语义答案缓存查询（按增强问题向量的余弦相似度匹配）"""
+        ctx.query_embedding = await asyncio.to_thread(self.embedding_model.embed_query, ctx.enhanced_query)
+        entry = await asyncio.to_thread(self.semantic_cache.lookup, ctx.query_embedding)
+        if entry and entry.get('answer'):
+            ctx.cached_answer = {**entry, 'match': 'semantic'}
+            print(f"⚡ 命中语义答案缓存（相似度 {entry['score']}）: {ctx.enhanced_query} ≈ {entry['question']}")
+
+    async def _stage_session_memory(self, ctx: PipelineContext):
+        """会话检索记忆查询：增强后的问题仍包含记忆中的主实体、且没有记忆以外的疾病/症状/药物时复用之前的检索结果"""
+        memory = await asyncio.to_thread(self.session_memory.load, ctx.session_id)
+        hit = SessionRetrievalMemory.matches(memory, ctx.enhanced_query, get_entity_dictionary())
+        ctx.search_stages['session_memory'] = {'hit': hit, 'entity': (memory or {}).get('entity')}
+        if hit:
+            ctx.session_memory = memory
+            print(f"🧠 复用会话检索记忆（{memory['entity']}，已有 {len(memory['graph_facts'])} 条图谱事实）: {ctx.enhanced_query}")
+
+    async def _remember_retrieval(self, ctx: PipelineContext):
+        """把本轮的检索结果写入会话检索记忆（主实体取自知识图谱查询，没有主实体时不记录）"""
+        graph_stage = ctx.search_stages['knowledge_graph']
+        entity = graph_stage.get('entity') or (ctx.session_memory or {}).get('entity')
+        if not entity:
+            return
+        vector_stage = ctx.search_stages['milvus_vector']
+        reused = vector_stage.get('session_memory', False)
+        await asyncio.to_thread(
+            self.session_memory.remember,
+            ctx.session_id,
+            entity,
+            '' if reused else ctx.vector_context,
+            vector_stage.get('results', []),
+            vector_stage.get('count', 0),
+            graph_stage.get('results', []) if graph_stage.get('status') == 'success' else [],
+            graph_stage.get('entities', [])
+        )
+
+    async def _remember_topic(self, ctx: PipelineContext):
+        """把增强后问题中的疾病、症状、药物合并到会话主题状态（实体词典不可用时使用合并模式识别的实体，都没有时不记录）"""
+        dictionary = get_entity_dictionary()
+        if dictionary is not None:
+            entities = link_entities([ctx.enhanced_query], dictionary)
+        elif ctx.plan is not None:
+            entities = ctx.plan['entities']
+        else:
+            return
+        await asyncio.to_thread(self.session_topics.update, ctx.session_id, entities)
+
+    async def _replay_cached_answer(self, ctx: PipelineContext):
+        """把缓存的答案按 SSE 片段流式返回，检索阶段状态沿用缓存时的结果"""
+        entry = ctx.cached_answer
+        for stage_key in ('milvus_vector', 'knowledge_graph'):
+            if stage_key in entry.get('search_stages', {}):
+                ctx.search_stages[stage_key] = entry['search_stages'][stage_key]
+            stage = ctx.search_stages[stage_key]
+            stage['cached'] = True
+            await ctx.emit('search_stage', {
+                **stage,
+                'stage': stage_key,
+                'message': f"{stage['description']}：命中答案缓存"
+            })
+        ctx.search_path = list(entry.get('search_path', []))
+        ctx.search_stages['answer_cache'] = {'hit': True, 'match': entry['match'], 'cached_at': entry.get('time')}
+        if entry['match'] == 'semantic':
+            ctx.search_stages['answer_cache'].update({'score': entry['score'], 'matched_question': entry['question']})
+        ctx.search_stages.setdefault('context_used', {})['answer'] = ['answer_cache']
+        await ctx.emit('context_used', {
+            'phase': 'answer',
+            'contexts': ['answer_cache'],
+            'pending': [],
+            'early_answer': False,
+            'early_answer_policy': self.early_answer.mode,
+            'message': '回答来自答案缓存'
+        })
+
+        await ctx.emit('answer_start', {
+            'message': '开始生成回答...'
+        })
+        answer = entry['answer']
+        chunk_size = settings.ANSWER_CACHE_CHUNK_SIZE
+        for i in range(0, len(answer), chunk_size):
+            await ctx.emit('answer_chunk', {
+                'content': answer[i:i + chunk_size]
+            })
+        ctx.full_response = answer
+
+    async def _store_answer(self, ctx: PipelineContext):
+        """
+        把完整的回答写入答案缓存（精确匹配与语义缓存）
+        检索被截断（时间预算耗尽或提前回答丢弃了知识图谱结果）、或复用了会话检索记忆的回答不缓存
+        """
+        if not ctx.full_response or ctx.budget_exhausted or ctx.session_memory is not None:
+            return
+        if ctx.early_answer and self.early_answer.mode == EarlyAnswerPolicy.DROP:
+            return
+        metadata = {
+            'search_path': ctx.search_path,
+            'search_stages': {key: ctx.search_stages[key] for key in ('milvus_vector', 'knowledge_graph')}
+        }
+        if self.semantic_cache is not None and ctx.query_embedding is not None:
+            await asyncio.to_thread(
+                self.semantic_cache.add, ctx.enhanced_query, ctx.query_embedding, ctx.full_response, metadata
+            )
+        if not self.answer_cache:
+            return
+        try:
+            redis_client = await self._redis_client()
+            if ctx.data_version is None:
+                ctx.data_version = await asyncio.to_thread(self.versions.token, VECTOR, GRAPH)
+            # 重建代价：本次请求到目前为止实际花费的毫秒数
+            cost = (ctx.deadline.budget - ctx.deadline.remaining()) * 1000
+            await asyncio.to_thread(
+                cache_set, redis_client, ctx.enhanced_query, ctx.full_response, settings.ANSWER_CACHE_TTL, metadata,
+                None, ctx.data_version, cost
+            )
+        except Exception as e:
+            print(f'⚠️ 写入答案缓存失败: {str(e)}')
+
+    async def _answer(self, ctx: PipelineContext):
+        """检索（向量检索与知识图谱查询并发执行）-> 合并上下文 -> 生成回答"""
+        vector_task = graph_task = None
+        try:
+            retrieval_started = time.perf_counter()
+            vector_task = asyncio.create_task(self._run_stage('vector', ctx, self._stage_vector))
+            graph_task = asyncio.create_task(self._run_stage('graph', ctx, self._stage_graph))
+            ctx.early_answer = await self._wait_for_retrieval(vector_task, graph_task, ctx, retrieval_started)
+            if ctx.early_answer and self.early_answer.mode == EarlyAnswerPolicy.DROP:
+                await self._drop_graph_stage(graph_task, ctx)
+
+            await self._run_stage('merge', ctx, self._stage_merge)
+            await self._emit_context_used(ctx, 'answer')
+
+            # 发送开始生成回答事件
+            await ctx.emit('answer_start', {
+                'message': '开始生成回答...'
+            })
+            await self._run_stage('generate', ctx, self._stage_generate)
+
+            if ctx.early_answer and self.early_answer.mode == EarlyAnswerPolicy.FOLLOWUP:
+                # 等待仍在进行的知识图谱查询（受截止时间约束），有结果时生成补充回答
+                await graph_task
+                if ctx.graph_context:
+                    await self._run_stage('followup', ctx, self._stage_followup)
+        finally:
+            for task in (vector_task, graph_task):
+                if task and not task.done():
+                    task.cancel()
+
+    async def _wait_for_retrieval(
+        self,
+        vector_task: asyncio.Task,
+        graph_task: asyncio.Task,
+        ctx: PipelineContext,
+        started: float
+    ) -> bool:
+        """
+        等待检索阶段完成，按提前回答策略决定是否不再等待知识图谱查询
+
+        Args:
+            vector_task: 向量检索任务
+            graph_task: 知识图谱查询任务
+            ctx: 管线上下文
+            started: 检索开始时间（time.perf_counter）
+
+        Returns:
+            是否提前回答（知识图谱查询仍在进行）
+        """
+        if self.early_answer.mode == EarlyAnswerPolicy.OFF:
+            await asyncio.gather(vector_task, graph_task)
+            return False
+
+        await vector_task
+        # 没有向量检索结果时提前回答没有意义，继续等待知识图谱查询
+        if graph_task.done() or not ctx.vector_context:
+            await graph_task
+            return False
+
+        wait = max(self.early_answer.wait_ms / 1000 - (time.perf_counter() - started), 0)
+        done, _ = await asyncio.wait({graph_task}, timeout=wait)
+        if done:
+            return False
+        print(f'⏩ 知识图谱查询超过 {self.early_answer.wait_ms}ms 未返回，基于向量检索结果提前回答')
+        return True
+
+    async def _drop_graph_stage(self, graph_task: asyncio.Task, ctx: PipelineContext):
+        """提前回答且策略为 DROP：取消知识图谱查询，并标记为跳过"""
+        graph_task.cancel()
+        stage = ctx.search_stages['knowledge_graph']
+        stage['status'] = 'skipped'
+        stage['message'] = '知识图谱查询较慢，已基于向量检索结果提前回答'
+        await ctx.emit('search_stage', {
+            'stage': 'knowledge_graph',
+            'status': 'skipped',
+            'message': stage['message']
+        })
+
+    async def _emit_context_used(self, ctx: PipelineContext, phase: str):
+        """
+        记录并发送实际用于生成回答的上下文来源
+
+        Args:
+            ctx: 管线上下文
+            phase: 'answer'（主回答）或 'followup'（补充回答）
+        """
+        if phase == 'followup':
+            contexts = ['knowledge_graph']
+        else:
+            contexts = [key for key, value in (('knowledge_graph', ctx.graph_context), ('milvus_vector', ctx.vector_context)) if value]
+        pending = ['knowledge_graph'] if phase == 'answer' and ctx.early_answer else []
+        ctx.search_stages.setdefault('context_used', {})[phase] = contexts
+        await ctx.emit('context_used', {
+            'phase': phase,
+            'contexts': contexts,
+            'pending': pending,
+            'early_answer': ctx.early_answer,
+            'early_answer_policy': self.early_answer.mode,
+            'message': f"{'补充回答' if phase == 'followup' else '回答'}使用的上下文: {', '.join(contexts) or '无'}"
+        })
+
+    async def _run_stage(
+        self,
+        name: str,
+        ctx: PipelineContext,
+        stage_func: Callable[[PipelineContext], Awaitable[None]]
+    ) -> bool:
+        """
+        执行单个阶段：计时、超时控制并按策略处理错误
+
+        Args:
+            name: 阶段名称
+            ctx: 管线上下文
+            stage_func: 阶段实现
+
+        Returns:
+            阶段是否成功完成
+
+        Raises:
+            StageAborted: 阶段失败且策略为 ABORT
+        """
+        policy = self.policies[name]
+        timeout, by_deadline = ctx.deadline.stage_timeout(policy)
+        start = time.perf_counter()
+        try:
+            if by_deadline and timeout <= 0:
+                raise TimeoutError
+            async with asyncio.timeout(timeout):
+                await stage_func(ctx)
+            return True
+        except TimeoutError:
+            if by_deadline:
+                # 请求的时间预算已耗尽，该阶段降级
+                error = f'{name} 阶段时间预算耗尽（总预算{ctx.deadline.budget}秒）'
+                ctx.budget_exhausted.append(name)
+                if name in SEARCH_STAGE_KEYS:
+                    ctx.search_stages[SEARCH_STAGE_KEYS[name]]['budget_exhausted'] = True
+            else:
+                error = f'{name} 阶段超时（{policy.timeout}秒）'
+        except Exception as e:
+            error = str(e)
+        finally:
+            elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+            ctx.timings[name] = elapsed_ms
+            if name in SEARCH_STAGE_KEYS:
+                ctx.search_stages[SEARCH_STAGE_KEYS[name]]['elapsed_ms'] = elapsed_ms
+
+        print(f'⚠️ 管线阶段 {name} 失败: {error}')
+        await self._on_stage_failure(name, ctx, error)
+        if policy.on_error == StagePolicy.ABORT:
+            raise StageAborted(name, error, ctx.partial_response)
+        return False
+
+    async def _on_stage_failure(self, name: str, ctx: PipelineContext, error: str):
+        """记录检索阶段的失败状态，并通知前端"""
+        stage_key = SEARCH_STAGE_KEYS.get(name)
+        if not stage_key:
+            return
+        stage = ctx.search_stages[stage_key]
+        stage['status'] = 'error'
+        stage['error'] = error
+        await ctx.emit('search_stage', {
+            'stage': stage_key,
+            'status': 'error',
+            'error': error,
+            'message': f"{stage['description']}失败: {error}"
+        })
+
+    async def _stage_enhance(self, ctx: PipelineContext):
+        """
+        上下文增强：从历史对话中提取信息，增强当前问题
+        会话有主题状态时先只用主题在本地判断，能确定时不再读取对话历史
+        """
+        topic = None
+        if self.session_topics is not None:
+            state = await asyncio.to_thread(self.session_topics.load, ctx.session_id)
+            topic = (state or {}).get('topic')
+            if state is not None and settings.CONTEXT_LOCAL_FILTER_ENABLED:
+                resolved = resolve_query_locally(ctx.query, [], 5, topic)
+                if resolved is not None:
+                    await self._apply_enhancement(ctx, *resolved)
+                    return
+
+        redis_client = await self._redis_client()
+        ctx.history = await asyncio.to_thread(get_session_conversations, redis_client, ctx.session_id)
+
+        # 如果有历史记录，尝试增强问题
+        if not ctx.history:
+            return
+
+        if settings.QUERY_PLAN_ENABLED:
+            # 合并模式：本地无法确定时一次调用同时得到补全后的问题、实体与 Cypher
+            resolved = resolve_query_locally(ctx.query, ctx.history, 5, topic) if settings.CONTEXT_LOCAL_FILTER_ENABLED else None
+            if resolved is not None:
+                await self._apply_enhancement(ctx, *resolved)
+                return
+            plan = await asyncio.to_thread(plan_query, ctx.query, ctx.history, 5, topic)
+            if plan is not None:
+                ctx.plan = plan
+                await self._apply_enhancement(ctx, plan['query'], plan['enhanced'])
+                return
+
+        enhanced_query, was_enhanced = await asyncio.to_thread(
+            enhance_query_with_context, ctx.query, ctx.history, 5, topic
+        )
+        await self._apply_enhancement(ctx, enhanced_query, was_enhanced)
+
+    async def _apply_enhancement(self, ctx: PipelineContext, enhanced_query: str, was_enhanced: bool):
+        """记录增强后的问题并通知前端"""
+        if was_enhanced:
+            ctx.enhanced_query = enhanced_query
+            print(f"✅ 问题已增强: {ctx.query} -> {enhanced_query}")
+            # 发送问题增强事件（可选，用于前端显示）
+            await ctx.emit('query_enhanced', {
+                'original_query': ctx.query,
+                'enhanced_query': enhanced_query,
+                'message': '问题已根据对话历史增强'
+            })
+
+    async def _stage_vector(self, ctx: PipelineContext):
+        """向量数据库检索（使用增强后的问题），命中会话检索记忆时复用之前检索到的文档"""
+        memory = ctx.session_memory
+        if memory and memory.get('vector_context'):
+            stage = ctx.search_stages['milvus_vector']
+            stage.update(status='success', count=memory['vector_count'], results=memory['vector_results'], session_memory=True)
+            ctx.search_path.append('milvus_vector')
+            ctx.vector_context = memory['vector_context']
+            await ctx.emit('search_stage', {
+                'stage': 'milvus_vector',
+                'status': 'success',
+                'count': stage['count'],
+                'results': stage['results'],
+                'session_memory': True,
+                'message': f"复用本会话关于「{memory['entity']}」的检索结果，共 {stage['count']} 条"
+            })
+            return
+        ctx.vector_context = await run_vector_search(
+            ctx.enhanced_query,
+            self.milvus_vectorstore,
+            self.format_docs_func,
+            ctx.search_stages,
+            ctx.search_path,
+            ctx.emit,
+            self.vector_cache
+        )
+
+    async def _stage_graph(self, ctx: PipelineContext):
+        """
+        知识图谱查询（使用增强后的问题），命中会话检索记忆时与之前查询到的事实合并
+        会话已预取主疾病的邻域、且问题涉及的关系都在邻域中时，直接从邻域中取答案；
+        邻域的每种关系按 GRAPH_NEIGHBORHOOD_LIMIT 截断，某个关系意图在邻域中没有邻居时照常生成 Cypher 查询
+        """
+        memory = ctx.session_memory
+        relations = detect_relation_intents(ctx.enhanced_query) if memory and memory.get('neighborhood') is not None else []
+        if not (relations and await self._answer_from_neighborhood(ctx, relations)):
+            ctx.graph_context = await run_knowledge_graph_query(
+                ctx.enhanced_query,
+                self.graph_client,
+                ctx.search_stages,
+                ctx.search_path,
+                ctx.emit,
+                (ctx.plan or {}).get('cypher_query') or None
+            )
+            self._prefetch_neighborhood(ctx)
+        if memory and memory.get('graph_facts'):
+            stage = ctx.search_stages['knowledge_graph']
+            facts = stage['results'] if stage['status'] == 'success' else []
+            remembered = [fact for fact in memory['graph_facts'] if fact not in facts]
+            stage['session_memory_facts'] = len(remembered)
+            if 'knowledge_graph' not in ctx.search_path:
+                ctx.search_path.append('knowledge_graph')
+            ctx.graph_context = GRAPH_CONTEXT_HEADER + "\n".join([*facts, *remembered])
+
+    async def _answer_from_neighborhood(self, ctx: PipelineContext, relations: List[str]) -> bool:
+        """
+        从会话预取的疾病邻域中取出问题涉及的关系，不生成 Cypher、不访问 Neo4j
+
+        Returns:
+            是否已从邻域回答；问题的某个关系意图在邻域中没有任何邻居（邻域可能被截断）时返回 False，由调用方生成 Cypher 查询
+        """
+        entity = ctx.session_memory['entity']
+        neighborhood = ctx.session_memory['neighborhood']
+        missing = [
+            '|'.join(intent) for intent in detect_intents(ctx.enhanced_query)
+            if not any(neighborhood.get(relation) for relation in intent)
+        ]
+        if missing:
+            print(f"🧭 「{entity}」的邻域中没有 {', '.join(missing)}，照常查询知识图谱")
+            return False
+        facts, names = [], []
+        for relation in relations:
+            if neighborhood.get(relation):
+                facts.append(describe_relation(entity, relation, neighborhood[relation]))
+                names.extend(neighborhood[relation])
+        stage = ctx.search_stages['knowledge_graph']
+        stage.update(neighborhood=True, relations=relations, entity=entity, entities=names)
+        stage.update(status='success', count=len(names), results=facts)
+        ctx.search_path.append('knowledge_graph')
+        print(f"🧭 从预取的邻域回答（{entity}: {', '.join(relations)}），跳过 Cypher 生成")
+        await ctx.emit('search_stage', {
+            'stage': 'knowledge_graph',
+            'status': 'success',
+            'count': len(names),
+            'results': facts,
+            'neighborhood': True,
+            'message': f'从「{entity}」的知识图谱邻域中找到 {len(names)} 条结果'
+        })
+        ctx.graph_context = GRAPH_CONTEXT_HEADER + "\n".join(facts)
+        return True
+
+    def _prefetch_neighborhood(self, ctx: PipelineContext):
+        """知识图谱查询确定了主疾病、且本会话还没有它的邻域时，在后台预取"""
+        if self.session_memory is None or not settings.SESSION_NEIGHBORHOOD_PREFETCH:
+            return
+        entity = ctx.search_stages['knowledge_graph'].get('entity')
+        memory = ctx.session_memory or {}
+        if not entity or (memory.get('entity') == entity and memory.get('neighborhood') is not None):
+            return
+        task = asyncio.create_task(self._fetch_neighborhood(ctx.session_id, entity))
+        self._prefetching.add(task)
+        task.add_done_callback(self._prefetching.discard)
+
+    async def _fetch_neighborhood(self, session_id: str, entity: str):
+        """获取疾病的一跳邻域并保存到会话（失败时只记录日志，追问照常生成 Cypher）"""
+        try:
+            result = await self.graph_client.neighborhood(entity)
+            if result.get('found'):
+                await asyncio.to_thread(self.session_memory.save_neighborhood, session_id, entity, result['relations'])
+                print(f"🧭 已预取「{entity}」的知识图谱邻域（{result.get('count', 0)} 个邻居）")
+        except Exception as e:
+            print(f'⚠️ 预取知识图谱邻域失败（{entity}）: {str(e)}')
+
+    async def _stage_merge(self, ctx: PipelineContext):
+        """合并所有上下文 - 以知识图谱为核心，结合向量搜索结果"""
+        ctx.context = merge_contexts(ctx.vector_context, ctx.graph_context)
+
+    async def _stream_answer(
+        self,
+        ctx: PipelineContext,
+        messages: List[Dict[str, str]],
+        first_chunk_timeout: Optional[float] = None
+    ) -> str:
+        """
+        流式生成回答，逐片段发送 answer_chunk 事件（已发送的内容同时记录在 ctx.partial_response），返回完整回答
+
+        Args:
+            ctx: 管线上下文
+            messages: 对话消息
+            first_chunk_timeout: 等待首个片段的最长时间（秒），收到首个片段后不再限制；None 表示不限制
+
+        Raises:
+            TimeoutError: 首个片段超时
+        """
+        full_response = ""
+        # aclosing 确保客户端断开时底层 HTTP 流被及时关闭
+        async with aclosing(stream_openrouter_answer(self.client_llm, messages)) as answer_stream:
+            async with asyncio.timeout(first_chunk_timeout) as first_chunk:
+                async for content in answer_stream:
+                    first_chunk.reschedule(None)
+                    full_response += content
+                    ctx.partial_response += content
+                    # 发送流式回答片段
+                    await ctx.emit('answer_chunk', {
+                        'content': content
+                    })
+        return full_response
+
+    async def _stage_generate(self, ctx: PipelineContext):
+        """
+        使用 OpenRouter 异步客户端流式生成回复
+        请求的截止时间只约束首个片段（回答预留时间内必须开始输出），开始输出后不再因截止时间中断
+        """
+        messages = build_answer_messages(ctx.context, ctx.enhanced_query)
+        first_chunk_timeout, _ = ctx.deadline.stage_timeout(StagePolicy(None, deadline_scope=StagePolicy.ANSWER))
+        ctx.partial_response = ""
+        try:
+            full_response = await self._stream_answer(ctx, messages, first_chunk_timeout)
+        except TimeoutError:
+            ctx.budget_exhausted.append('generate')
+            raise RuntimeError(f'首个回答片段超出时间预算（总预算{ctx.deadline.budget}秒）') from None
+
+        # 后处理：移除可能的 Markdown 格式标记
+        ctx.full_response = clean_markdown(full_response)
+
+    async def _stage_followup(self, ctx: PipelineContext):
+        """提前回答后知识图谱结果才返回：基于知识图谱结果流式生成简短的补充回答"""
+        await self._emit_context_used(ctx, 'followup')
+        separator = "\n\n【知识图谱补充】"
+        await ctx.emit('answer_chunk', {
+            'content': separator
+        })
+        messages = build_followup_messages(ctx.graph_context, ctx.enhanced_query, ctx.full_response)
+        followup = await self._stream_answer(ctx, messages)
+        ctx.full_response += separator + clean_markdown(followup)
+
+    async def _stage_persist(self, ctx: PipelineContext):
+        """保存对话历史（以及会话检索记忆、会话主题）到Redis"""
+        redis_client = await self._redis_client()
+        new_session_id, should_create_new = await asyncio.to_thread(
+            save_conversation_history, redis_client, ctx.session_id, ctx.query, ctx.full_response
+        )
+        if self.session_memory is not None and ctx.cached_answer is None:
+            try:
+                await self._remember_retrieval(ctx)
+            except Exception as e:
+                print(f'⚠️ 写入会话检索记忆失败: {str(e)}')
+        if self.session_topics is not None:
+            try:
+                await self._remember_topic(ctx)
+            except Exception as e:
+                print(f'⚠️ 写入会话主题失败: {str(e)}')
+
+        # 如果达到10条，需要创建新会话
+        if should_create_new and new_session_id:
+            ctx.new_session_id = new_session_id
+            print(f"对话达到10条，自动创建新会话: {new_session_id}")
+            # 发送新会话创建事件
+            await ctx.emit('new_session_created', {
+                'new_session_id': new_session_id,
+                'old_session_id': ctx.session_id,
+                'message': '对话达到10条，已自动创建新会话'
+            })
@@ -0,0 +1,255 @@
+"""
+进程内的 Redis 替身
+只实现缓存、单飞与会话状态用到的命令（字符串、哈希、有序集合、Stream、过期时间与 pipeline），返回值与 redis-py 一致为字节串
+"""
+import time
+import threading
+
+
+def _bytes(value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode('utf-8')
+
+
+class InMemoryRedis:
+    """进程内的 Redis 替身（线程安全）"""
+
+    def __init__(self):
+        self.data = {}      # 键 -> 值（bytes / dict / list）
+        self.expires = {}   # 键 -> 过期时间戳
+        self.lock = threading.Condition()
+        self._stream_seq = 0
+        self.down = False   # 为 True 时所有命令抛出 ConnectionError，模拟 Redis 不可用
+
+    # ---------- 内部 ----------
+
+    def _check(self):
+        if self.down:
+            import redis
+            raise redis.exceptions.ConnectionError('Redis 不可用')
+
+    def _alive(self, key):
+        key = _bytes(key)
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def _set(self, key, value, ttl=None):
+        key = _bytes(key)
+        self.data[key] = value
+        if ttl is None:
+            self.expires.pop(key, None)
+        else:
+            self.expires[key] = time.time() + ttl
+
+    # ---------- 字符串与通用命令 ----------
+
+    def get(self, key):
+        with self.lock:
+            self._check()
+            value = self._alive(key)
+            return value if isinstance(value, bytes) else None
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        with self.lock:
+            self._check()
+            if nx and self._alive(key) is not None:
+                return None
+            ttl = ex if ex is not None else (px / 1000 if px else None)
+            self._set(key, _bytes(value), ttl)
+            return True
+
+    def mget(self, *keys):
+        with self.lock:
+            self._check()
+            values = [self._alive(key) for key in keys]
+            return [value if isinstance(value, bytes) else None for value in values]
+
+    def setex(self, key, ttl, value):
+        return self.set(key, value, ex=ttl)
+
+    def ttl(self, key):
+        with self.lock:
+            self._check()
+            if self._alive(key) is None:
+                return -2
+            expires = self.expires.get(_bytes(key))
+            return -1 if expires is None else int(expires - time.time())
+
+    def exists(self, key):
+        with self.lock:
+            self._check()
+            return int(self._alive(key) is not None)
+
+    def delete(self, *keys):
+        with self.lock:
+            self._check()
+            removed = 0
+            for key in keys:
+                if self._alive(key) is not None:
+                    removed += 1
+                self.data.pop(_bytes(key), None)
+                self.expires.pop(_bytes(key), None)
+            return removed
+
+    def expire(self, key, ttl):
+        with self.lock:
+            self._check()
+            if self._alive(key) is None:
+                return False
+            self.expires[_bytes(key)] = time.time() + ttl
+            return True
+
+    # ---------- 哈希 ----------
+
+    def hgetall(self, key):
+        with self.lock:
+            self._check()
+            return dict(self._alive(key) or {})
+
+    def hget(self, key, field):
+        with self.lock:
+            self._check()
+            return (self._alive(key) or {}).get(_bytes(field))
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        with self.lock:
+            self._check()
+            current = self._alive(key)
+            if current is None:
+                current = {}
+                self._set(key, current)
+            items = dict(mapping or {})
+            if field is not None:
+                items[field] = value
+            for name, item in items.items():
+                current[_bytes(name)] = _bytes(item)
+            return len(items)
+
+    def hincrby(self, key, field, amount=1):
+        with self.lock:
+            self._check()
+            current = self._alive(key)
+            if current is None:
+                current = {}
+                self._set(key, current)
+            value = int(current.get(_bytes(field), 0)) + amount
+            current[_bytes(field)] = _bytes(value)
+            return value
+
+    # ---------- 有序集合 ----------
+
+    def _zset(self, key, create=False):
+        current = self._alive(key)
+        if current is None and create:
+            current = {}
+            self._set(key, current)
+        return current if current is not None else {}
+
+    def zadd(self, key, mapping):
+        with self.lock:
+            self._check()
+            current = self._zset(key, create=True)
+            added = sum(1 for member in mapping if _bytes(member) not in current)
+            for member, score in mapping.items():
+                current[_bytes(member)] = float(score)
+            return added
+
+    def zrem(self, key, *members):
+        with self.lock:
+            self._check()
+            current = self._zset(key)
+            return sum(1 for member in members if current.pop(_bytes(member), None) is not None)
+
+    def zscore(self, key, member):
+        with self.lock:
+            self._check()
+            return self._zset(key).get(_bytes(member))
+
+    def zcard(self, key):
+        with self.lock:
+            self._check()
+            return len(self._zset(key))
+
+    @staticmethod
+    def _bound(value):
+        return {'-inf': float('-inf'), '+inf': float('inf')}.get(value, value)
+
+    def zrangebyscore(self, key, low, high):
+        with self.lock:
+            self._check()
+            low, high = self._bound(low), self._bound(high)
+            items = sorted(self._zset(key).items(), key=lambda item: (item[1], item[0]))
+            return [member for member, score in items if low <= score <= high]
+
+    def zremrangebyscore(self, key, low, high):
+        members = self.zrangebyscore(key, low, high)
+        return self.zrem(key, *members) if members else 0
+
+    def zpopmin(self, key, count=1):
+        with self.lock:
+            self._check()
+            current = self._zset(key)
+            items = sorted(current.items(), key=lambda item: (item[1], item[0]))[:count]
+            for member, _ in items:
+                del current[member]
+            return items
+
+    # ---------- Stream ----------
+
+    def xadd(self, key, fields):
+        with self.lock:
+            self._check()
+            entries = self._alive(key)
+            if entries is None:
+                entries = []
+                self._set(key, entries)
+            self._stream_seq += 1
+            entry_id = f'{self._stream_seq}-0'.encode('utf-8')
+            entries.append((entry_id, {_bytes(name): _bytes(value) for name, value in fields.items()}))
+            self.lock.notify_all()
+            return entry_id
+
+    def xread(self, streams, count=None, block=None):
+        deadline = time.time() + (block or 0) / 1000
+        with self.lock:
+            while True:
+                self._check()
+                result = []
+                for key, last_id in streams.items():
+                    last = int(_bytes(last_id).split(b'-')[0])
+                    entries = [entry for entry in (self._alive(key) or []) if int(entry[0].split(b'-')[0]) > last]
+                    if entries:
+                        result.append([_bytes(key), entries[:count] if count else entries])
+                remaining = deadline - time.time()
+                if result or block is None or remaining <= 0:
+                    return result
+                self.lock.wait(remaining)
+
+    # ---------- pipeline ----------
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    """按顺序缓存命令，execute 时依次执行并返回结果列表"""
+
+    def __init__(self, client: InMemoryRedis):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def queue(*args, **kwargs):
+            self.commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        commands, self.commands = self.commands, []
+        return [method(*args, **kwargs) for method, args, kwargs in commands]
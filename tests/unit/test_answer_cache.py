@@ -0,0 +1,91 @@
+"""
+答案缓存测试
+使用进程内的 Redis 替身，不依赖 Redis 服务
+"""
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.cache.redis_client import (
+    ANSWER_CACHE_INDEX,
+    ANSWER_CACHE_PRIORITY,
+    _answer_cache_key,
+    cache_get_entry,
+    cache_set,
+    cache_stats
+)
+from in_memory_redis import InMemoryRedis
+
+
+def test_capacity_evicts_lowest_cost_per_byte():
+    """超过容量上限时先淘汰 重建代价/字节数 最低的条目，而不是最早过期的条目"""
+    r = InMemoryRedis()
+    cache_set(r, '高血压吃什么药', '硝苯地平' * 50, expire=60, max_entries=2, cost=8000)
+    cache_set(r, '感冒有什么症状', '发热', expire=3600, max_entries=2, cost=50)
+    cache_set(r, '糖尿病不能吃什么', '甜食', expire=3600, max_entries=2, cost=5000)
+
+    # 最早过期但生成代价高的条目保留，代价低的条目被淘汰
+    assert cache_get_entry(r, '高血压吃什么药')['answer'] == '硝苯地平' * 50
+    assert cache_get_entry(r, '感冒有什么症状') is None
+    assert cache_get_entry(r, '糖尿病不能吃什么')['answer'] == '甜食'
+    assert r.zcard(ANSWER_CACHE_INDEX) == 2
+    assert r.zcard(ANSWER_CACHE_PRIORITY) == 2
+
+
+def test_version_mismatch_invalidates_entry():
+    """数据版本变化后条目视为未命中，并从两个索引中删除"""
+    r = InMemoryRedis()
+    cache_set(r, '感冒有什么症状', '发热、咳嗽', data_version='v1:g1')
+    key = _answer_cache_key('感冒有什么症状')
+
+    assert cache_get_entry(r, '感冒有什么症状', data_version='v1:g1')['answer'] == '发热、咳嗽'
+    assert cache_get_entry(r, '感冒有什么症状', data_version='v2:g1') is None
+    assert r.get(key) is None
+    assert r.zscore(ANSWER_CACHE_INDEX, key) is None
+    assert r.zscore(ANSWER_CACHE_PRIORITY, key) is None
+    # 不检查版本时也不会再读到旧条目
+    assert cache_get_entry(r, '感冒有什么症状') is None
+
+
+def test_hit_miss_stats():
+    """命中/未命中次数与命中率，规范化后相同的问题视为命中"""
+    r = InMemoryRedis()
+    cache_set(r, '感冒有什么症状', '发热、咳嗽')
+
+    assert cache_get_entry(r, '感冒有什么症状？') is not None
+    assert cache_get_entry(r, '感冒有什么症状') is not None
+    assert cache_get_entry(r, '糖尿病有什么症状') is None
+
+    stats = cache_stats(r)
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+    assert stats['hit_ratio'] == round(2 / 3, 4)
+    assert stats['size'] == 1
+
+
+def test_expired_entries_do_not_count_against_capacity():
+    """已过期的条目从索引中清理，不占用容量，也不会挤掉新条目"""
+    r = InMemoryRedis()
+    cache_set(r, '感冒有什么症状', '发热', expire=1, max_entries=2)
+    cache_set(r, '糖尿病不能吃什么', '甜食', expire=3600, max_entries=2)
+    stale = _answer_cache_key('感冒有什么症状')
+    # 让第一条在索引中过期（键本身由 Redis 过期删除）
+    r.zadd(ANSWER_CACHE_INDEX, {stale: time.time() - 1})
+
+    cache_set(r, '高血压吃什么药', '硝苯地平', expire=3600, max_entries=2, cost=1)
+    assert r.zscore(ANSWER_CACHE_PRIORITY, stale) is None
+    assert cache_get_entry(r, '糖尿病不能吃什么')['answer'] == '甜食'
+    assert cache_get_entry(r, '高血压吃什么药')['answer'] == '硝苯地平'
+    assert cache_stats(r)['size'] == 2
+
+
+if __name__ == "__main__":
+    test_capacity_evicts_lowest_cost_per_byte()
+    test_version_mismatch_invalidates_entry()
+    test_hit_miss_stats()
+    test_expired_entries_do_not_count_against_capacity()
+    print("答案缓存测试完成")
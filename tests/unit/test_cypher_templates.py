@@ -0,0 +1,54 @@
+"""
+NL2Cypher 模板快速路径测试
+使用给定的疾病名称，不依赖 Neo4j 与词表文件
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.graph.templates import CypherTemplates
+
+
+DISEASES = ['高血压', '糖尿病', '糖尿病肾病', '感冒', '头痛']
+
+
+def test_single_intent_uses_template():
+    """单一疾病、单一关系意图的问题生成参数化查询"""
+    templates = CypherTemplates(names=DISEASES)
+
+    result = templates.match('高血压吃什么药')
+    assert result['cypher_query'] == (
+        'match (p:Disease)-[r:recommand_drug|command_drug]->(n:Drug) where p.name=$name return n.name'
+    )
+    assert result['parameters'] == {'name': '高血压'}
+
+    result = templates.match('高血压不能吃什么')
+    assert result['relations'] == ['not_eat']
+    assert '(n:Food)' in result['cypher_query']
+
+
+def test_longest_disease_name_wins():
+    """疾病名称按最长匹配（"糖尿病肾病"不会匹配为"糖尿病"）"""
+    result = CypherTemplates(names=DISEASES).match('糖尿病肾病有什么症状')
+    assert result['entity'] == '糖尿病肾病'
+    assert result['relations'] == ['has_symptom']
+
+
+def test_ambiguous_questions_fall_back_to_llm():
+    """多个疾病、多个意图、反向问题或不在模板范围内的问题交给 LLM"""
+    templates = CypherTemplates(names=DISEASES)
+    for question in ['高血压和糖尿病吃什么药', '高血压的症状和用药', '头痛是什么病的症状', '高血压怎么治疗', '高血压是什么']:
+        assert templates.match(question) is None, question
+    stats = templates.stats()
+    assert stats['hits'] == 0
+    assert stats['misses'] == 5
+
+
+if __name__ == "__main__":
+    test_single_intent_uses_template()
+    test_longest_disease_name_wins()
+    test_ambiguous_questions_fall_back_to_llm()
+    print("Cypher 模板测试完成")
@@ -0,0 +1,92 @@
+"""
+提前回答策略测试
+向量检索与知识图谱查询在不同时间完成，测试 off / drop / followup 三种策略下的事件与最终回答
+"""
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import services.pipeline as pipeline_module
+from services.pipeline import EarlyAnswerPolicy
+from test_pipeline_deadline import StubPipeline, FakeLLM, run_pipeline, events_of, stage_events
+
+
+SEPARATOR = "\n\n【知识图谱补充】"
+
+
+def context_used(events, phase):
+    return [data for data in events_of(events, 'context_used') if data['phase'] == phase]
+
+
+def test_off_waits_for_graph(monkeypatch):
+    """off：知识图谱查询较慢也等待两路检索都完成，回答使用两路结果"""
+    llm = FakeLLM(['多喝水'])
+    monkeypatch.setattr(pipeline_module, 'stream_openrouter_answer', llm.stream)
+    pipeline = StubPipeline(graph_delay=0.3, early_answer=EarlyAnswerPolicy(EarlyAnswerPolicy.OFF, 50))
+
+    events = run_pipeline(pipeline)
+    answer = context_used(events, 'answer')[0]
+    assert answer['early_answer'] is False
+    assert answer['pending'] == []
+    assert answer['contexts'] == ['knowledge_graph', 'milvus_vector']
+    assert len(llm.calls) == 1
+    assert '知识图谱：' in llm.calls[0][-1]['content']
+    assert events_of(events, 'answer_complete')[0]['response'] == '多喝水'
+
+
+def test_drop_answers_from_vector_and_cancels_graph(monkeypatch):
+    """drop：等待时间后知识图谱仍未返回，只用向量检索结果回答并取消知识图谱查询"""
+    llm = FakeLLM(['多喝水'])
+    monkeypatch.setattr(pipeline_module, 'stream_openrouter_answer', llm.stream)
+    pipeline = StubPipeline(graph_delay=2, early_answer=EarlyAnswerPolicy(EarlyAnswerPolicy.DROP, 50))
+
+    started = time.perf_counter()
+    events = run_pipeline(pipeline)
+    assert time.perf_counter() - started < 1
+    answer = context_used(events, 'answer')[0]
+    assert answer['early_answer'] is True
+    assert answer['pending'] == ['knowledge_graph']
+    assert answer['contexts'] == ['milvus_vector']
+    assert stage_events(events, 'knowledge_graph')[-1]['status'] == 'skipped'
+    assert context_used(events, 'followup') == []
+    assert len(llm.calls) == 1
+    complete = events_of(events, 'answer_complete')[0]
+    assert complete['response'] == '多喝水'
+    assert complete['search_stages']['knowledge_graph']['status'] == 'skipped'
+
+
+def test_drop_not_triggered_when_graph_is_fast(monkeypatch):
+    """drop：知识图谱在等待时间内返回时照常使用两路结果"""
+    monkeypatch.setattr(pipeline_module, 'stream_openrouter_answer', FakeLLM(['多喝水']).stream)
+    pipeline = StubPipeline(vector_delay=0.01, graph_delay=0.05, early_answer=EarlyAnswerPolicy(EarlyAnswerPolicy.DROP, 1000))
+
+    events = run_pipeline(pipeline)
+    answer = context_used(events, 'answer')[0]
+    assert answer['early_answer'] is False
+    assert answer['contexts'] == ['knowledge_graph', 'milvus_vector']
+
+
+def test_followup_appends_graph_answer(monkeypatch):
+    """followup：先基于向量检索结果回答，知识图谱结果返回后再流式生成补充回答"""
+    llm = FakeLLM(['多喝水'])
+    monkeypatch.setattr(pipeline_module, 'stream_openrouter_answer', llm.stream)
+    pipeline = StubPipeline(graph_delay=0.3, early_answer=EarlyAnswerPolicy(EarlyAnswerPolicy.FOLLOWUP, 50))
+
+    events = run_pipeline(pipeline)
+    assert context_used(events, 'answer')[0]['contexts'] == ['milvus_vector']
+    assert context_used(events, 'followup')[0]['contexts'] == ['knowledge_graph']
+    assert len(llm.calls) == 2
+    assert '知识图谱：' not in llm.calls[0][-1]['content']
+    assert '知识图谱：' in ''.join(message['content'] for message in llm.calls[1])
+    assert [data['content'] for data in events_of(events, 'answer_chunk')] == ['多喝水', SEPARATOR, '多喝水']
+    assert events_of(events, 'answer_complete')[0]['response'] == '多喝水' + SEPARATOR + '多喝水'
+    assert pipeline.persisted == ['多喝水' + SEPARATOR + '多喝水']
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -5,6 +5,8 @@
 import sys
 import os
 
+import pytest
+
 # 添加项目根目录到 Python 路径
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, project_root)
@@ -92,6 +94,57 @@ def test_enhancer_with_llm():
         traceback.print_exc()
 
 
+
+DICTIONARY_WORDS = {'Disease': ['感冒', '高血压', '糖尿病'], 'Symptom': ['头痛'], 'Drug': ['布洛芬']}
+ONE_TOPIC_HISTORY = [{'question': '感冒有什么症状？', 'answer': '发热、咳嗽'}]
+TWO_TOPIC_HISTORY = [{'question': '感冒有什么症状？', 'answer': '发热'}, {'question': '高血压吃什么药？', 'answer': '硝苯地平'}]
+
+
+@pytest.fixture
+def local_dictionary(monkeypatch):
+    """用固定词表替换共享的实体词典，不依赖词表文件与 Neo4j"""
+    from core.context import enhancer
+    from core.graph.entities import EntityDictionary
+    dictionary = EntityDictionary(DICTIONARY_WORDS)
+    monkeypatch.setattr(enhancer, 'get_entity_dictionary', lambda *args, **kwargs: dictionary)
+    return dictionary
+
+
+@pytest.mark.parametrize('query, history, topic, expected', [
+    # 指代词：替换第一个指代词
+    ('它有什么症状', [], '感冒', ('感冒有什么症状', True)),
+    ('它们有什么区别', [], '感冒', ('感冒有什么区别', True)),
+    ('这个病严重吗', ONE_TOPIC_HISTORY, None, ('感冒严重吗', True)),
+    # 以"呢"结尾的省略：补全主题，去掉开头的"那/那么"
+    ('那吃什么药呢', [], '感冒', ('感冒吃什么药呢', True)),
+    ('那么饮食呢', [], '糖尿病', ('糖尿病，饮食呢', True)),
+    # 问题中已有实体或已包含主题：问题完整
+    ('高血压怎么治', [], '感冒', ('高血压怎么治', False)),
+    ('感冒传染吗', [], '感冒', ('感冒传染吗', False)),
+    # 没有真正的指代或省略、"那个药"这类指物、主题不唯一或未知：交给大模型
+    ('吃什么药', [], '感冒', None),
+    ('那个药多少钱', [], '感冒', None),
+    ('那个怎么治', TWO_TOPIC_HISTORY, None, None),
+    ('它会传染吗', [], None, None),
+])
+def test_resolve_query_locally(local_dictionary, query, history, topic, expected):
+    """只在有指代或省略、且主题唯一时在本地补全主题"""
+    from core.context.enhancer import resolve_query_locally
+    assert resolve_query_locally(query, history, 5, topic) == expected
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('它严重吗', '感冒严重吗'),
+    ('那么饮食要注意什么', '感冒饮食要注意什么'),
+    ('那要注意什么', '感冒要注意什么'),
+    ('能治好吗', '感冒，能治好吗'),
+])
+def test_apply_topic(query, expected):
+    """替换指代词，或去掉开头的"那/那么"后把主题加在问题前面"""
+    from core.context.enhancer import apply_topic
+    assert apply_topic(query, '感冒') == expected
+
+
 if __name__ == '__main__':
     test_enhancer_with_llm()
 
@@ -0,0 +1,45 @@
+"""
+实体词典测试
+使用临时词表目录，不依赖 Neo4j
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.graph.entities import AhoCorasick, EntityDictionary, dump_entities
+
+
+def test_longest_match():
+    """最左最长、不重叠地匹配（"糖尿病肾病"不会再匹配出"糖尿病"）"""
+    automaton = AhoCorasick()
+    for word in ['糖尿病', '糖尿病肾病', '肾病', '头痛']:
+        automaton.add(word, word)
+    automaton.build()
+
+    assert sorted(word for _, _, word in automaton.iter('糖尿病肾病')) == ['糖尿病', '糖尿病肾病', '肾病']
+    assert automaton.longest('糖尿病肾病伴头痛') == [(0, 5, '糖尿病肾病'), (6, 8, '头痛')]
+
+
+def test_dump_and_load(tmp_path):
+    """词表去重写入后加载，同名实体带有多个标签"""
+    counts = dump_entities({'Disease': ['感冒', '糖尿病', '感冒 '], 'Symptom': ['头痛', '感冒']}, str(tmp_path))
+    assert counts == {'Disease': 2, 'Symptom': 2}
+
+    dictionary = EntityDictionary.load(str(tmp_path))
+    assert len(dictionary) == 3
+    matches = dictionary.find('感冒引起头痛')
+    assert [(match.name, match.labels) for match in matches] == [('感冒', ('Disease', 'Symptom')), ('头痛', ('Symptom',))]
+    assert dictionary.names('感冒引起头痛', 'Disease') == ['感冒']
+    assert EntityDictionary.load(str(tmp_path / 'missing')) is None
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    test_longest_match()
+    with tempfile.TemporaryDirectory() as directory:
+        test_dump_and_load(Path(directory))
+    print("实体词典测试完成")
@@ -0,0 +1,81 @@
+"""
+知识图谱查询测试
+使用进程内的 Cypher 缓存替身与验证器替身，不依赖 Neo4j 与 LLM
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import core.graph.query as graph_query
+
+
+class DictCypherCache:
+    """只实现 query_graph 用到的 get / set / invalidate"""
+
+    def __init__(self, entries=None):
+        self.entries = dict(entries or {})
+
+    def get(self, natural_language, query_type=None):
+        return self.entries.get(natural_language)
+
+    def set(self, natural_language, query_type, result):
+        self.entries[natural_language] = result
+
+    def invalidate(self, natural_language, query_type=None):
+        self.entries.pop(natural_language, None)
+
+
+class PassingValidator:
+    def __init__(self):
+        self.calls = 0
+
+    def validate_against_schema(self, cypher_query, schema):
+        self.calls += 1
+        return True, []
+
+
+CACHED = {
+    'cypher_query': 'MATCH (p:Disease)-[:has_symptom]->(s) WHERE p.name = "感冒" RETURN s.name',
+    'confidence': 0.9,
+    'validated': True,
+    'validation_errors': []
+}
+
+
+def test_cached_cypher_wins_over_planned(monkeypatch):
+    """Cypher 缓存命中时不使用调用方新生成的 Cypher，也不再验证"""
+    monkeypatch.setattr(graph_query, 'cypher_templates', None)
+    monkeypatch.setattr(graph_query, 'cypher_cache', DictCypherCache({'感冒有什么症状': CACHED}))
+    validator = PassingValidator()
+
+    result = graph_query.query_graph('感冒有什么症状', validator, None, planned_cypher='MATCH (n) RETURN n')
+    assert result['cypher_query'] == CACHED['cypher_query']
+    assert result['cached'] is True
+    assert result['planned'] is False
+    assert validator.calls == 0
+
+
+def test_planned_cypher_used_on_cache_miss(monkeypatch):
+    """缓存未命中时使用调用方提供的 Cypher（清理、验证后执行，不调用 LLM 生成）"""
+    monkeypatch.setattr(graph_query, 'cypher_templates', None)
+    monkeypatch.setattr(graph_query, 'cypher_cache', DictCypherCache())
+    monkeypatch.setattr(graph_query, 'generate_cypher_query', lambda *args: (_ for _ in ()).throw(AssertionError('不应生成')))
+    validator = PassingValidator()
+
+    result = graph_query.query_graph('感冒有什么症状', validator, None, planned_cypher='```cypher\nMATCH (n) RETURN n\n```')
+    assert result['cypher_query'] == 'MATCH (n) RETURN n'
+    assert result['planned'] is True
+    assert result['cached'] is False
+    assert validator.calls == 1
+    # 没有 Neo4j 驱动时执行失败，错误写入结果而不是抛出
+    assert result['executed'] is True
+    assert result['success'] is False
+    assert result['error'] == 'Neo4j 连接不可用'
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,48 @@
+"""
+疾病邻域与关系意图测试
+不依赖 Neo4j
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.graph.intents import NEIGHBORHOOD_QUERY, detect_relation_intents, group_neighborhood
+
+
+def test_group_neighborhood():
+    """按关系分组：每种关系一条记录（names 列表），去重并保持顺序，忽略空值与没有邻居的关系"""
+    records = [
+        {'relation': 'has_symptom', 'names': ['发热', '咳嗽', '发热', None]},
+        {'relation': 'recommand_drug', 'names': ['布洛芬']},
+        {'relation': 'need_check', 'names': []},
+        {'relation': None, 'names': ['血常规']},
+    ]
+    assert group_neighborhood(records) == {
+        'has_symptom': ['发热', '咳嗽'],
+        'recommand_drug': ['布洛芬']
+    }
+    # 每条记录一个邻居的形式同样可以分组
+    assert group_neighborhood([{'relation': 'not_eat', 'name': '辣椒'}, {'relation': 'not_eat', 'name': '辣椒'}]) == {'not_eat': ['辣椒']}
+
+
+def test_neighborhood_limit_is_per_relation():
+    """邻居数按关系分别截断，而不是整个查询共用一个 LIMIT"""
+    assert 'collect(DISTINCT n.name)[..$limit]' in NEIGHBORHOOD_QUERY
+    assert 'LIMIT $limit' not in NEIGHBORHOOD_QUERY
+
+
+def test_detect_relation_intents():
+    """按关键词识别关系，"不能吃"不会再被识别为"吃什么\""""
+    assert detect_relation_intents('那吃什么药') == ['recommand_drug', 'command_drug']
+    assert detect_relation_intents('高血压不能吃什么') == ['not_eat']
+    assert detect_relation_intents('严重吗') == []
+
+
+if __name__ == "__main__":
+    test_group_neighborhood()
+    test_neighborhood_limit_is_per_relation()
+    test_detect_relation_intents()
+    print("疾病邻域与关系意图测试完成")
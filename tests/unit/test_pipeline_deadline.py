@@ -0,0 +1,184 @@
+"""
+问答管线截止时间与阶段策略测试
+用替身阶段（按指定时间休眠）与替身 LLM 流运行 ChatPipeline，不依赖 Milvus、Neo4j、Redis 与 LLM
+"""
+import sys
+import asyncio
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import services.pipeline as pipeline_module
+from services.pipeline import ChatPipeline, Deadline, EarlyAnswerPolicy, StagePolicy
+
+
+class StubPipeline(ChatPipeline):
+    """检索阶段按指定时间休眠后返回固定结果，增强与持久化阶段不访问外部服务"""
+
+    def __init__(self, vector_delay=0.0, graph_delay=0.0, policies=None, early_answer=None):
+        super().__init__(
+            None, None, None, None,
+            policies=policies,
+            early_answer=early_answer or EarlyAnswerPolicy(),
+            answer_cache=False
+        )
+        self.vector_delay = vector_delay
+        self.graph_delay = graph_delay
+        self.persisted = []
+
+    async def _stage_enhance(self, ctx):
+        pass
+
+    async def _stage_vector(self, ctx):
+        await asyncio.sleep(self.vector_delay)
+        ctx.search_stages['milvus_vector'].update(status='success', count=1)
+        ctx.search_path.append('milvus_vector')
+        ctx.vector_context = '向量检索：感冒可服用感冒灵'
+
+    async def _stage_graph(self, ctx):
+        await asyncio.sleep(self.graph_delay)
+        ctx.search_stages['knowledge_graph'].update(status='success', count=1)
+        ctx.search_path.append('knowledge_graph')
+        ctx.graph_context = '知识图谱：感冒 -> 常用药 -> 布洛芬'
+
+    async def _stage_persist(self, ctx):
+        self.persisted.append(ctx.full_response)
+
+
+class FakeLLM:
+    """替身 LLM 流：首个片段前等待 first_delay 秒，之后每个片段间隔 interval 秒；记录每次调用的消息"""
+
+    def __init__(self, chunks, first_delay=0.0, interval=0.0):
+        self.chunks = chunks
+        self.first_delay = first_delay
+        self.interval = interval
+        self.calls = []
+
+    async def stream(self, client, messages):
+        self.calls.append(messages)
+        await asyncio.sleep(self.first_delay)
+        for index, chunk in enumerate(self.chunks):
+            if index:
+                await asyncio.sleep(self.interval)
+            yield chunk
+
+
+def run_pipeline(pipeline, deadline=5.0):
+    async def collect():
+        return [event async for event in pipeline.run('感冒吃什么药', 'session-1', deadline)]
+    return asyncio.run(collect())
+
+
+def events_of(events, event_type):
+    return [data for name, data in events if name == event_type]
+
+
+def stage_events(events, stage):
+    return [data for data in events_of(events, 'search_stage') if data.get('stage') == stage]
+
+
+def test_stage_timeout_uses_remaining_budget():
+    """检索阶段受 截止时间 - 回答预留时间 约束，回答阶段可以使用全部剩余时间，UNBOUNDED 只受自身超时约束"""
+    deadline = Deadline(10, answer_reserve=4)
+    timeout, by_deadline = deadline.stage_timeout(StagePolicy(2))
+    assert (timeout, by_deadline) == (2, False)
+    timeout, by_deadline = deadline.stage_timeout(StagePolicy(30))
+    assert by_deadline and 5.9 < timeout <= 6
+    timeout, by_deadline = deadline.stage_timeout(StagePolicy(None, deadline_scope=StagePolicy.ANSWER))
+    assert by_deadline and 9.9 < timeout <= 10
+    assert deadline.stage_timeout(StagePolicy(30, deadline_scope=StagePolicy.UNBOUNDED)) == (30, False)
+    # 回答预留时间最多为总预算的一半
+    assert Deadline(10, answer_reserve=8).answer_reserve == 5
+
+
+def test_slow_stage_skipped_after_own_timeout(monkeypatch):
+    """知识图谱查询超过自身超时（SKIP）：记录错误，只用向量检索结果回答"""
+    llm = FakeLLM(['多喝水，', '按时服药'])
+    monkeypatch.setattr(pipeline_module, 'stream_openrouter_answer', llm.stream)
+    pipeline = StubPipeline(graph_delay=2, policies={'graph': StagePolicy(0.1)})
+
+    events = run_pipeline(pipeline)
+    graph = stage_events(events, 'knowledge_graph')
+    assert graph[-1]['status'] == 'error'
+    assert '超时' in graph[-1]['error']
+    complete = events_of(events, 'answer_complete')[0]
+    assert complete['response'] == '多喝水，按时服药'
+    assert complete['search_path'] == ['milvus_vector']
+    assert complete['search_stages']['budget_exhausted'] == []
+    assert complete['search_stages']['timings']['graph'] < 1000
+    context = llm.calls[0][-1]['content']
+    assert '向量检索' in context and '知识图谱：' not in context
+    assert pipeline.persisted == ['多喝水，按时服药']
+
+
+def test_retrieval_budget_exhausted_degrades(monkeypatch):
+    """检索阶段用完 截止时间 - 回答预留时间 后降级，回答仍在预留时间内生成"""
+    monkeypatch.setattr(pipeline_module, 'stream_openrouter_answer', FakeLLM(['多喝水']).stream)
+    # 总预算 0.6 秒，回答预留 0.3 秒：检索最多 0.3 秒
+    pipeline = StubPipeline(graph_delay=2)
+
+    events = run_pipeline(pipeline, deadline=0.6)
+    complete = events_of(events, 'answer_complete')[0]
+    assert complete['response'] == '多喝水'
+    assert complete['search_stages']['budget_exhausted'] == ['graph']
+    assert complete['search_stages']['knowledge_graph']['budget_exhausted'] is True
+    assert '时间预算耗尽' in stage_events(events, 'knowledge_graph')[-1]['error']
+    assert complete['search_stages']['timings']['graph'] < 500
+
+
+def test_abort_stage_emits_answer_error(monkeypatch):
+    """策略为 ABORT 的阶段超时：终止管线，发送 answer_error，不生成回答也不持久化"""
+    llm = FakeLLM(['不应生成'])
+    monkeypatch.setattr(pipeline_module, 'stream_openrouter_answer', llm.stream)
+    pipeline = StubPipeline(vector_delay=2, policies={'vector': StagePolicy(0.1, StagePolicy.ABORT)})
+
+    events = run_pipeline(pipeline)
+    names = [name for name, _ in events]
+    assert names[-1] == 'answer_error'
+    assert 'answer_start' not in names and 'answer_complete' not in names
+    assert '超时' in events_of(events, 'answer_error')[0]['error']
+    assert llm.calls == []
+    assert pipeline.persisted == []
+
+
+def test_first_chunk_timeout_aborts(monkeypatch):
+    """首个回答片段在截止时间前没有到达：生成阶段失败并终止，不写入对话历史"""
+    monkeypatch.setattr(pipeline_module, 'stream_openrouter_answer', FakeLLM(['太迟了'], first_delay=2).stream)
+    pipeline = StubPipeline()
+
+    events = run_pipeline(pipeline, deadline=0.3)
+    names = [name for name, _ in events]
+    assert 'answer_start' in names
+    assert 'answer_chunk' not in names and 'answer_complete' not in names
+    assert '首个回答片段超出时间预算' in events_of(events, 'answer_error')[0]['error']
+    assert pipeline.persisted == []
+
+
+def test_streaming_answer_not_cut_by_deadline(monkeypatch):
+    """开始输出后回答不再受截止时间约束，完整回答照常返回"""
+    monkeypatch.setattr(pipeline_module, 'stream_openrouter_answer', FakeLLM(['多喝水，', '多休息，', '按时服药'], interval=0.2).stream)
+    pipeline = StubPipeline()
+
+    events = run_pipeline(pipeline, deadline=0.3)
+    assert [data['content'] for data in events_of(events, 'answer_chunk')] == ['多喝水，', '多休息，', '按时服药']
+    assert events_of(events, 'answer_complete')[0]['response'] == '多喝水，多休息，按时服药'
+    assert pipeline.persisted == ['多喝水，多休息，按时服药']
+
+
+def test_generate_timeout_persists_partial_answer(monkeypatch):
+    """生成阶段超过自身超时（ABORT）：发送 answer_error，已输出的部分回答仍写入对话历史"""
+    monkeypatch.setattr(pipeline_module, 'stream_openrouter_answer', FakeLLM(['多喝水，', '不会到达'], interval=2).stream)
+    generate = StagePolicy(0.2, StagePolicy.ABORT, StagePolicy.UNBOUNDED)
+    pipeline = StubPipeline(policies={'generate': generate})
+
+    events = run_pipeline(pipeline)
+    assert [data['content'] for data in events_of(events, 'answer_chunk')] == ['多喝水，']
+    assert '超时' in events_of(events, 'answer_error')[0]['error']
+    assert pipeline.persisted == ['多喝水，']
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,59 @@
+"""
+合并模式问题规划测试
+使用返回固定内容的模型替身，不调用 OpenRouter
+"""
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.context.planner import plan_query
+
+
+class FakeLLM:
+    """chat.completions.create 返回固定文本的模型替身"""
+
+    def __init__(self, content: str):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))]
+        )))
+
+
+def test_plan_parses_structured_output():
+    """解析代码块中的 JSON，得到补全后的问题、实体与 Cypher"""
+    content = '```json\n{"rewritten_query": "高血压吃什么药", "entities": {"diseases": ["高血压"], "symptoms": [], "drugs": []}, ' \
+              '"cypher_query": "MATCH (p:Disease) RETURN p"}\n```'
+    plan = plan_query('那吃什么药', [], llm_client=FakeLLM(content))
+    assert plan['query'] == '高血压吃什么药'
+    assert plan['enhanced'] is True
+    assert plan['entities'] == {'diseases': ['高血压'], 'symptoms': [], 'drugs': []}
+    assert plan['cypher_query'] == 'MATCH (p:Disease) RETURN p'
+
+
+def test_plan_tolerates_malformed_entities():
+    """实体字段为字符串时视为单个实体，其他类型忽略；entities 不是对象时为空"""
+    content = '{"rewritten_query": "", "entities": {"diseases": "高血压", "symptoms": 3, "drugs": ["布洛芬", null, {"x": 1}]}}'
+    plan = plan_query('高血压吃什么药', [], llm_client=FakeLLM(content))
+    assert plan['query'] == '高血压吃什么药'
+    assert plan['enhanced'] is False
+    assert plan['entities'] == {'diseases': ['高血压'], 'symptoms': [], 'drugs': ['布洛芬']}
+    assert plan['cypher_query'] == ''
+
+    plan = plan_query('高血压吃什么药', [], llm_client=FakeLLM('{"entities": "高血压"}'))
+    assert plan['entities'] == {'diseases': [], 'symptoms': [], 'drugs': []}
+
+
+def test_plan_returns_none_on_invalid_json():
+    """模型输出不是 JSON 对象时返回 None，由调用方回到原来的增强流程"""
+    assert plan_query('吃什么药', [], llm_client=FakeLLM('无法回答')) is None
+    assert plan_query('吃什么药', [], llm_client=FakeLLM('[1, 2]')) is None
+
+
+if __name__ == "__main__":
+    test_plan_parses_structured_output()
+    test_plan_tolerates_malformed_entities()
+    test_plan_returns_none_on_invalid_json()
+    print("合并模式规划测试完成")
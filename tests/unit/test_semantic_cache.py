@@ -0,0 +1,89 @@
+"""
+语义答案缓存测试
+使用固定的二维小向量（余弦相似度可直接计算）与基于进程内 Redis 替身的数据版本观察者
+"""
+import sys
+import math
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.cache.semantic_cache import SemanticAnswerCache
+from core.cache.versions import VersionRegistry, VersionWatcher, VECTOR, GRAPH, SCHEMA
+from in_memory_redis import InMemoryRedis
+
+
+def unit(similarity: float):
+    """与 [1, 0] 的余弦相似度为 similarity 的单位向量"""
+    return [similarity, math.sqrt(1 - similarity ** 2)]
+
+
+def make_cache(tmp_path, max_entries=10):
+    registry = VersionRegistry(InMemoryRedis(), str(tmp_path / 'data_versions.json'))
+    watcher = VersionWatcher(registry, interval=0)
+    return SemanticAnswerCache(threshold=0.92, max_entries=max_entries, ttl=3600, watcher=watcher), registry
+
+
+def test_threshold(tmp_path):
+    """相似度达到 0.92 时命中并返回相似度，低于阈值时未命中"""
+    cache, _ = make_cache(tmp_path)
+    cache.add('高血压不能吃什么', [1, 0], '少吃咸', {'search_path': ['knowledge_graph']})
+
+    entry = cache.lookup(unit(0.93))
+    assert entry['answer'] == '少吃咸'
+    assert entry['question'] == '高血压不能吃什么'
+    assert entry['search_path'] == ['knowledge_graph']
+    assert entry['score'] == 0.93
+    # 向量在比较前归一化，长度不影响相似度
+    assert cache.lookup([5, 0])['score'] == 1.0
+
+    assert cache.lookup(unit(0.91)) is None
+    assert cache.lookup([0, 1]) is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (2, 2, 1)
+
+
+def test_best_match_wins(tmp_path):
+    cache, _ = make_cache(tmp_path)
+    cache.add('高血压不能吃什么', [1, 0], '少吃咸')
+    cache.add('高血压患者忌口有哪些', unit(0.95), '忌高盐')
+
+    assert cache.lookup(unit(0.96))['answer'] == '忌高盐'
+    assert cache.lookup([1, 0])['answer'] == '少吃咸'
+
+
+def test_ring_buffer_overwrites_oldest(tmp_path):
+    """写满后按写入顺序覆盖最早的条目"""
+    cache, _ = make_cache(tmp_path, max_entries=2)
+    cache.add('问题一', [1, 0], '答案一')
+    cache.add('问题二', [0, 1], '答案二')
+    cache.add('问题三', [-1, 0], '答案三')
+
+    assert cache.lookup([1, 0]) is None
+    assert cache.lookup([0, 1])['answer'] == '答案二'
+    assert cache.lookup([-1, 0])['answer'] == '答案三'
+    assert cache.stats()['size'] == 2
+
+
+def test_cleared_on_vector_or_graph_version_change(tmp_path):
+    """向量库或知识图谱版本变化后清空，图模式版本变化不影响"""
+    cache, registry = make_cache(tmp_path)
+    cache.add('高血压不能吃什么', [1, 0], '少吃咸')
+
+    registry.bump(SCHEMA)
+    assert cache.lookup([1, 0])['answer'] == '少吃咸'
+
+    registry.bump(GRAPH)
+    assert cache.lookup([1, 0]) is None
+    assert cache.stats()['size'] == 0
+
+    cache.add('高血压不能吃什么', [1, 0], '少吃咸，控制体重')
+    registry.bump(VECTOR)
+    assert cache.lookup([1, 0]) is None
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
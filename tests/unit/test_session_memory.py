@@ -0,0 +1,73 @@
+"""
+会话检索记忆测试
+使用进程内的 Redis 替身与小型实体词典，不依赖 Redis 服务与词表文件
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.cache.session_memory import SessionRetrievalMemory
+from core.graph.entities import EntityDictionary
+from in_memory_redis import InMemoryRedis
+
+
+DICTIONARY = EntityDictionary({
+    'Disease': ['高血压', '妊娠高血压', '糖尿病', '感冒'],
+    'Symptom': ['头晕', '头痛', '发热'],
+    'Drug': ['硝苯地平', '布洛芬'],
+    'Food': ['芹菜']
+})
+
+MEMORY = {'entity': '高血压', 'entities': ['头晕', '硝苯地平', '芹菜']}
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('高血压吃什么药', True),
+    ('高血压会头晕吗', True),                 # 关联实体
+    ('高血压能吃硝苯地平吗', True),
+    ('高血压能吃芹菜吗', True),               # 食物不参与判断
+    ('高血压和糖尿病的区别', False),          # 记忆以外的疾病
+    ('高血压会头痛吗', False),                # 记忆以外的症状
+    ('高血压能吃布洛芬吗', False),            # 记忆以外的药物
+    ('妊娠高血压吃什么药', False),            # 最长匹配是另一个疾病
+    ('感冒吃什么药', False),                  # 不包含主实体
+])
+def test_matches_with_dictionary(query, expected):
+    assert SessionRetrievalMemory.matches(MEMORY, query, DICTIONARY) is expected
+
+
+def test_matches_without_dictionary():
+    """词典不可用时只检查是否包含主实体"""
+    assert SessionRetrievalMemory.matches(MEMORY, '高血压和糖尿病的区别') is True
+    assert SessionRetrievalMemory.matches(MEMORY, '感冒吃什么药') is False
+    assert SessionRetrievalMemory.matches(None, '高血压吃什么药', DICTIONARY) is False
+    assert SessionRetrievalMemory.matches({'entity': ''}, '高血压吃什么药', DICTIONARY) is False
+
+
+def test_remember_merges_and_replaces():
+    """主实体不变时增量扩充（新内容在前、去重），主实体变化时替换"""
+    memory = SessionRetrievalMemory(InMemoryRedis(), ttl=60, max_facts=3, max_entities=10)
+    memory.remember('s1', '高血压', '向量上下文', ['文档一'], 1, ['事实一', '事实二'], ['头晕'])
+    stored = memory.remember('s1', '高血压', '', None, 0, ['事实三', '事实一'], ['硝苯地平', '头晕'])
+
+    assert stored['graph_facts'] == ['事实三', '事实一', '事实二']
+    assert stored['entities'] == ['硝苯地平', '头晕']
+    assert stored['vector_context'] == '向量上下文'
+    assert stored['turns'] == 2
+    assert memory.load('s1')['graph_facts'] == stored['graph_facts']
+    # 记忆中的关联实体参与判断
+    assert SessionRetrievalMemory.matches(memory.load('s1'), '高血压能吃硝苯地平吗', DICTIONARY)
+
+    replaced = memory.remember('s1', '糖尿病', '', None, 0, ['事实四'], [])
+    assert replaced['entity'] == '糖尿病'
+    assert replaced['graph_facts'] == ['事实四']
+    assert replaced['turns'] == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,75 @@
+"""
+会话主题状态测试
+使用进程内的 Redis 替身，不依赖 Redis 服务
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.cache.session_topic import SessionTopicState
+from in_memory_redis import InMemoryRedis
+
+
+def entities(diseases=(), symptoms=(), drugs=()):
+    return {'diseases': list(diseases), 'symptoms': list(symptoms), 'drugs': list(drugs)}
+
+
+@pytest.fixture
+def topics():
+    return SessionTopicState(InMemoryRedis(), ttl=60, max_entities=3)
+
+
+def test_single_disease_becomes_topic(topics):
+    state = topics.update('s1', entities(['感冒'], ['发热']))
+    assert state['topic'] == '感冒'
+    assert topics.load('s1') == state
+    assert topics.load('s1')['symptoms'] == ['发热']
+
+
+def test_turn_without_disease_keeps_topic(topics):
+    """没有疾病的追问保留已有主题，实体增量合并（最近的在前、去重）"""
+    topics.update('s1', entities(['感冒'], ['发热']))
+    state = topics.update('s1', entities([], ['咳嗽', '发热'], ['布洛芬']))
+    assert state['topic'] == '感冒'
+    assert state['diseases'] == ['感冒']
+    assert state['symptoms'] == ['咳嗽', '发热']
+    assert state['drugs'] == ['布洛芬']
+    assert state['turns'] == 2
+
+
+def test_multiple_diseases_make_topic_ambiguous(topics):
+    topics.update('s1', entities(['感冒']))
+    state = topics.update('s1', entities(['高血压', '糖尿病']))
+    assert state['topic'] is None
+    assert topics.load('s1')['topic'] is None
+    # 之后只提到一个疾病时重新确定主题
+    assert topics.update('s1', entities(['糖尿病']))['topic'] == '糖尿病'
+
+
+def test_symptom_or_drug_topic_only_without_existing_topic(topics):
+    """尚无主题时取唯一的症状或药物，已有主题时不被症状覆盖"""
+    assert topics.update('s1', entities([], ['头痛']))['topic'] == '头痛'
+    assert topics.update('s1', entities([], ['发热']))['topic'] == '头痛'
+    assert topics.update('s2', entities([], [], ['布洛芬', '阿司匹林']))['topic'] is None
+
+
+def test_entities_capped(topics):
+    topics.update('s1', entities(['感冒', '高血压']))
+    state = topics.update('s1', entities(['糖尿病', '哮喘']))
+    assert state['diseases'] == ['糖尿病', '哮喘', '感冒']
+
+
+def test_redis_unavailable(topics):
+    """Redis 不可用时读取返回 None，写入失败不抛出"""
+    topics._redis.down = True
+    assert topics.load('s1') is None
+    assert topics.update('s1', entities(['感冒']))['topic'] == '感冒'
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
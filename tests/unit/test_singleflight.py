@@ -0,0 +1,190 @@
+"""
+单飞请求合并测试
+进程内实现直接测试；多副本实现用两个共享进程内 Redis 替身的 RedisSingleFlight 模拟两个副本
+"""
+import sys
+import asyncio
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.cache.singleflight import SingleFlight, RedisSingleFlight
+from in_memory_redis import InMemoryRedis
+
+
+class Recorder:
+    """记录一个订阅者收到的事件"""
+
+    def __init__(self):
+        self.events = []
+
+    async def emit(self, event_type, data):
+        self.events.append((event_type, data))
+
+    def chunks(self):
+        return [data['chunk'] for event_type, data in self.events if event_type == 'answer_chunk']
+
+
+def make_producer(chunks, gate=None, calls=None):
+    """依次发布回答片段；gate 不为None时发布第一个片段后等待 gate 再继续"""
+    async def producer(publish):
+        if calls is not None:
+            calls.append(chunks)
+        for index, chunk in enumerate(chunks):
+            await publish('answer_chunk', {'chunk': chunk})
+            if index == 0 and gate is not None:
+                await gate.wait()
+        return {'answer': ''.join(chunks)}
+    return producer
+
+
+async def wait_until(condition, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, '等待超时'
+        await asyncio.sleep(0.01)
+
+
+def test_late_joiner_replays_events():
+    """后加入的订阅者从头重放已产生的事件，角色为 follower"""
+    async def run():
+        flights = SingleFlight()
+        gate = asyncio.Event()
+        first, second = Recorder(), Recorder()
+        leader = asyncio.create_task(flights.do('k', make_producer(['感冒', '多休息'], gate), first.emit))
+        await wait_until(lambda: first.chunks() == ['感冒'])
+
+        follower = asyncio.create_task(flights.do('k', make_producer(['不应执行']), second.emit))
+        await asyncio.sleep(0)
+        gate.set()
+        return await leader, await follower, first, second
+
+    (result1, role1), (result2, role2), first, second = asyncio.run(run())
+    assert role1 == SingleFlight.LEADER
+    assert role2 == SingleFlight.FOLLOWER
+    assert result1 == result2 == {'answer': '感冒多休息'}
+    assert first.chunks() == second.chunks() == ['感冒', '多休息']
+
+
+def test_cancelled_only_when_last_subscriber_leaves():
+    """发起请求断开不影响其他订阅者，所有订阅者都断开时才取消执行"""
+    async def run():
+        flights = SingleFlight()
+        started, cancelled = asyncio.Event(), asyncio.Event()
+
+        async def producer(publish):
+            started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        first = asyncio.create_task(flights.do('k', producer, Recorder().emit))
+        await started.wait()
+        second = asyncio.create_task(flights.do('k', producer, Recorder().emit))
+        await asyncio.sleep(0.01)
+
+        first.cancel()
+        await asyncio.sleep(0.01)
+        assert not cancelled.is_set()
+        assert 'k' in flights._flights
+
+        second.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        assert 'k' not in flights._flights
+
+    asyncio.run(run())
+
+
+def test_remote_role_replays_other_replica():
+    """其他副本执行时本副本不执行，拿到结果后重放其事件，角色为 remote"""
+    async def run():
+        r = InMemoryRedis()
+        replica_a, replica_b = RedisSingleFlight(r, lock_ttl=5, stream_ttl=5), RedisSingleFlight(r, lock_ttl=5, stream_ttl=5)
+        gate = asyncio.Event()
+        calls = []
+        first, second = Recorder(), Recorder()
+        leader = asyncio.create_task(replica_a.do('k', make_producer(['感冒', '多', '休息'], gate, calls), first.emit))
+        await wait_until(lambda: first.chunks() == ['感冒'])
+
+        remote = asyncio.create_task(replica_b.do('k', make_producer(['不应执行'], calls=calls), second.emit))
+        await asyncio.sleep(0.1)
+        # 执行结束前跨副本的订阅者不会收到回答片段
+        assert second.chunks() == []
+        gate.set()
+        return await leader, await remote, first, second, calls, r
+
+    (result1, role1), (result2, role2), first, second, calls, r = asyncio.run(run())
+    assert role1 == SingleFlight.LEADER
+    assert role2 == SingleFlight.REMOTE
+    assert result1 == result2 == {'answer': '感冒多休息'}
+    assert second.chunks() == first.chunks() == ['感冒', '多', '休息']
+    assert len(calls) == 1
+    assert r.get(RedisSingleFlight.LOCK_PREFIX + 'k') is None
+
+
+def test_leader_cancelled_one_replica_reruns_without_duplicates():
+    """执行副本被取消后只有一个等待的副本重新执行，订阅者不会收到重复或不完整的回答片段"""
+    async def run():
+        r = InMemoryRedis()
+        replicas = [RedisSingleFlight(r, lock_ttl=5, stream_ttl=5) for _ in range(3)]
+        calls = []
+        leader_events = Recorder()
+        leader = asyncio.create_task(replicas[0].do('k', make_producer(['不完整', '的回答'], asyncio.Event()), leader_events.emit))
+        await wait_until(lambda: leader_events.chunks() == ['不完整'])
+
+        waiting = [Recorder(), Recorder()]
+        followers = [
+            asyncio.create_task(replica.do('k', make_producer(['完整', '的', '回答'], calls=calls), recorder.emit))
+            for replica, recorder in zip(replicas[1:], waiting)
+        ]
+        await asyncio.sleep(0.1)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        return results, waiting, calls
+
+    results, waiting, calls = asyncio.run(run())
+    assert len(calls) == 1
+    assert sorted(role for _, role in results) == [SingleFlight.LEADER, SingleFlight.REMOTE]
+    for (result, _), recorder in zip(results, waiting):
+        assert result == {'answer': '完整的回答'}
+        assert recorder.chunks() == ['完整', '的', '回答']
+
+
+def test_leader_failure_is_shared():
+    """执行副本执行失败时其他副本得到同样的错误，不重新执行"""
+    async def run():
+        r = InMemoryRedis()
+        replica_a, replica_b = RedisSingleFlight(r, lock_ttl=5, stream_ttl=5), RedisSingleFlight(r, lock_ttl=5, stream_ttl=5)
+        gate = asyncio.Event()
+        calls = []
+
+        async def failing(publish):
+            await publish('answer_chunk', {'chunk': '感冒'})
+            await gate.wait()
+            raise ValueError('生成失败')
+
+        first = Recorder()
+        leader = asyncio.create_task(replica_a.do('k', failing, first.emit))
+        await wait_until(lambda: first.chunks() == ['感冒'])
+        second = Recorder()
+        remote = asyncio.create_task(replica_b.do('k', make_producer(['不应执行'], calls=calls), second.emit))
+        await asyncio.sleep(0.1)
+        gate.set()
+        return await asyncio.gather(leader, remote, return_exceptions=True), second, calls
+
+    (leader_error, remote_error), second, calls = asyncio.run(run())
+    assert str(leader_error) == '生成失败'
+    assert str(remote_error) == '生成失败'
+    assert second.chunks() == []
+    assert calls == []
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
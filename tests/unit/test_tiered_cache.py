@@ -0,0 +1,100 @@
+"""
+两级缓存测试
+使用进程内的 Redis 替身，不依赖 Redis 服务
+"""
+import sys
+import time
+import threading
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.cache.tiered import TieredCache
+from in_memory_redis import InMemoryRedis
+
+
+def test_l2_shared_between_processes():
+    """一个进程写入后，另一个进程从 L2 读取并回填 L1"""
+    redis_client = InMemoryRedis()
+    writer = TieredCache(redis_client=redis_client, max_bytes=1024 * 1024, use_redis=True).namespace('qa', ttl=60)
+    reader = TieredCache(redis_client=redis_client, max_bytes=1024 * 1024, use_redis=True).namespace('qa', ttl=60)
+
+    writer.set('高血压', {'answer': '控制血压'})
+    assert reader.get('高血压') == {'answer': '控制血压'}
+    assert reader.get('高血压') == {'answer': '控制血压'}
+    stats = reader.stats()
+    assert stats['l2_hits'] == 1
+    assert stats['l1_hits'] == 1
+    assert stats['entries'] == 1
+
+
+def test_l2_refill_keeps_cost():
+    """L2 命中回填 L1 时沿用写入时传入的重建代价，而不是命名空间的默认值"""
+    redis_client = InMemoryRedis()
+    writer = TieredCache(redis_client=redis_client, use_redis=True).namespace('qa', ttl=60, cost=1)
+    reader_cache = TieredCache(redis_client=redis_client, use_redis=True)
+    reader = reader_cache.namespace('qa', ttl=60, cost=1)
+
+    writer.set('高血压', '控制血压', cost=3000)
+    assert reader.get('高血压') == '控制血压'
+    assert reader_cache._entries[('qa', '高血压')].cost == 3000
+
+
+def test_cost_aware_eviction():
+    """L1 超出字节预算时先淘汰重建代价低的条目"""
+    cache = TieredCache(max_bytes=2000, use_redis=False)
+    answers = cache.namespace('answer', ttl=60, cost=3000)
+    results = cache.namespace('graph_result', ttl=60, cost=50)
+
+    answers.set('a', 'x' * 400)
+    for i in range(10):
+        results.set(str(i), 'y' * 400)
+
+    assert answers.get('a') == 'x' * 400
+    assert results.stats()['evictions'] > 0
+    assert answers.stats()['evictions'] == 0
+    assert cache.stats()['bytes'] <= 2000
+
+
+def test_get_or_compute_runs_once():
+    """同一个键并发未命中时只计算一次"""
+    namespace = TieredCache(redis_client=InMemoryRedis(), use_redis=True).namespace('embedding', ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return [0.1, 0.2]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(namespace.get_or_compute('k', compute))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [[0.1, 0.2]] * 8
+    stats = namespace.stats()
+    assert stats['coalesced'] + stats['l1_hits'] == 7
+
+
+def test_expired_entries_miss():
+    """过期的条目视为未命中，计算结果为 None 时不缓存"""
+    namespace = TieredCache(use_redis=False).namespace('cypher', ttl=60)
+    namespace.set('k', 'v', ttl=0.05)
+    time.sleep(0.1)
+    assert namespace.get('k') is None
+    assert namespace.get_or_compute('k', lambda: None) is None
+    assert namespace.stats()['entries'] == 0
+
+
+if __name__ == "__main__":
+    test_l2_shared_between_processes()
+    test_l2_refill_keeps_cost()
+    test_cost_aware_eviction()
+    test_get_or_compute_runs_once()
+    test_expired_entries_miss()
+    print("两级缓存测试完成")
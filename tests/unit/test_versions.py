@@ -0,0 +1,96 @@
+"""
+数据版本注册表与观察者测试
+使用进程内的 Redis 替身与临时目录中的后备文件
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.cache.versions import VersionRegistry, VersionWatcher, VECTOR, GRAPH, SCHEMA
+from in_memory_redis import InMemoryRedis
+
+
+def make_registry(tmp_path, r=None):
+    return VersionRegistry(r or InMemoryRedis(), str(tmp_path / 'data_versions.json'))
+
+
+def test_bump_and_compare(tmp_path):
+    """递增版本写入 Redis 与文件，未构建过的数据源版本为0"""
+    r = InMemoryRedis()
+    registry = make_registry(tmp_path, r)
+    assert registry.get_all() == {VECTOR: 0, GRAPH: 0, SCHEMA: 0}
+
+    assert registry.bump(VECTOR) == 1
+    assert registry.bump(VECTOR) == 2
+    assert registry.bump(GRAPH) == 1
+    assert registry.get_all() == {VECTOR: 2, GRAPH: 1, SCHEMA: 0}
+    assert int(r.hget(VersionRegistry.REDIS_KEY, VECTOR)) == 2
+    # 另一个进程（同一个 Redis、没有本地文件）读到相同的版本
+    assert make_registry(tmp_path / 'other', r).get_all()[VECTOR] == 2
+
+
+def test_file_fallback_when_redis_down(tmp_path):
+    """Redis 不可用时只写文件；恢复后取两处中较大的版本，不会回退"""
+    r = InMemoryRedis()
+    registry = make_registry(tmp_path, r)
+    registry.bump(GRAPH)
+
+    r.down = True
+    assert registry.bump(GRAPH) == 2
+    assert registry.get_all()[GRAPH] == 2
+
+    r.down = False
+    assert int(r.hget(VersionRegistry.REDIS_KEY, GRAPH)) == 1
+    assert registry.get_all()[GRAPH] == 2
+    # 下一次递增把 Redis 追平到文件中的版本
+    assert registry.bump(GRAPH) == 3
+    assert int(r.hget(VersionRegistry.REDIS_KEY, GRAPH)) == 3
+
+
+def test_unknown_source_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        make_registry(tmp_path).bump('milvus')
+
+
+def test_watcher_calls_listeners_on_next_poll(tmp_path):
+    """版本变化后在下一次轮询时调用关注该数据源的回调，轮询间隔内不重新读取"""
+    registry = make_registry(tmp_path)
+    watcher = VersionWatcher(registry, interval=0)
+    vector_changes, any_changes = [], []
+    watcher.on_change(lambda: vector_changes.append(1), VECTOR)
+    watcher.on_change(lambda: any_changes.append(1))
+
+    assert watcher.token(VECTOR, GRAPH) == 'v0.g0'
+    # 首次读取不视为变化
+    assert vector_changes == [] and any_changes == []
+
+    registry.bump(GRAPH)
+    assert watcher.token(VECTOR, GRAPH) == 'v0.g1'
+    assert vector_changes == [] and any_changes == [1]
+
+    registry.bump(VECTOR)
+    watcher.versions()
+    assert vector_changes == [1] and any_changes == [1, 1]
+
+
+def test_watcher_respects_poll_interval(tmp_path):
+    registry = make_registry(tmp_path)
+    watcher = VersionWatcher(registry, interval=3600)
+    changes = []
+    watcher.on_change(lambda: changes.append(1))
+
+    assert watcher.versions()[VECTOR] == 0
+    registry.bump(VECTOR)
+    assert watcher.versions()[VECTOR] == 0
+    watcher._checked_at = None
+    assert watcher.versions()[VECTOR] == 1
+    assert changes == [1]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,93 @@
+"""
+实体词典构建工具
+把知识图谱中每种标签的全部节点名称导出到 data/dict（每个标签一个词表文件），
+供 core/graph/entities.py 编译为 Aho-Corasick 自动机做实体链接
+数据来源：Neo4j（默认）或 medical.jsonl（不需要启动 Neo4j）
+"""
+import os
+import sys
+import argparse
+from pathlib import Path
+
+# 将项目根目录添加到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.settings import settings
+from core.graph.entities import dump_entities, read_graph_entities
+from core.graph.neo4j_client import Neo4jClient
+
+
+def entities_from_nodes(nodes: tuple) -> dict:
+    """
+    把 MedicalGraph.read_nodes() 返回的节点集合整理为 标签 -> 名称 的映射
+
+    Args:
+        nodes: read_nodes() 的返回值（前 9 项为各类节点的名称集合）
+
+    Returns:
+        标签到名称集合的映射
+    """
+    drugs, foods, checks, departments, producers, symptoms, diseases, categories, treatments = nodes[:9]
+    return {
+        'Disease': diseases,
+        'Drug': drugs,
+        'Food': foods,
+        'Symptom': symptoms,
+        'Check': checks,
+        'Department': departments,
+        'Producer': producers,
+        'Category': categories,
+        'Treatment': treatments
+    }
+
+
+def build_from_jsonl(data_path: str = None, output: str = None) -> dict:
+    """
+    从 medical.jsonl 导出词表（与 utils/create_graph.py 使用相同的解析逻辑）
+
+    Args:
+        data_path: 医疗数据文件路径，如果为None则使用 {DATA_RAW_PATH}/medical.jsonl
+        output: 词表目录，如果为None则使用配置中的 DATA_DICT_PATH
+
+    Returns:
+        每种标签写入的名称数
+    """
+    from utils.create_graph import MedicalGraph
+
+    return dump_entities(entities_from_nodes(MedicalGraph(data_path).read_nodes()), output)
+
+
+def build_from_graph(output: str = None) -> dict:
+    """
+    从 Neo4j 导出词表
+
+    Args:
+        output: 词表目录，如果为None则使用配置中的 DATA_DICT_PATH
+
+    Returns:
+        每种标签写入的名称数
+    """
+    client = Neo4jClient()
+    if not client.connect():
+        raise ConnectionError('Neo4j 连接失败，可以使用 --source jsonl 从数据文件导出')
+    try:
+        return dump_entities(read_graph_entities(client.driver), output)
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='导出知识图谱的实体词表到 data/dict')
+    parser.add_argument('--source', choices=['graph', 'jsonl'], default='graph', help='graph：从 Neo4j 导出；jsonl：从 medical.jsonl 导出')
+    parser.add_argument('--data', default=None, help='medical.jsonl 路径（--source jsonl 时使用）')
+    parser.add_argument('--output', default=None, help=f'词表目录，默认 {settings.DATA_DICT_PATH}')
+    args = parser.parse_args()
+
+    if args.source == 'jsonl':
+        counts = build_from_jsonl(args.data, args.output)
+    else:
+        counts = build_from_graph(args.output)
+    for label, count in counts.items():
+        print(f'{label}: {count} 个名称')
+    print(f'词表已写入: {os.path.abspath(args.output or settings.DATA_DICT_PATH)}')
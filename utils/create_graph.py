@@ -14,6 +14,9 @@ sys.path.insert(0, str(project_root))
 
 from core.graph.neo4j_client import Neo4jClient
 from config.settings import settings
+from core.cache.versions import VersionRegistry, GRAPH
+from core.graph.entities import dump_entities
+from utils.build_dict import entities_from_nodes
 
 
 class MedicalGraph:
@@ -462,6 +465,17 @@ if __name__ == '__main__':
         print('开始创建知识图谱中的节点和关系...')
         mg.create_graphnodes_and_graphrels()
         print('知识图谱创建完成！')
+        # 同步导出实体词表（data/dict），供实体链接与 Cypher 模板使用
+        try:
+            counts = dump_entities(entities_from_nodes(mg.read_nodes()))
+            print(f'实体词表已更新: {sum(counts.values())} 个名称')
+        except Exception as e:
+            print(f'⚠️ 导出实体词表失败，可稍后运行 utils/build_dict.py: {str(e)}')
+        # 递增知识图谱版本：依赖旧图谱的缓存（答案、查询结果）失效
+        try:
+            VersionRegistry().bump(GRAPH)
+        except Exception as e:
+            print(f'⚠️ 更新数据版本失败，相关缓存需等待过期: {str(e)}')
     except Exception as e:
         print(f'创建知识图谱时发生错误: {str(e)}')
         raise
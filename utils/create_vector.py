@@ -20,6 +20,7 @@ from pathlib import Path
 from config.settings import settings
 from core.models.embeddings import ZhipuAIEmbeddings
 from core.cache.redis_client import get_redis_client, cache_set, cache_get
+from core.cache.versions import VersionRegistry, VECTOR
 from utils.document_loader import prepare_document
 from zai import ZhipuAiClient
 
@@ -250,6 +251,12 @@ def build_milvus_database(file_paths: list = None, uri: str = None, append_mode:
     print(f"\n数据库路径: {builder.URI}")
     print("可以开始使用向量检索功能了！")
     
+    # 递增向量库版本：依赖旧向量库的缓存（答案、检索结果）失效
+    try:
+        VersionRegistry().bump(VECTOR)
+    except Exception as e:
+        print(f"⚠️ 更新数据版本失败，相关缓存需等待过期: {str(e)}")
+    
     return vectorstore
 
 